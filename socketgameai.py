@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from socketgamecards import Hand
+from socketgamemetrics import REGISTRY
+
+# 伺服器端機器人參數
+BOT_POLICY = 'basic'  # 預設的決策策略，見 BOT_POLICIES
+BOT_EXECUTORS = ['thread', 'process', 'timer']  # 決策在執行緒池、行程池，或直接在計時輪的回呼中執行
+BOT_EXECUTOR = 'thread'
+BOT_WORKERS = 2  # 執行緒池或行程池的大小
+BOT_DELAY = 0.5  # 機器人每一步之前等待的秒數，讓真人看得到過程（0 表示下一格計時就動作）
+BOT_NAME = "電腦"  # 機器人名字的前綴，後面接同桌的編號
+BOT_PARENT_CHECK = 1  # 行程池的工作者每幾秒檢查一次伺服器行程是否還在
+BOT_CPU_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+BOT_STEPS = REGISTRY.counter('oldmaid_bot_steps_total', "伺服器端機器人完成的決策數", ['step'])
+BOT_STALE = REGISTRY.counter('oldmaid_bot_stale_total', "輪到執行或決策完成時牌桌狀態已經改變而丟掉的機器人決策數")
+BOT_CPU_SECONDS = REGISTRY.histogram('oldmaid_bot_cpu_seconds',
+                                     "機器人每一步的 CPU 時間（秒）：decide 為決策，apply 為在牌桌鎖內套用與送出訊息",
+                                     ['stage'], BOT_CPU_BUCKETS)
+BOT_QUEUE_SECONDS = REGISTRY.histogram('oldmaid_bot_queue_seconds', "機器人的決策從送出到開始執行的等待時間（秒）")
+
+class BasicBot:
+    """基本策略：輪到就抽牌，抽完丟掉所有配對再結束回合，再來一局一律同意（與 socketgamebot 的機器人相同）
+
+    策略只看 Table.bot_view 給的狀態複本（可以 pickle，行程池也能用），回傳 [(指令, 參數)]，
+    參數的格式與二進位協定解出的指令相同。新的策略實作 decide(view) 並加進 BOT_POLICIES。
+    """
+
+    def decide(self, view):
+        step = view['step']
+        if step == 'draw':
+            return [('draw', '')]
+        if step == 'discard':
+            pairs = Hand(view['hand']).take_pairs()
+            return ([('discard', pairs)] if pairs else []) + [('end', '')]
+        return [('playagain', 'yes')]
+
+BOT_POLICIES = {'basic': BasicBot}
+
+def watch_parent(parent):
+    """行程池工作者的初始化：伺服器行程直接被結束（來不及關閉行程池）時，工作者跟著結束"""
+    def run():
+        while os.getppid() == parent:
+            time.sleep(BOT_PARENT_CHECK)
+        os._exit(0)
+    threading.Thread(target=run, daemon=True).start()
+
+def run_decision(policy, view, submitted):
+    """在工作者中執行一次決策，回傳 (指令, 決策的 CPU 秒數, 排隊等待的秒數)
+
+    monotonic 時鐘在同一台機器的行程之間相同，行程池也能算出排隊時間。
+    """
+    waited = time.monotonic() - submitted
+    start = time.thread_time()
+    commands = policy.decide(view)
+    return commands, time.thread_time() - start, waited
+
+class BotRunner:
+    """排程伺服器端機器人的每一步：等 delay 秒後在牌桌鎖內取狀態的複本，決策交給執行緒池、行程池
+    或直接在計時輪回呼中執行，結果再經計時輪交回，和真人的指令一樣經過 Table.handle_command 套用
+
+    決策不碰牌桌、鎖與 socket，上千個機器人座位也不會佔用處理真人指令的執行緒或事件迴圈。
+    asyncio 引擎的計時輪在事件迴圈中推進，結果因此一定在事件迴圈套用。
+    """
+
+    def __init__(self, timers, policy=BOT_POLICY, executor=BOT_EXECUTOR, workers=BOT_WORKERS, delay=BOT_DELAY):
+        self.timers = timers
+        self.policy = BOT_POLICIES[policy]()
+        self.executor = executor
+        self.delay = delay
+        self.pool = None
+        if executor == 'thread':
+            self.pool = ThreadPoolExecutor(workers, thread_name_prefix='bot')
+        elif executor == 'process':
+            self.pool = ProcessPoolExecutor(workers, initializer=watch_parent, initargs=(os.getpid(),))
+
+    def request(self, table, bot, step):
+        """delay 秒後替 bot 走 step 這一步（draw、discard 或 play_again），呼叫者持有牌桌鎖"""
+        self.timers.schedule(self.delay, self.submit, table, bot, step, table.turn_serial)
+
+    def submit(self, table, bot, step, serial):
+        """取狀態複本並送出決策"""
+        view = table.bot_view(bot, step, serial)
+        if view is None:
+            BOT_STALE.inc()
+            return
+        if self.pool is None:
+            self.finish(table, bot, step, serial, run_decision(self.policy, view, time.monotonic()))
+            return
+        future = self.pool.submit(run_decision, self.policy, view, time.monotonic())
+        future.add_done_callback(lambda f: self.timers.schedule(0, self.collect, table, bot, step, serial, f))
+
+    def collect(self, table, bot, step, serial, future):
+        """計時輪回呼：取回工作者的決策"""
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"機器人 {bot.name} 決策時出錯: {e}")
+            return
+        self.finish(table, bot, step, serial, result)
+
+    def finish(self, table, bot, step, serial, result):
+        """套用決策並記錄這一步的 CPU 成本"""
+        commands, cpu, waited = result
+        BOT_QUEUE_SECONDS.observe(waited)
+        BOT_CPU_SECONDS.labels('decide').observe(cpu)
+        start = time.thread_time()
+        applied = table.apply_bot(bot, step, serial, commands)
+        BOT_CPU_SECONDS.labels('apply').observe(time.thread_time() - start)
+        if applied:
+            BOT_STEPS.labels(step).inc()
+        else:
+            BOT_STALE.inc()
+
@@ -0,0 +1,891 @@
+import argparse
+import asyncio
+import contextlib
+import heapq
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from types import SimpleNamespace
+from socketgamebot import BotClient, BotStats, run_table
+from socketgamecards import DECK_SIZE, card_to_string
+import socketgamecodec as codec
+from socketgamejournal import Journal, JOURNAL_FSYNC_POLICIES, replay
+from socketgamegateway import HashRing, VIRTUAL_NODES
+from socketgametimer import TimerWheel
+from socketgameserver import LineFramer, split_command, Table, Player, LOGIN_BUSY, LOGIN_TIMEOUT_MESSAGE
+from socketgameai import BOT_EXECUTORS, BOT_DELAY
+
+# 基準測試參數
+BENCH_HOST = '127.0.0.1'
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'socketgameserver.py')
+SUPERVISOR_SCRIPT = os.path.join(os.path.dirname(SERVER_SCRIPT), 'socketgamesupervisor.py')
+BOT_SCRIPT = os.path.join(os.path.dirname(SERVER_SCRIPT), 'socketgamebot.py')
+SERVER_START_TIMEOUT = 10  # 等待伺服器啟動的秒數
+TCP_INFO_SEGS_IN = 140  # Linux struct tcp_info 中 tcpi_segs_in（收到的封包數）的位移
+LOGIN_REFUSALS = (LOGIN_BUSY, LOGIN_TIMEOUT_MESSAGE, "遊戲已滿員，無法加入。\n".encode())  # 伺服器拒絕登入時送出的訊息
+
+def free_port():
+    """向系統要一個目前沒人使用的連接埠"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((BENCH_HOST, 0))
+        return s.getsockname()[1]
+
+def start_server_process(engine, port, extra_args=(), script=SERVER_SCRIPT):
+    """以子行程啟動伺服器，等到連接埠可以連線才回傳"""
+    proc = subprocess.Popen(
+        [sys.executable, script, '--host', BENCH_HOST, '--port', str(port), '--engine', engine, *extra_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((BENCH_HOST, port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("伺服器未能在時限內啟動")
+
+def stop_server_process(proc):
+    """結束伺服器子行程"""
+    proc.terminate()
+    try:
+        proc.wait(5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def report(results, json_path=None):
+    """印出結果，並視需要寫成 JSON 檔"""
+    for key, value in results.items():
+        print(f"{key}: {value}")
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+async def login_once(port, name):
+    """連線並送出名字，回傳 'accepted'（收到歡迎訊息）、'rejected'（收到伺服器的拒絕訊息）或 'failed'（連線錯誤或其他回應）"""
+    try:
+        reader, writer = await asyncio.open_connection(BENCH_HOST, port)
+    except OSError:
+        return 'failed'
+    try:
+        line = await reader.readline()  # 請輸入你的名字；登入佇列已滿時直接是忙碌訊息
+        if line in LOGIN_REFUSALS:
+            return 'rejected'
+        writer.write((name + "\n").encode())
+        line = await reader.readline()
+        if line.decode().startswith("歡迎"):
+            return 'accepted'
+        return 'rejected' if line in LOGIN_REFUSALS else 'failed'
+    except (OSError, asyncio.IncompleteReadError):
+        return 'failed'
+    finally:
+        writer.close()
+
+async def accept_burst(port, connections, idle):
+    """先開 idle 條只連線不送名字的慢速連線，再同時發起 connections 次登入"""
+    idle_conns = []
+    for _ in range(idle):
+        try:
+            idle_conns.append(await asyncio.open_connection(BENCH_HOST, port))
+        except OSError:
+            break
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login_once(port, f"bench{i}") for i in range(connections)))
+    elapsed = time.perf_counter() - start
+    for _, writer in idle_conns:
+        writer.close()
+    accepted = results.count('accepted')
+    return {
+        'connections': connections,
+        'idle_connections': len(idle_conns),
+        'accepted': accepted,
+        'rejected': results.count('rejected'),
+        'failed': results.count('failed'),
+        'seconds': round(elapsed, 4),
+        'accepts_per_sec': round(accepted / elapsed, 1) if elapsed > 0 else 0,
+    }
+
+def percentile(sorted_samples, p):
+    """已排序樣本的第 p 百分位數（最近排名法）"""
+    if not sorted_samples:
+        return 0
+    index = max(0, min(len(sorted_samples) - 1, int(round(p / 100 * len(sorted_samples) + 0.5)) - 1))
+    return sorted_samples[index]
+
+def summarize(samples):
+    """把以秒為單位的延遲樣本整理成毫秒的 p50/p95/p99/max"""
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+def git_revision():
+    """目前的 git commit，方便比較不同版本的結果"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(SERVER_SCRIPT),
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+class LatencyBot(BotClient):
+    """逐步送出指令並記錄每條指令從送出到結果抵達的時間
+
+    draw、discard 以自己的手牌更新抵達為準；end 以同桌下一位玩家收到輪到你操作為準。
+    """
+
+    def __init__(self, *args, samples, table_clock, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.samples = samples  # 指令 -> 延遲樣本（秒）
+        self.table_clock = table_clock  # 同桌機器人共用，記錄 end 送出的時間
+        self.sent_at = {}
+
+    def send(self, *commands):
+        now = time.perf_counter()
+        for command in commands:
+            verb = command.split()[0]
+            if verb == 'end':
+                self.table_clock['end'] = now
+            else:
+                self.sent_at[verb] = now
+        super().send(*commands)
+
+    def record(self, verb):
+        sent = self.sent_at.pop(verb, None)
+        if sent is not None:
+            self.samples.setdefault(verb, []).append(time.perf_counter() - sent)
+
+    async def process_message(self, message):
+        if message.startswith("手牌"):
+            self.record('draw' if 'draw' in self.sent_at else 'discard')
+        elif "輪到你操作" in message:
+            sent = self.table_clock.pop('end', None)
+            if sent is not None:
+                self.samples.setdefault('end', []).append(time.perf_counter() - sent)
+        await super().process_message(message)
+
+class ArrivalBot(BotClient):
+    """記錄從連線到收到第一份手牌的時間，以及那一局有幾位玩家"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connected_at = None
+        self.dealt_at = None
+        self.table_size = None
+
+    async def process_message(self, message):
+        await super().process_message(message)
+        if self.dealt_at is None and message.startswith("手牌快照 "):
+            self.dealt_at = time.perf_counter()
+            # 一副牌平均發給每位玩家，從發到的張數推回這一局的人數
+            self.table_size = round(DECK_SIZE / len(self.hand))
+
+async def arrival_run(port, args, lobby):
+    """以固定的到達率陸續連線，傳統模式下每位玩家一入座就按準備開始"""
+    bots = []
+    tasks = []
+    for i in range(args.arrivals):
+        bot = ArrivalBot(f"arrive{i}", BENCH_HOST, port, games=1)
+        bot.connected_at = time.perf_counter()
+        try:
+            await bot.connect_to_server()
+        except (OSError, ConnectionError):
+            continue
+        if not lobby:
+            bot.send("start")
+        bots.append(bot)
+        tasks.append(asyncio.create_task(bot.receive_messages()))
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.wait(tasks, timeout=args.fill_timeout + 10)
+    for bot, task in zip(bots, tasks):
+        task.cancel()
+        bot.writer.close()
+    dealt = [bot for bot in bots if bot.dealt_at is not None]
+    return {
+        'arrivals': args.arrivals,
+        'dealt': len(dealt),
+        'never_dealt': len(bots) - len(dealt),
+        'mean_table_size': round(sum(bot.table_size for bot in dealt) / len(dealt), 2) if dealt else 0,
+        'time_to_first_deal': summarize([bot.dealt_at - bot.connected_at for bot in dealt]),
+    }
+
+def run_lobby(args):
+    """比較傳統入座（每人按準備開始）與配對佇列在持續到達下的首次發牌時間與每桌人數"""
+    results = {'bench': 'lobby', 'revision': git_revision(), 'engine': args.engine, 'rate': args.rate,
+               'table_size': args.table_size, 'fill_timeout': args.fill_timeout}
+    for mode in ('classic', 'lobby'):
+        port = free_port()
+        extra = ['--lobby', '--table-size', str(args.table_size), '--fill-timeout', str(args.fill_timeout)]
+        proc = start_server_process(args.engine, port, extra if mode == 'lobby' else ())
+        try:
+            results[mode] = asyncio.run(arrival_run(port, args, mode == 'lobby'))
+        finally:
+            stop_server_process(proc)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+async def latency_run(port, args):
+    """在 tables 張牌桌上跑逐步模式的機器人並收集延遲樣本"""
+    samples = {}
+    stats = BotStats()
+    bot_args = SimpleNamespace(host=BENCH_HOST, port=port, games=args.games, pipeline=False, think=args.think)
+    jobs = [run_table(t, args.players, bot_args, stats, LatencyBot, samples=samples, table_clock={})
+            for t in range(args.tables)]
+    await asyncio.wait_for(asyncio.gather(*jobs), args.timeout)
+    return samples, stats.report()
+
+def run_latency(args):
+    """量測 draw / discard / end 的端到端延遲分佈"""
+    port = free_port()
+    proc = start_server_process(args.engine, port)
+    try:
+        samples, load = asyncio.run(latency_run(port, args))
+    finally:
+        stop_server_process(proc)
+    results = {
+        'bench': 'latency',
+        'revision': git_revision(),
+        'engine': args.engine,
+        'tables': args.tables,
+        'players': args.players,
+        'games': args.games,
+        'think_time': args.think,
+        'load': load,
+        'commands': {verb: summarize(values) for verb, values in sorted(samples.items())},
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+def run_scaling(args):
+    """以 1..N 個工作行程跑同樣的負載，看總吞吐量是否隨核心數增加
+
+    負載由多個獨立的機器人行程產生，避免產生器自己成為瓶頸；每個行程使用不同的桌號範圍。
+    """
+    results = {'bench': 'scaling', 'revision': git_revision(), 'engine': args.engine,
+               'cpu_count': os.cpu_count(), 'runs': []}
+    for workers in args.workers:
+        port = free_port()
+        proc = start_server_process(args.engine, port, ['--workers', str(workers)], SUPERVISOR_SCRIPT)
+        time.sleep(0.5)  # 讓所有工作行程都開始監聽
+        tables = max(1, args.tables // args.clients)
+        try:
+            start = time.perf_counter()
+            clients = [subprocess.Popen(
+                [sys.executable, BOT_SCRIPT, '--host', BENCH_HOST, '--port', str(port), '--json',
+                 '--bots', str(tables * args.players), '--tables', str(tables), '--games', str(args.games),
+                 '--table-offset', str(i * tables), '--timeout', str(args.timeout)],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) for i in range(args.clients)]
+            loads = [json.loads(client.communicate()[0].strip().splitlines()[-1]) for client in clients]
+            elapsed = time.perf_counter() - start
+        finally:
+            stop_server_process(proc)
+        commands = sum(load['commands'] for load in loads)
+        games = sum(load['games'] for load in loads)
+        run = {
+            'workers': workers,
+            'seconds': round(elapsed, 3),
+            'games': games,
+            'commands': commands,
+            'errors': sum(load['errors'] for load in loads),
+            'commands_per_sec': round(commands / elapsed, 1) if elapsed > 0 else 0,
+        }
+        results['runs'].append(run)
+        print(json.dumps(run, ensure_ascii=False))
+    base = results['runs'][0]['commands_per_sec'] if results['runs'] else 0
+    for run in results['runs']:
+        run['speedup'] = round(run['commands_per_sec'] / base, 2) if base else 0
+    report({'scaling': results['runs']}, None)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+def run_ring(args):
+    """一致性雜湊環：各後端分到的牌桌比例，以及多加一個後端時有多少牌桌要搬家"""
+    table_ids = [str(i) for i in range(args.keys)]
+    nodes = [f"127.0.0.1:{6000 + i}" for i in range(args.backends)]
+    ring = HashRing(nodes, args.replicas)
+    before = {key: ring.node_for(key) for key in table_ids}
+    shares = {node: 0 for node in nodes}
+    for node in before.values():
+        shares[node] += 1
+    ring.add(f"127.0.0.1:{6000 + args.backends}")
+    moved = sum(1 for key in table_ids if ring.node_for(key) != before[key])
+    report({
+        'backends': args.backends,
+        'replicas': args.replicas,
+        'keys': args.keys,
+        'max_share': round(max(shares.values()) / args.keys, 4),
+        'min_share': round(min(shares.values()) / args.keys, 4),
+        'moved_on_add': round(moved / args.keys, 4),
+        'ideal_moved_on_add': round(1 / (args.backends + 1), 4),
+    }, args.json)
+
+def per_op_ns(seconds, count):
+    return round(seconds / count * 1e9, 1) if count else 0
+
+def bench_wheel(delays, cancel_count):
+    """計時輪：新增、取消與到期（以假的時間推進，不必真的等待）"""
+    wheel = TimerWheel()
+    fired = []
+    start = time.perf_counter()
+    timers = [wheel.schedule(delay, fired.append, None) for delay in delays]
+    insert = time.perf_counter() - start
+    start = time.perf_counter()
+    for timer in timers[:cancel_count]:
+        timer.cancel()
+    cancel = time.perf_counter() - start
+    start = time.perf_counter()
+    wheel.advance(wheel.origin + max(delays) + 1)
+    expire = time.perf_counter() - start
+    return {
+        'insert_ns': per_op_ns(insert, len(delays)),
+        'cancel_ns': per_op_ns(cancel, cancel_count),
+        'expire_ns': per_op_ns(expire, len(fired)),
+        'fired': len(fired),
+    }
+
+def bench_heap(delays, cancel_count):
+    """對照組：heapq 加上標記取消（asyncio 的作法），取消的項目要等到期才會離開堆積"""
+    heap = []
+    fired = []
+    now = time.monotonic()
+    start = time.perf_counter()
+    entries = []
+    for seq, delay in enumerate(delays):
+        entry = [now + delay, seq, fired.append, False]
+        heapq.heappush(heap, entry)
+        entries.append(entry)
+    insert = time.perf_counter() - start
+    start = time.perf_counter()
+    for entry in entries[:cancel_count]:
+        entry[3] = True
+    cancel = time.perf_counter() - start
+    start = time.perf_counter()
+    while heap:
+        entry = heapq.heappop(heap)
+        if not entry[3]:
+            entry[2](None)
+    expire = time.perf_counter() - start
+    return {
+        'insert_ns': per_op_ns(insert, len(delays)),
+        'cancel_ns': per_op_ns(cancel, cancel_count),
+        'expire_ns': per_op_ns(expire, len(fired)),
+        'fired': len(fired),
+    }
+
+def bench_thread_timers(delays):
+    """對照組：每個計時器一個 threading.Timer（每個都是一條執行緒），只量測建立與取消"""
+    start = time.perf_counter()
+    timers = []
+    for delay in delays:
+        timer = threading.Timer(delay, lambda: None)
+        timer.daemon = True
+        timer.start()
+        timers.append(timer)
+    insert = time.perf_counter() - start
+    start = time.perf_counter()
+    for timer in timers:
+        timer.cancel()
+    for timer in timers:
+        timer.join()
+    cancel = time.perf_counter() - start
+    return {
+        'insert_ns': per_op_ns(insert, len(delays)),
+        'cancel_ns': per_op_ns(cancel, len(delays)),
+    }
+
+def run_timers(args):
+    """計時器新增與取消的成本：計時輪、heapq 與 threading.Timer 比較"""
+    rng = random.Random(args.seed)
+    delays = [rng.uniform(1, args.max_delay) for _ in range(args.timers)]
+    cancel_count = int(args.timers * args.cancel_ratio)  # 大部分回合計時器在玩家結束回合時就取消
+    report({
+        'timers': args.timers,
+        'cancel_ratio': args.cancel_ratio,
+        'wheel': bench_wheel(delays, cancel_count),
+        'heapq': bench_heap(delays, cancel_count),
+        'threading_timer': bench_thread_timers(delays[:args.thread_timers]),
+        'threading_timer_count': min(args.thread_timers, args.timers),
+    }, args.json)
+
+FRAMING_COMMANDS = [b"draw\n", b"discard auto\n", b"end\n",
+                    b'discard {"cards":[{"suit":"Hearts","rank":5},{"suit":"Spades","rank":5}]}\n']
+
+def receive_with_recv(sock, total):
+    """對照組：舊的接收方式，每次 recv 配置新的 bytes 再接到緩衝區後面，處理完把剩下的資料往前搬"""
+    buffer = bytearray()
+    count = 0
+    while count < total:
+        data = sock.recv(4096)
+        if not data:
+            break
+        buffer += data
+        start = 0
+        while True:
+            end = buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = buffer[start:end].decode().strip()
+            if line:
+                line.lower()
+                line.lower().split()  # 舊的指令分派在各個分支反覆 lower()
+                count += 1
+            start = end + 1
+        del buffer[:start]
+    return count
+
+def receive_with_recv_into(sock, total):
+    """目前的接收方式：recv_into 預先配置的緩衝區、memoryview 切行、指令只拆一次"""
+    framer = LineFramer()
+    count = 0
+    while count < total:
+        if not framer.recv_into(sock):
+            break
+        for command in framer.commands():
+            split_command(command)
+            count += 1
+    return count
+
+def bench_receive(receive, payload, total):
+    reader, writer = socket.socketpair()
+    sender = threading.Thread(target=writer.sendall, args=(payload,))
+    start = time.perf_counter()
+    sender.start()
+    count = receive(reader, total)
+    elapsed = time.perf_counter() - start
+    sender.join()
+    reader.close()
+    writer.close()
+    return {'commands': count, 'ns_per_command': per_op_ns(elapsed, count)}
+
+def run_framing(args):
+    """接收與切分指令的成本：舊的 recv + bytes 串接與 recv_into 預先配置緩衝區比較"""
+    commands = [FRAMING_COMMANDS[i % len(FRAMING_COMMANDS)] for i in range(args.commands)]
+    payload = b''.join(commands)
+    report({
+        'commands': args.commands,
+        'bytes': len(payload),
+        'recv': bench_receive(receive_with_recv, payload, args.commands),
+        'recv_into': bench_receive(receive_with_recv_into, payload, args.commands),
+    }, args.json)
+
+def segments_in(sock):
+    """這條連線收到的 TCP 封包數（只支援 Linux，其他平台回傳 None）"""
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 256)
+    return int.from_bytes(info[TCP_INFO_SEGS_IN:TCP_INFO_SEGS_IN + 4], sys.byteorder)
+
+def fetch_metrics(port):
+    """讀取伺服器的 /metrics，回傳 {樣本名稱（含標籤）: 數值}"""
+    with urllib.request.urlopen(f"http://{BENCH_HOST}:{port}/metrics", timeout=5) as response:
+        text = response.read().decode()
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, _, value = line.rpartition(' ')
+            samples[name] = float(value)
+    return samples
+
+class PacketBot(LatencyBot):
+    """在最後一則訊息時記下這條連線總共收到多少封包"""
+
+    def __init__(self, *args, segments, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.segments = segments
+
+    async def process_message(self, message):
+        if "有人拒絕再來一局" in message:
+            count = segments_in(self.writer.get_extra_info('socket'))
+            if count is not None:
+                self.segments.append(count)
+        await super().process_message(message)
+
+async def writes_run(port, args):
+    samples = {}
+    segments = []
+    stats = BotStats()
+    bot_args = SimpleNamespace(host=BENCH_HOST, port=port, games=args.games, pipeline=args.pipeline, think=0)
+    jobs = [run_table(t, args.players, bot_args, stats, PacketBot, samples=samples, table_clock={}, segments=segments)
+            for t in range(args.tables)]
+    await asyncio.wait_for(asyncio.gather(*jobs), args.timeout)
+    return samples, segments
+
+def run_writes(args):
+    """比較每則訊息各自寫出（且沒有 TCP_NODELAY）與合併寫出時，每回合的寫入次數、封包數與延遲
+
+    before 以 --no-write-batching --no-nodelay 重現先前的行為。寫入次數取自伺服器的
+    oldmaid_outbox_writes_total，封包數是所有機器人連線收到的 TCP 封包（含純 ACK），回合數是 end 指令數。
+    """
+    results = {'bench': 'writes', 'revision': git_revision(), 'engine': args.engine,
+               'tables': args.tables, 'players': args.players, 'games': args.games, 'pipeline': args.pipeline}
+    for mode, extra in (('before', ['--no-write-batching', '--no-nodelay']), ('after', [])):
+        port = free_port()
+        metrics_port = free_port()
+        proc = start_server_process(args.engine, port, extra + ['--metrics-port', str(metrics_port)])
+        try:
+            samples, segments = asyncio.run(writes_run(port, args))
+            metrics = fetch_metrics(metrics_port)
+        finally:
+            stop_server_process(proc)
+        turns = metrics.get('oldmaid_commands_total{command="end"}', 0)
+        writes = metrics.get('oldmaid_outbox_writes_total', 0)
+        results[mode] = {
+            'turns': int(turns),
+            'writes_per_turn': round(writes / turns, 2) if turns else 0,
+            'packets_per_turn': round(sum(segments) / turns, 2) if turns and segments else None,
+            'latency_p50_ms': {verb: summarize(values)['p50_ms'] for verb, values in sorted(samples.items())},
+            'latency_p99_ms': {verb: summarize(values)['p99_ms'] for verb, values in sorted(samples.items())},
+        }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+def codec_turn_messages(turn, rng):
+    """模擬一個回合中玩家會收到的訊息：(文字協定的一行, 二進位協定的框架)"""
+    name, source = f"bot0-{turn % 4}", f"bot0-{(turn + 1) % 4}"
+    card = rng.randrange(DECK_SIZE)
+    pair = [rng.randrange(1, 14), rng.randrange(1, 14) + 13]
+    seq = turn * 2
+    return [
+        ("輪到你操作，點擊抽牌或配對丟棄，或結束回合。", codec.YOUR_TURN_FRAME),
+        (f"{name} 從 {source} 那裡抽了一張牌 {card_to_string(card)}。", codec.encode_drew(name, source, card)),
+        ("手牌變動 " + json.dumps({'seq': seq + 1, 'add': [card]}, separators=(',', ':')),
+         codec.encode_hand_delta(seq + 1, [card], [])),
+        (f"{name} 丟棄了牌: {', '.join(card_to_string(c) for c in pair)}", codec.encode_discarded(name, pair)),
+        ("手牌變動 " + json.dumps({'seq': seq + 2, 'remove': pair}, separators=(',', ':')),
+         codec.encode_hand_delta(seq + 2, [], pair)),
+    ]
+
+def parse_text_stream(payload):
+    """對照組：文字協定的客戶端切行後逐一比對字串（與 BotClient.process_message 相同的判斷順序）"""
+    count = 0
+    for line in payload.decode().split('\n'):
+        if not line:
+            continue
+        if line.startswith("手牌快照 ") or line.startswith("手牌變動 "):
+            json.loads(line.split(" ", 1)[1])
+        elif "輪到你操作" in line or "贏得了遊戲" in line or "遊戲結束，是否再來一局？" in line:
+            pass
+        elif "所有玩家同意再來一局，請準備開始。" in line or "有人拒絕再來一局，遊戲結束。" in line:
+            pass
+        count += 1
+    return count
+
+def parse_binary_stream(payload):
+    """二進位協定：切出框架後依操作碼查表解碼"""
+    count = 0
+    for opcode, data in codec.FrameReader().feed(payload):
+        codec.decode_event(opcode, data)
+        count += 1
+    return count
+
+def bench_parse(parse, payload, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        count = parse(payload)
+    return per_op_ns(time.perf_counter() - start, count * repeat)
+
+async def codec_run(port, args, protocol):
+    stats = BotStats()
+    bot_args = SimpleNamespace(host=BENCH_HOST, port=port, games=args.games, pipeline=True, think=0)
+    jobs = [run_table(t, args.players, bot_args, stats, protocol=protocol) for t in range(args.tables)]
+    await asyncio.wait_for(asyncio.gather(*jobs), args.timeout)
+    return stats.report()
+
+def run_codec(args):
+    """比較文字與二進位協定：每回合收到的位元組、伺服器廣播的位元組、吞吐量與客戶端解析每則訊息的成本"""
+    rng = random.Random(args.seed)
+    messages = [message for turn in range(args.turns) for message in codec_turn_messages(turn, rng)]
+    text = ''.join(line + '\n' for line, _ in messages).encode()
+    binary = b''.join(frame for _, frame in messages)
+    results = {'bench': 'codec', 'revision': git_revision(), 'engine': args.engine,
+               'tables': args.tables, 'players': args.players, 'games': args.games,
+               'parse': {
+                   'messages': len(messages),
+                   'text_bytes_per_message': round(len(text) / len(messages), 1),
+                   'binary_bytes_per_message': round(len(binary) / len(messages), 1),
+                   'text_ns_per_message': bench_parse(parse_text_stream, text, args.repeat),
+                   'binary_ns_per_message': bench_parse(parse_binary_stream, binary, args.repeat),
+               }}
+    for mode, protocol in (('text', 0), ('binary', codec.PROTOCOL_VERSION)):
+        port = free_port()
+        metrics_port = free_port()
+        proc = start_server_process(args.engine, port, ['--metrics-port', str(metrics_port)])
+        try:
+            stats = asyncio.run(codec_run(port, args, protocol))
+            metrics = fetch_metrics(metrics_port)
+        finally:
+            stop_server_process(proc)
+        turns = metrics.get('oldmaid_commands_total{command="end"}', 0)
+        results[mode] = {
+            'turns': int(turns),
+            'bytes_received_per_turn': round(stats['bytes_received'] / turns, 1) if turns else 0,
+            'broadcast_bytes_per_turn': round(metrics.get('oldmaid_broadcast_bytes_total', 0) / turns, 1) if turns else 0,
+            'commands_per_sec': stats['commands_per_sec'],
+            'errors': stats['errors'],
+        }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+class NullOutbox:
+    """丟掉所有輸出的送出佇列，只量測牌桌本身"""
+
+    needs_snapshot = False  # 從不丟掉手牌訊息（見 socketgameio.Outbox）
+
+    def put(self, data, kind=None):
+        return True
+
+def play_table_games(table, games):
+    """在沒有連線的牌桌上直接呼叫牌桌方法打完 games 局，回傳回合數"""
+    turns = 0
+    for _ in range(games):
+        table.start_game()
+        while table.game_started:
+            player = table.players[table.current_player]
+            table.handle_draw(player)
+            if table.game_started and not table.auto_discard:
+                pairs = player.hand.take_pairs()
+                if pairs:
+                    table.handle_discard(player, pairs, removed=True)
+            if table.game_started:
+                table.end_turn()
+            turns += 1
+        for player in table.players:
+            table.set_play_again(player, True)
+        table.check_play_again()
+    return turns
+
+def journal_run(path, fsync, args):
+    """以指定的 fsync 策略（None 表示不記錄）打完所有牌桌，回傳結果"""
+    journal = Journal(path, fsync).start() if fsync else None
+    turns = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in range(args.tables):
+            table = Table(f"bench{t}")
+            table.auto_discard = args.auto_discard
+            if journal is not None:
+                table.journal = journal.table(table.table_id, table.decks)
+            for i in range(args.players):
+                table.add_player(Player(None, None, f"p{t}-{i}", NullOutbox()))
+            turns += play_table_games(table, args.games)
+    elapsed = time.perf_counter() - start
+    result = {'turns': turns, 'us_per_turn': round(elapsed / turns * 1e6, 2)}
+    if journal is not None:
+        journal.close()
+        result.update(records=journal.records, bytes=journal.bytes, writes=journal.writes, fsyncs=journal.syncs)
+    return result
+
+def run_journal(args):
+    """遊戲事件日誌的成本：不同 fsync 策略下每回合的牌桌處理時間，以及重播的速度"""
+    results = {'bench': 'journal', 'revision': git_revision(), 'tables': args.tables,
+               'players': args.players, 'games': args.games, 'auto_discard': args.auto_discard}
+    path = args.path
+    for policy in [None] + JOURNAL_FSYNC_POLICIES:
+        if os.path.exists(path):
+            os.remove(path)
+        results[policy or 'off'] = journal_run(path, policy, args)
+    with open(path, 'rb') as f:
+        data = f.read()
+    start = time.perf_counter()
+    _, count = replay(data)
+    elapsed = time.perf_counter() - start
+    results['replay'] = {'records': count, 'bytes_per_record': round(len(data) / count, 1),
+                         'records_per_sec': round(count / elapsed)}
+    os.remove(path)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+def run_bots(args):
+    """量測伺服器端機器人座位對真人指令延遲的影響，以及機器人每回合的 CPU 成本
+
+    baseline 沒有機器人，其餘各開 bot_tables 張全機器人牌桌，決策分別在各種 --bot-executor 執行；真人是逐步模式的
+    延遲機器人。每回合的 CPU 取自伺服器的 oldmaid_bot_cpu_seconds（decide 與 apply 的總和）除以機器人的抽牌步數，
+    都只算真人負載期間（前後兩次讀取 /metrics 的差）。
+    """
+    results = {'bench': 'bots', 'revision': git_revision(), 'engine': args.engine, 'tables': args.tables,
+               'players': args.players, 'games': args.games, 'bot_tables': args.bot_tables, 'bot_delay': args.bot_delay}
+    modes = [('baseline', [])]
+    for executor in args.executors:
+        modes.append((executor, ['--bot-tables', str(args.bot_tables), '--bot-delay', str(args.bot_delay),
+                                 '--bot-executor', executor]))
+    for mode, extra in modes:
+        port = free_port()
+        metrics_port = free_port()
+        proc = start_server_process(args.engine, port, extra + ['--metrics-port', str(metrics_port)])
+        try:
+            before = fetch_metrics(metrics_port)
+            start = time.perf_counter()
+            samples, load = asyncio.run(latency_run(port, args))
+            elapsed = time.perf_counter() - start
+            after = fetch_metrics(metrics_port)
+        finally:
+            stop_server_process(proc)
+        metrics = {name: value - before.get(name, 0) for name, value in after.items()}
+        turns = metrics.get('oldmaid_bot_steps_total{step="draw"}', 0)
+        decide = metrics.get('oldmaid_bot_cpu_seconds_sum{stage="decide"}', 0)
+        applied = metrics.get('oldmaid_bot_cpu_seconds_sum{stage="apply"}', 0)
+        queued = metrics.get('oldmaid_bot_queue_seconds_count', 0)
+        results[mode] = {
+            'human_games': load['games'],
+            'human_errors': load['errors'],
+            'bot_turns_per_sec': round(turns / elapsed, 1) if elapsed > 0 else 0,
+            'bot_decide_us_per_turn': round(decide / turns * 1e6, 1) if turns else None,
+            'bot_apply_us_per_turn': round(applied / turns * 1e6, 1) if turns else None,
+            'bot_queue_ms_avg': round(metrics.get('oldmaid_bot_queue_seconds_sum', 0) / queued * 1000, 2) if queued else None,
+            'latency_p50_ms': {verb: summarize(values)['p50_ms'] for verb, values in sorted(samples.items())},
+            'latency_p99_ms': {verb: summarize(values)['p99_ms'] for verb, values in sorted(samples.items())},
+        }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+def run_accept(args):
+    """量測瞬間大量連線時每秒完成的登入數"""
+    port = free_port()
+    proc = start_server_process(args.engine, port, ['--login-queue-limit', str(args.login_queue_limit)])
+    try:
+        results = asyncio.run(accept_burst(port, args.connections, args.idle))
+    finally:
+        stop_server_process(proc)
+    results['engine'] = args.engine
+    report(results, args.json)
+
+def main():
+    parser = argparse.ArgumentParser(description="抽鬼牌遊戲伺服器基準測試")
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    accept_parser = subparsers.add_parser('accept', help="量測登入交握的吞吐量")
+    accept_parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread')
+    accept_parser.add_argument('--connections', type=int, default=2000, help="同時發起的登入數")
+    accept_parser.add_argument('--idle', type=int, default=100, help="只連線不送名字的慢速連線數")
+    accept_parser.add_argument('--login-queue-limit', type=int, default=5000, help="伺服器的等待交握上限")
+    accept_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    accept_parser.set_defaults(func=run_accept)
+
+    latency_parser = subparsers.add_parser('latency', help="量測每條指令的端到端延遲（p50/p95/p99/max）")
+    latency_parser.add_argument('--engine', choices=['thread', 'asyncio'], default='thread')
+    latency_parser.add_argument('--tables', type=int, default=10, help="牌桌數")
+    latency_parser.add_argument('--players', type=int, default=4, help="每桌玩家數")
+    latency_parser.add_argument('--games', type=int, default=3, help="每桌局數")
+    latency_parser.add_argument('--think', type=float, default=0, help="每個動作前的思考時間（秒）")
+    latency_parser.add_argument('--timeout', type=float, default=300, help="時間上限（秒）")
+    latency_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    latency_parser.set_defaults(func=run_latency)
+
+    scaling_parser = subparsers.add_parser('scaling', help="量測多行程模式的總吞吐量隨工作行程數的變化")
+    scaling_parser.add_argument('--engine', choices=['thread', 'asyncio'], default='asyncio')
+    scaling_parser.add_argument('--workers', type=int, nargs='+',
+                                default=sorted({1, 2, os.cpu_count() or 1}), help="要比較的工作行程數")
+    scaling_parser.add_argument('--clients', type=int, default=max(2, os.cpu_count() or 1), help="機器人行程數")
+    scaling_parser.add_argument('--tables', type=int, default=40, help="總牌桌數")
+    scaling_parser.add_argument('--players', type=int, default=4, help="每桌玩家數")
+    scaling_parser.add_argument('--games', type=int, default=5, help="每桌局數")
+    scaling_parser.add_argument('--timeout', type=float, default=300, help="每次執行的時間上限（秒）")
+    scaling_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    scaling_parser.set_defaults(func=run_scaling)
+
+    lobby_parser = subparsers.add_parser('lobby', help="比較傳統入座與配對佇列的首次發牌時間與座位使用率")
+    lobby_parser.add_argument('--engine', choices=['thread', 'asyncio'], default='asyncio')
+    lobby_parser.add_argument('--arrivals', type=int, default=200, help="陸續到達的玩家數")
+    lobby_parser.add_argument('--rate', type=float, default=100, help="每秒到達的玩家數")
+    lobby_parser.add_argument('--table-size', type=int, default=4, help="配對佇列每桌的人數")
+    lobby_parser.add_argument('--fill-timeout', type=float, default=2, help="配對佇列的等待上限（秒）")
+    lobby_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    lobby_parser.set_defaults(func=run_lobby)
+
+    ring_parser = subparsers.add_parser('ring', help="檢查閘道雜湊環的分佈與增加後端時的搬移比例")
+    ring_parser.add_argument('--backends', type=int, default=4)
+    ring_parser.add_argument('--replicas', type=int, default=VIRTUAL_NODES, help="每個後端的虛擬節點數")
+    ring_parser.add_argument('--keys', type=int, default=100000, help="模擬的牌桌數")
+    ring_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    ring_parser.set_defaults(func=run_ring)
+
+    timers_parser = subparsers.add_parser('timers', help="量測計時器新增與取消的成本（計時輪、heapq、threading.Timer）")
+    timers_parser.add_argument('--timers', type=int, default=100000, help="計時器數")
+    timers_parser.add_argument('--cancel-ratio', type=float, default=0.9, help="在到期前取消的比例")
+    timers_parser.add_argument('--max-delay', type=float, default=120, help="計時器的最長延遲（秒）")
+    timers_parser.add_argument('--thread-timers', type=int, default=1000, help="threading.Timer 對照組的數量（每個都是一條執行緒）")
+    timers_parser.add_argument('--seed', type=int, default=1)
+    timers_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    timers_parser.set_defaults(func=run_timers)
+
+    framing_parser = subparsers.add_parser('framing', help="量測接收與切分指令的成本（recv 與 recv_into）")
+    framing_parser.add_argument('--commands', type=int, default=500000, help="指令數")
+    framing_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    framing_parser.set_defaults(func=run_framing)
+
+    writes_parser = subparsers.add_parser('writes', help="比較合併寫出與 TCP_NODELAY 前後每回合的寫入次數、封包數與延遲")
+    writes_parser.add_argument('--engine', choices=['thread', 'asyncio'], default='asyncio')
+    writes_parser.add_argument('--tables', type=int, default=10, help="牌桌數")
+    writes_parser.add_argument('--players', type=int, default=4, help="每桌玩家數")
+    writes_parser.add_argument('--games', type=int, default=3, help="每桌局數")
+    writes_parser.add_argument('--pipeline', action='store_true', help="機器人一次送出整個回合的指令")
+    writes_parser.add_argument('--timeout', type=float, default=300, help="每次執行的時間上限（秒）")
+    writes_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    writes_parser.set_defaults(func=run_writes)
+
+    codec_parser = subparsers.add_parser('codec', help="比較文字與二進位協定的訊息大小、吞吐量與客戶端解析成本")
+    codec_parser.add_argument('--engine', choices=['thread', 'asyncio'], default='asyncio')
+    codec_parser.add_argument('--tables', type=int, default=10, help="牌桌數")
+    codec_parser.add_argument('--players', type=int, default=4, help="每桌玩家數")
+    codec_parser.add_argument('--games', type=int, default=3, help="每桌局數")
+    codec_parser.add_argument('--turns', type=int, default=2000, help="解析成本使用的模擬回合數")
+    codec_parser.add_argument('--repeat', type=int, default=20, help="解析成本重複次數")
+    codec_parser.add_argument('--seed', type=int, default=1)
+    codec_parser.add_argument('--timeout', type=float, default=300, help="每次執行的時間上限（秒）")
+    codec_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    codec_parser.set_defaults(func=run_codec)
+
+    journal_parser = subparsers.add_parser('journal', help="量測遊戲事件日誌各 fsync 策略的成本與重播速度")
+    journal_parser.add_argument('--tables', type=int, default=200, help="牌桌數")
+    journal_parser.add_argument('--players', type=int, default=4, help="每桌玩家數")
+    journal_parser.add_argument('--games', type=int, default=10, help="每桌局數")
+    journal_parser.add_argument('--auto-discard', action='store_true', help="牌桌自動丟棄配對")
+    journal_parser.add_argument('--path', default='bench.journal', help="暫存的日誌檔")
+    journal_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    journal_parser.set_defaults(func=run_journal)
+
+    bots_parser = subparsers.add_parser('bots', help="量測全機器人牌桌對真人指令延遲的影響與機器人每回合的 CPU 成本")
+    bots_parser.add_argument('--engine', choices=['thread', 'asyncio'], default='asyncio')
+    bots_parser.add_argument('--bot-tables', type=int, default=500, help="全機器人牌桌數（每桌 4 個機器人座位）")
+    bots_parser.add_argument('--bot-delay', type=float, default=BOT_DELAY, help="機器人每一步之前等待的秒數，0 為壓力測試")
+    bots_parser.add_argument('--executors', choices=BOT_EXECUTORS, nargs='+', default=BOT_EXECUTORS,
+                             help="要比較的機器人決策執行方式")
+    bots_parser.add_argument('--tables', type=int, default=10, help="真人牌桌數")
+    bots_parser.add_argument('--players', type=int, default=4, help="每張真人牌桌的玩家數")
+    bots_parser.add_argument('--games', type=int, default=10, help="每張真人牌桌的局數（全機器人牌桌同時開始，量測期間要涵蓋好幾輪）")
+    bots_parser.add_argument('--think', type=float, default=0, help="真人每個動作前的思考時間（秒）")
+    bots_parser.add_argument('--timeout', type=float, default=300, help="每次執行的時間上限（秒）")
+    bots_parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    bots_parser.set_defaults(func=run_bots)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from socketgamecards import Hand, ranks
+import socketgamecodec as codec
+
+# 伺服器地址
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 5555
+
+class BotStats:
+    """負載產生器的統計數字"""
+
+    def __init__(self):
+        self.games = 0  # 完成的局數
+        self.commands = 0  # 送出的指令數
+        self.errors = 0  # 連線或協定錯誤
+        self.bytes_received = 0  # 登入後收到的位元組數
+        self.reconnects = 0  # 以重新連線代碼回到座位的次數
+        self.reconnect_seconds = []  # 每次從中斷到收到牌桌狀態的時間
+        self.start_time = time.perf_counter()
+
+    def report(self):
+        """整理成可輸出的結果"""
+        elapsed = time.perf_counter() - self.start_time
+        resumed = self.reconnect_seconds
+        return {
+            'seconds': round(elapsed, 3),
+            'games': self.games,
+            'commands': self.commands,
+            'errors': self.errors,
+            'bytes_received': self.bytes_received,
+            'reconnects': self.reconnects,
+            'reconnect_ms_avg': round(1000 * sum(resumed) / len(resumed), 2) if resumed else 0,
+            'reconnect_ms_max': round(1000 * max(resumed), 2) if resumed else 0,
+            'games_per_sec': round(self.games / elapsed, 2) if elapsed > 0 else 0,
+            'commands_per_sec': round(self.commands / elapsed, 1) if elapsed > 0 else 0,
+        }
+
+class BotClient:
+    """不需要 Tk 的自動玩家，協定與 ClientGUI 相同（名字交握、手牌差異更新、文字或二進位指令）"""
+
+    def __init__(self, name, host=SERVER_HOST, port=SERVER_PORT, table=None, games=1,
+                 pipeline=True, think_time=0, stats=None, protocol=0, drop_rate=0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.table = table
+        self.games = games  # 這張牌桌要玩幾局
+        self.pipeline = pipeline  # 是否一次送出整個回合的指令
+        self.think_time = think_time  # 每個動作之前等待的秒數
+        self.stats = stats or BotStats()
+        self.protocol = protocol  # 要求的二進位協定版本，登入後改為伺服器接受的版本（0 表示文字協定）
+        self.drop_rate = drop_rate  # 每個回合開始時中斷連線的機率（模擬不穩定的網路）
+        self.session = None  # 伺服器發給的 (桌號, 重新連線代碼)
+        self.dropped_at = None  # 自己中斷連線的時間，重新連線後收到牌桌狀態時清除
+        self.reader = None
+        self.writer = None
+        self.hand = Hand()
+        self.hand_seq = 0
+        self.games_played = 0
+        self.turn_step = None  # 逐步模式下目前回合進行到哪一步
+        self.finished = asyncio.Event()
+
+    async def connect_to_server(self):
+        """連接到伺服器並送出名字，回傳歡迎訊息；有重新連線代碼時回到原本的座位"""
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        await self.reader.readline()  # 請輸入你的名字
+        login = f"{self.name} delta=1"
+        table = self.table
+        if self.session is not None:
+            table, token = self.session
+            login += f" resume={token}"
+        if table is not None:
+            login += f" table={table}"  # 重新連線時讓閘道與多行程模式找到牌桌所在的伺服器
+        if self.protocol:
+            login += f" proto={self.protocol}"
+        self.writer.write((login + "\n").encode())
+        welcome = (await self.reader.readline()).decode().strip()
+        if not welcome.startswith("歡迎"):
+            raise ConnectionError(f"{self.name} 無法加入: {welcome}")
+        self.protocol = codec.accepted_version(welcome)  # 較舊的伺服器不認得 proto，繼續使用文字協定
+        return welcome
+
+    async def receive_messages(self):
+        """接收伺服器訊息直到連線關閉或打完指定局數，自己中斷的連線以重新連線代碼接回"""
+        try:
+            while True:
+                if self.protocol:
+                    await self.receive_frames()
+                else:
+                    await self.receive_lines()
+                if self.finished.is_set() or self.dropped_at is None:
+                    break
+                await self.connect_to_server()
+                self.stats.reconnects += 1
+        except (OSError, ValueError, ConnectionError) as e:
+            print(f"{self.name} 接收訊息時發生錯誤: {e}")
+            self.stats.errors += 1
+        finally:
+            self.finished.set()
+            self.writer.close()
+
+    async def receive_lines(self):
+        """文字協定：一行一則訊息"""
+        while not self.finished.is_set():
+            line = await self.reader.readline()
+            if not line:
+                break
+            self.stats.bytes_received += len(line)
+            await self.process_message(line.decode().rstrip("\n"))
+
+    async def receive_frames(self):
+        """二進位協定：切出框架後依操作碼查表呼叫處理函式"""
+        frames = codec.FrameReader()
+        while not self.finished.is_set():
+            data = await self.reader.read(65536)
+            if not data:
+                break
+            self.stats.bytes_received += len(data)
+            for opcode, payload in frames.feed(data):
+                handler = self.event_handlers.get(opcode)
+                if handler is not None:
+                    await handler(self, *codec.decode_event(opcode, payload))
+
+    def send(self, *commands):
+        """送出一或多條指令（同一次寫入），二進位協定下查表換成對應的框架"""
+        if self.protocol:
+            self.writer.write(b''.join(codec.COMMAND_FRAMES[command] for command in commands))
+        else:
+            self.writer.write(("\n".join(commands) + "\n").encode())
+        self.stats.commands += len(commands)
+
+    async def think(self):
+        if self.think_time:
+            await asyncio.sleep(self.think_time)
+
+    def has_pairs(self):
+        """手牌中是否有可丟棄的配對"""
+        return any(self.hand.count(rank) >= 2 for rank in ranks)
+
+    async def process_message(self, message):
+        """處理文字協定的伺服器訊息"""
+        if message.startswith("手牌快照 "):
+            snapshot = json.loads(message.split(" ", 1)[1])
+            await self.on_hand_snapshot(snapshot['seq'], snapshot['hand'])
+        elif message.startswith("手牌變動 "):
+            update = json.loads(message.split(" ", 1)[1])
+            await self.on_hand_delta(update['seq'], update.get('add', []), update.get('remove', []))
+        elif message.startswith("牌桌狀態 "):
+            await self.on_table_state(json.loads(message.split(" ", 1)[1]))
+        elif message.startswith("重新連線代碼 "):
+            session = json.loads(message.split(" ", 1)[1])
+            await self.on_session(session['table'], session['token'])
+        elif "輪到你操作" in message:
+            await self.play_turn()
+        elif "贏得了遊戲" in message:
+            await self.on_winner(message.split(" 贏得了遊戲", 1)[0])
+        elif "遊戲結束，是否再來一局？" in message:
+            await self.on_play_again()
+        elif "所有玩家同意再來一局，請準備開始。" in message:
+            await self.on_play_again_accepted()
+        elif "有人拒絕再來一局，遊戲結束。" in message:
+            await self.on_play_again_declined()
+        else:
+            await self.on_text(message)
+
+    async def on_hand_snapshot(self, seq, cards):
+        self.hand = Hand(cards)
+        self.hand_seq = seq
+        await self.hand_changed()
+
+    async def on_hand_delta(self, seq, added, removed):
+        if seq != self.hand_seq + 1:
+            self.send("resync")
+            return
+        self.hand_seq = seq
+        for card in added:
+            self.hand.add(card)
+        for card in removed:
+            self.hand.remove(card)
+        await self.hand_changed()
+
+    async def on_table_state(self, state):
+        """重新連線後的牌桌狀態：取代斷線期間漏掉的訊息，從目前的階段接著玩"""
+        if self.dropped_at is not None:
+            self.stats.reconnect_seconds.append(time.perf_counter() - self.dropped_at)
+            self.dropped_at = None
+        self.hand = Hand(state['hand'])
+        self.hand_seq = state['seq']
+        self.turn_step = None
+        if state['phase'] == 'playing' and state['turn'] == state['seat']:
+            if not state['drawn']:
+                await self.play_turn()
+                return
+            if self.has_pairs():
+                self.send("discard auto", "end")
+            else:
+                self.send("end")
+        elif state['phase'] == 'play_again' and not state['answered']:
+            await self.on_play_again()
+        elif state['phase'] == 'waiting' and not state['ready']:
+            self.send("start")
+
+    async def on_session(self, table_id, token):
+        self.session = (table_id, token)
+
+    async def on_winner(self, name):
+        self.games_played += 1
+        self.turn_step = None
+        if name == self.name:
+            self.stats.games += 1
+
+    async def on_play_again(self):
+        await self.think()
+        self.send("playagain yes" if self.games_played < self.games else "playagain no")
+
+    async def on_play_again_accepted(self):
+        self.hand = Hand()
+        self.send("start")
+
+    async def on_play_again_declined(self):
+        self.finished.set()
+
+    async def on_text(self, message):
+        if "無效的指令" in message or "格式錯誤" in message:
+            self.stats.errors += 1
+
+    async def on_ignored(self, *fields):
+        pass
+
+    async def play_turn(self):
+        """輪到自己：抽牌、丟棄配對、結束回合"""
+        await self.think()
+        if self.drop_rate and self.session is not None and random.random() < self.drop_rate:
+            self.drop_connection()
+            return
+        if self.pipeline:
+            # 還不知道會抽到什麼牌，一律請伺服器丟棄配對；沒有配對時伺服器不做任何事，也不算錯誤
+            self.send("draw", "discard auto", "end")
+            return
+        self.turn_step = 'draw'
+        self.send("draw")
+
+    def drop_connection(self):
+        """模擬不穩定的網路：直接中斷連線（不送出任何指令），接收迴圈結束後以重新連線代碼接回座位"""
+        self.dropped_at = time.perf_counter()
+        self.writer.transport.abort()
+
+    async def hand_changed(self):
+        """逐步模式：等到上一個動作的手牌更新到了才送下一個動作"""
+        if self.turn_step == 'draw':
+            await self.think()
+            if self.has_pairs():
+                self.turn_step = 'discard'
+                self.send("discard auto")
+                return
+            self.turn_step = None
+            self.send("end")
+        elif self.turn_step == 'discard':
+            await self.think()
+            self.turn_step = None
+            self.send("end")
+
+    # 二進位協定：操作碼 -> 處理函式（參數由 socketgamecodec.decode_event 解出）
+    event_handlers = {
+        codec.TEXT: on_text,
+        codec.HAND_SNAPSHOT: on_hand_snapshot,
+        codec.HAND_DELTA: on_hand_delta,
+        codec.TABLE_STATE: on_table_state,
+        codec.GAME_STARTED: on_ignored,
+        codec.YOUR_TURN: lambda self: self.play_turn(),
+        codec.DREW: on_ignored,
+        codec.DISCARDED: on_ignored,
+        codec.WINNER: on_winner,
+        codec.PLAY_AGAIN: on_play_again,
+        codec.PLAY_AGAIN_ACCEPTED: on_play_again_accepted,
+        codec.PLAY_AGAIN_DECLINED: on_play_again_declined,
+        codec.SESSION: on_session,
+    }
+
+async def run_table(table_id, players, args, stats, bot_class=BotClient, **bot_kwargs):
+    """一張牌桌：所有機器人都入座後才一起按準備開始"""
+    bots = [bot_class(f"bot{table_id}-{i}", args.host, args.port, table=f"load{table_id}", games=args.games,
+                      pipeline=args.pipeline, think_time=args.think, stats=stats, **bot_kwargs)
+            for i in range(players)]
+    try:
+        for bot in bots:
+            await bot.connect_to_server()
+    except (OSError, ConnectionError) as e:
+        print(f"牌桌 {table_id} 連線失敗: {e}")
+        stats.errors += 1
+        for bot in bots:
+            if bot.writer is not None:
+                bot.writer.close()
+        return
+    tasks = [asyncio.create_task(bot.receive_messages()) for bot in bots]
+    for bot in bots:
+        bot.send("start")
+    await asyncio.gather(*tasks)
+
+async def run_lobby_bot(index, args, stats):
+    """配對佇列模式：機器人不指定牌桌也不按準備開始，由伺服器湊桌後自動開始"""
+    bot = BotClient(f"bot{args.table_offset}-{index}", args.host, args.port, games=args.games,
+                    pipeline=args.pipeline, think_time=args.think, stats=stats, protocol=args.proto,
+                    drop_rate=args.drop_rate)
+    try:
+        await bot.connect_to_server()
+    except (OSError, ConnectionError) as e:
+        print(f"{bot.name} 連線失敗: {e}")
+        stats.errors += 1
+        return
+    await bot.receive_messages()
+
+async def run_load(args):
+    """在 M 張牌桌上同時跑 N 個機器人，直到每張牌桌打完指定局數"""
+    stats = BotStats()
+    if args.lobby:
+        jobs = [run_lobby_bot(i, args, stats) for i in range(args.bots)]
+        try:
+            await asyncio.wait_for(asyncio.gather(*jobs), args.timeout)
+        except asyncio.TimeoutError:
+            print("已達時間上限，停止負載測試。")
+        return stats.report()
+    per_table = max(2, args.bots // args.tables)
+    jobs = [run_table(args.table_offset + t, per_table, args, stats, protocol=args.proto, drop_rate=args.drop_rate)
+            for t in range(args.tables)]
+    try:
+        await asyncio.wait_for(asyncio.gather(*jobs), args.timeout)
+    except asyncio.TimeoutError:
+        print("已達時間上限，停止負載測試。")
+    return stats.report()
+
+def main():
+    parser = argparse.ArgumentParser(description="抽鬼牌遊戲機器人與負載產生器")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--bots', type=int, default=4, help="機器人總數")
+    parser.add_argument('--tables', type=int, default=1, help="牌桌數，機器人平均分配")
+    parser.add_argument('--lobby', action='store_true', help="不指定牌桌，交給伺服器的配對佇列（伺服器需以 --lobby 啟動）")
+    parser.add_argument('--table-offset', type=int, default=0, help="桌號從這個數字開始，讓多個負載產生器不會坐進同一桌")
+    parser.add_argument('--games', type=int, default=1, help="每張牌桌要玩的局數（含 playagain）")
+    parser.add_argument('--think', type=float, default=0, help="每個動作前的思考時間（秒）")
+    parser.add_argument('--no-pipeline', dest='pipeline', action='store_false', help="每個動作等伺服器回應後才送下一個")
+    parser.add_argument('--proto', type=int, default=0, help="要求的二進位協定版本（0 表示文字協定）")
+    parser.add_argument('--drop-rate', type=float, default=0,
+                        help="每個回合開始時以這個機率中斷連線，再以重新連線代碼回到座位（模擬不穩定的行動網路）")
+    parser.add_argument('--timeout', type=float, default=300, help="負載測試的時間上限（秒）")
+    parser.add_argument('--json', action='store_true', help="以 JSON 輸出結果")
+    args = parser.parse_args()
+    results = asyncio.run(run_load(args))
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+    else:
+        for key, value in results.items():
+            print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import json
+import random
+
+# 撲克牌編碼：每張牌用整數表示，第 k 副牌（從 0 起算）的編號為 k * 54 + (0~53)
+# 0~51 為 花色索引 * 13 + (點數 - 1)，52、53 為兩張鬼牌
+# 一手牌用 Hand 保存，內含編號串列、位置索引、依點數分組的索引與位元遮罩
+suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+ranks = list(range(1, 14))  # 1: Ace, 11: Jack, 12: Queen, 13: King
+JOKER = 'Joker'
+JOKER_RANK = 0  # 將鬼牌的 rank 設置為 0
+DECK_SIZE = len(suits) * len(ranks) + 2
+FULL_DECK = tuple(range(DECK_SIZE))
+
+SUIT_SYMBOLS = {
+    "Hearts": "♥",
+    "Diamonds": "♦",
+    "Clubs": "♣",
+    "Spades": "♠",
+    "Joker": "🃏"
+}
+RANK_TEXT = {1: 'A', 11: 'J', 12: 'Q', 13: 'K'}
+
+# 預先算好每張牌的花色、點數、字典、JSON 與顯示文字，查表即可
+CARD_SUIT = [suit for suit in suits for _ in ranks] + [JOKER, JOKER]
+CARD_RANK = [rank for _ in suits for rank in ranks] + [JOKER_RANK, JOKER_RANK]
+CARD_DICTS = tuple({'suit': CARD_SUIT[card], 'rank': CARD_RANK[card]} for card in FULL_DECK)
+CARD_JSON = tuple(json.dumps(card, ensure_ascii=False) for card in CARD_DICTS)
+CARD_STRINGS = tuple('鬼牌' if CARD_SUIT[card] == JOKER
+                     else f"{SUIT_SYMBOLS[CARD_SUIT[card]]} {RANK_TEXT.get(CARD_RANK[card], str(CARD_RANK[card]))}"
+                     for card in FULL_DECK)
+
+def create_deck(decks=1):
+    """建立 decks 副包含鬼牌的撲克牌（牌的編號串列）"""
+    return list(range(DECK_SIZE * decks))
+
+def card_rank(card):
+    """牌的點數，鬼牌為 0"""
+    return CARD_RANK[card % DECK_SIZE]
+
+def is_joker(card):
+    """是否為鬼牌"""
+    return card % DECK_SIZE >= DECK_SIZE - 2
+
+def card_from_dict(card):
+    """將線路上的 {'suit', 'rank'(, 'deck')} 字典轉成牌的編號，無效時拋出 ValueError"""
+    suit = card['suit']
+    rank = card['rank']
+    deck = card.get('deck', 0)
+    if not isinstance(deck, int) or deck < 0:
+        raise ValueError(f"無效的牌: {card}")
+    if suit == JOKER:
+        return deck * DECK_SIZE + DECK_SIZE - 2
+    if suit not in suits or rank not in ranks:
+        raise ValueError(f"無效的牌: {card}")
+    return deck * DECK_SIZE + suits.index(suit) * len(ranks) + rank - 1
+
+def card_to_dict(card):
+    """將牌的編號轉成線路上使用的字典，第二副以後的牌多帶 deck 欄位"""
+    if card < DECK_SIZE:
+        return CARD_DICTS[card]
+    return dict(CARD_DICTS[card % DECK_SIZE], deck=card // DECK_SIZE)
+
+def card_to_json(card):
+    """單張牌的 JSON 表示"""
+    if card < DECK_SIZE:
+        return CARD_JSON[card]
+    return json.dumps(card_to_dict(card), ensure_ascii=False)
+
+def card_to_string(card):
+    """將卡片轉換為易讀的字串表示"""
+    return CARD_STRINGS[card % DECK_SIZE]
+
+def mask_of(cards):
+    """將多張牌的編號轉成遮罩"""
+    mask = 0
+    for card in cards:
+        mask |= 1 << card
+    return mask
+
+def hand_size(mask):
+    """手牌張數"""
+    return mask.bit_count()
+
+def iter_cards(mask):
+    """依編號由小到大列出手牌中的每張牌"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def hand_to_json(mask):
+    """將手牌遮罩轉成線路上的 JSON 陣列"""
+    return '[' + ', '.join(card_to_json(card) for card in iter_cards(mask)) + ']'
+
+class Hand:
+    """一手牌：支援 O(1) 加牌、移除、隨機抽出一張，以及 O(1) 查詢某點數的張數"""
+
+    __slots__ = ('cards', 'positions', 'by_rank', 'mask')
+
+    def __init__(self, cards=()):
+        self.cards = []  # 牌的編號，順序不重要
+        self.positions = {}  # 牌的編號 -> 在 cards 中的位置
+        self.by_rank = [[] for _ in range(len(ranks) + 1)]  # 點數 -> 持有的該點數的牌
+        self.mask = 0  # 位元遮罩，用於一次檢查多張牌
+        for card in cards:
+            self.add(card)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __contains__(self, card):
+        return card in self.positions
+
+    def add(self, card):
+        """加入一張牌"""
+        self.positions[card] = len(self.cards)
+        self.cards.append(card)
+        self.by_rank[card_rank(card)].append(card)
+        self.mask |= 1 << card
+
+    def remove(self, card):
+        """移除一張牌：把最後一張牌搬到空出的位置（swap-remove）"""
+        index = self.positions.pop(card)
+        last = self.cards.pop()
+        if last != card:
+            self.cards[index] = last
+            self.positions[last] = index
+        self.by_rank[card_rank(card)].remove(card)  # 同點數最多 4 * 副數 張
+        self.mask &= ~(1 << card)
+
+    def remove_all(self, cards):
+        """移除多張牌"""
+        for card in cards:
+            self.remove(card)
+
+    def pop_random(self, rng=random):
+        """隨機移除並回傳一張牌"""
+        card = self.cards[rng.randrange(len(self.cards))]
+        self.remove(card)
+        return card
+
+    def take_pairs(self, rank=None):
+        """移除並回傳所有可配對丟棄的牌（鬼牌除外），指定 rank 時只處理該點數"""
+        pairs = []
+        for r in (range(1, len(self.by_rank)) if rank is None else (rank,)):
+            held = self.by_rank[r]
+            if r != JOKER_RANK and len(held) >= 2:
+                pairs.extend(held[:len(held) // 2 * 2])
+        self.remove_all(pairs)
+        return pairs
+
+    def count(self, rank):
+        """持有某點數的張數"""
+        return len(self.by_rank[rank])
+
+    def contains_all(self, cards):
+        """是否持有全部這些牌（同一張牌不能出現兩次）"""
+        wanted = mask_of(cards)
+        return hand_size(wanted) == len(cards) and wanted & self.mask == wanted
+
+    def to_json(self):
+        """將手牌依編號排序轉成線路上的 JSON 陣列"""
+        return hand_to_json(self.mask)
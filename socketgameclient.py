@@ -1,12 +1,18 @@
 import socket
 import threading
+import time
 import json
+import bisect
 import tkinter as tk
 from tkinter import messagebox, ttk
+from socketgamecards import card_to_dict
+import socketgamecodec as codec
 
 # 伺服器地址
 SERVER_HOST = '127.0.0.1'
 SERVER_PORT = 5555
+RECONNECT_ATTEMPTS = 5  # 連線中斷後以重新連線代碼嘗試幾次
+RECONNECT_DELAY = 1  # 每次嘗試前等待幾秒
 
 # 花色符號
 SUIT_SYMBOLS = {
@@ -25,8 +31,14 @@ class ClientGUI:
         self.receive_thread = None
         self.name = ""
         self.hand = []  # 玩家手牌
+        self.hand_ids = []  # 手牌的牌編號（差異更新模式）
+        self.hand_seq = 0  # 最後套用的手牌更新序號
+        self.resync_pending = False  # 是否已請伺服器重送手牌快照
         self.selected_cards = []  # 選中的牌
         self.has_drawn = False  # 每回合是否已抽牌
+        self.protocol = 0  # 伺服器在歡迎訊息中接受的二進位協定版本，0 表示文字協定
+        self.session = None  # 伺服器發給的 (桌號, 重新連線代碼)
+        self.closing = False  # 使用者或遊戲結束主動關閉連線時不再重新連線
 
         self.create_login_frame()
 
@@ -52,9 +64,9 @@ class ClientGUI:
             messagebox.showerror("連線錯誤", f"無法連接到伺服器: {e}")
             return
 
-        # 發送名字給伺服器
+        # 發送名字給伺服器，要求以差異方式更新手牌並改用二進位協定（較舊的伺服器會忽略 proto，繼續使用文字）
         try:
-            self.sock.sendall((self.name + "\n").encode())
+            self.sock.sendall(f"{self.name} delta=1 proto={codec.PROTOCOL_VERSION}\n".encode())
         except Exception as e:
             messagebox.showerror("發送錯誤", f"無法發送名字: {e}")
             return
@@ -105,6 +117,9 @@ class ClientGUI:
         self.discard_button = tk.Button(self.action_frame, text="配對丟棄", command=self.discard_pairs, state=tk.DISABLED)
         self.discard_button.pack(side=tk.LEFT, padx=5)
 
+        self.auto_button = tk.Button(self.action_frame, text="自動配對", command=self.auto_discard, state=tk.DISABLED)
+        self.auto_button.pack(side=tk.LEFT, padx=5)
+
         self.end_button = tk.Button(self.action_frame, text="結束回合", command=self.end_turn, state=tk.DISABLED)
         self.end_button.pack(side=tk.LEFT, padx=5)
 
@@ -241,10 +256,17 @@ class ClientGUI:
             rank_text = str(rank)
         return f"{suit} {rank_text}"
 
+    def send_command(self, command):
+        """送出沒有參數的指令，二進位協定下查表換成對應的框架"""
+        if self.protocol:
+            self.sock.sendall(codec.COMMAND_FRAMES[command])
+        else:
+            self.sock.sendall((command + "\n").encode())
+
     def start_game(self):
         """發送準備開始遊戲指令"""
         try:
-            self.sock.sendall("start\n".encode())
+            self.send_command("start")
             self.update_info("你已準備開始遊戲，等待其他玩家。")
             self.start_button.config(state=tk.DISABLED)  # 禁用開始遊戲按鈕
         except Exception as e:
@@ -253,7 +275,7 @@ class ClientGUI:
     def draw_card(self):
         """發送抽牌指令"""
         try:
-            self.sock.sendall("draw\n".encode())
+            self.send_command("draw")
             # self.update_info("你已發送抽牌請求。")
             self.draw_button.config(state=tk.DISABLED)
             self.end_button.config(state=tk.NORMAL)  # 允許結束回合
@@ -275,8 +297,11 @@ class ClientGUI:
             discard_info = {
                 'cards': [self.hand[idx] for idx in self.selected_cards]
             }
-            discard_json = json.dumps(discard_info, ensure_ascii=False)
-            self.sock.sendall((f"discard {discard_json}\n").encode())
+            if self.protocol:
+                self.sock.sendall(codec.encode_discard([self.hand_ids[idx] for idx in self.selected_cards]))
+            else:
+                discard_json = json.dumps(discard_info, ensure_ascii=False)
+                self.sock.sendall((f"discard {discard_json}\n").encode())
             discarded_str = ', '.join([self.card_to_string(card) for card in discard_info['cards']])
             # self.update_info(f"你已發送配對丟棄請求: {discarded_str}")
             self.discard_button.config(state=tk.DISABLED)
@@ -285,16 +310,25 @@ class ClientGUI:
         except Exception as e:
             messagebox.showerror("發送錯誤", f"無法發送配對丟棄指令: {e}")
 
+    def auto_discard(self):
+        """請伺服器直接丟棄手牌中所有配對"""
+        try:
+            self.send_command("discard auto")
+            self.selected_cards = []
+        except Exception as e:
+            messagebox.showerror("發送錯誤", f"無法發送自動配對指令: {e}")
+
     def end_turn(self):
         """發送結束回合指令"""
         if not self.has_drawn:
             self.update_info("你必須先抽牌才能結束回合。")
             return
         try:
-            self.sock.sendall("end\n".encode())
+            self.send_command("end")
             self.update_info("你已結束回合。")
             self.draw_button.config(state=tk.DISABLED)
             self.discard_button.config(state=tk.DISABLED)
+            self.auto_button.config(state=tk.DISABLED)
             self.end_button.config(state=tk.DISABLED)
             self.has_drawn = False
         except Exception as e:
@@ -318,28 +352,93 @@ class ClientGUI:
         return False
 
     def receive_messages(self):
-        """接收伺服器訊息"""
-        buffer = ""
+        """接收伺服器訊息，連線中斷時以重新連線代碼回到原本的座位"""
+        while True:
+            self.receive_connection()
+            if self.closing or not self.reconnect():
+                self.update_info("連線已關閉。")
+                break
+
+    def receive_connection(self):
+        """接收一條連線的訊息直到連線關閉：歡迎訊息之前是一行一行的文字，伺服器接受二進位協定後改為切分框架"""
+        buffer = b""
+        frames = codec.FrameReader()
+        self.protocol = 0
         while True:
             try:
-                data = self.sock.recv(4096).decode()
+                data = self.sock.recv(4096)
                 if not data:
-                    self.update_info("連線已關閉。")
                     break
+                if self.protocol:
+                    for opcode, payload in frames.feed(data):
+                        self.process_event(opcode, payload)
+                    continue
                 buffer += data
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    self.process_message(line)
+                while b'\n' in buffer and not self.protocol:
+                    line, buffer = buffer.split(b'\n', 1)
+                    self.process_message(line.decode())
+                if self.protocol and buffer:
+                    # 跟著歡迎訊息一起收到的框架
+                    for opcode, payload in frames.feed(buffer):
+                        self.process_event(opcode, payload)
+                    buffer = b""
             except Exception as e:
-                self.update_info(f"接收訊息時發生錯誤: {e}")
+                if not self.closing:
+                    self.update_info(f"接收訊息時發生錯誤: {e}")
                 break
 
+    def reconnect(self):
+        """以重新連線代碼回到原本的座位，回傳 False 表示沒有代碼或重試都失敗"""
+        if self.session is None:
+            return False
+        table_id, token = self.session
+        self.session = None  # 代碼只能用一次，重新連線成功後伺服器會發新的
+        for attempt in range(RECONNECT_ATTEMPTS):
+            self.update_info(f"連線中斷，正在重新連線（第 {attempt + 1} 次）...")
+            time.sleep(RECONNECT_DELAY)
+            try:
+                sock = socket.create_connection((SERVER_HOST, SERVER_PORT))
+                # table= 讓閘道與多行程模式找到牌桌所在的伺服器
+                sock.sendall(f"{self.name} delta=1 proto={codec.PROTOCOL_VERSION} table={table_id} resume={token}\n".encode())
+            except OSError:
+                continue
+            self.sock = sock
+            return True
+        return False
+
+    def process_event(self, opcode, payload):
+        """處理二進位協定的伺服器事件：依操作碼查表，不必掃描字串"""
+        handler = self.event_handlers.get(opcode)
+        if handler is not None:
+            handler(self, *codec.decode_event(opcode, payload))
+
     def process_message(self, message):
-        """處理伺服器訊息"""
+        """處理文字協定的伺服器訊息（二進位協定下沒有專屬操作碼的 TEXT 事件也由這裡處理）"""
         if message.startswith("你的手牌"):
             # 期待下一行是 JSON 手牌
             pass
-        elif message.startswith("[{"):  # JSON 手牌陣列
+        elif message.startswith("手牌快照 "):
+            try:
+                snapshot = json.loads(message.split(" ", 1)[1])
+                self.set_hand(snapshot['seq'], snapshot['hand'])
+            except Exception as e:
+                self.update_info(f"處理手牌時發生錯誤: {e}")
+        elif message.startswith("牌桌狀態 "):
+            try:
+                self.apply_state(json.loads(message.split(" ", 1)[1]))
+            except Exception as e:
+                self.update_info(f"處理牌桌狀態時發生錯誤: {e}")
+        elif message.startswith("重新連線代碼 "):
+            session = json.loads(message.split(" ", 1)[1])
+            self.set_session(session['table'], session['token'])
+        elif message.startswith("手牌變動 "):
+            try:
+                update = json.loads(message.split(" ", 1)[1])
+                self.update_hand(update['seq'], update.get('add', []), update.get('remove', []))
+            except Exception as e:
+                self.update_info(f"處理手牌時發生錯誤: {e}")
+                self.request_resync()
+        elif message.startswith("[{") or message == "[]":  # JSON 手牌陣列
             try:
                 self.hand = json.loads(message)
                 self.update_hand_display()
@@ -348,20 +447,15 @@ class ClientGUI:
                 self.update_info(f"處理手牌時發生錯誤: {e}")
         else:
             self.update_info(message)
-            if "輪到你操作" in message:
-                # 啟用操作按鈕
-                self.draw_button.config(state=tk.NORMAL)
-                self.end_button.config(state=tk.DISABLED)  # 必須先抽牌
-                # 檢查是否有可配對的牌才能啟用丟棄按鈕
-                if self.find_pairs():
-                    self.discard_button.config(state=tk.DISABLED)  # 需手動選擇
-                else:
-                    self.discard_button.config(state=tk.DISABLED)
-                self.has_drawn = False
+            if message.startswith("歡迎"):
+                self.protocol = codec.accepted_version(message)
+            elif "輪到你操作" in message:
+                self.enable_turn()
             elif "現在不是你的回合" in message or "回合結束" in message:
                 # 禁用操作按鈕
                 self.draw_button.config(state=tk.DISABLED)
                 self.discard_button.config(state=tk.DISABLED)
+                self.auto_button.config(state=tk.DISABLED)
                 self.end_button.config(state=tk.DISABLED)
             elif "贏得了遊戲" in message:
                 # 這裡不再提示，僅等待伺服器的再來一局請求
@@ -369,39 +463,154 @@ class ClientGUI:
             elif "遊戲結束，是否再來一局？" in message:
                 self.prompt_play_again_request()
             elif "有人拒絕再來一局，遊戲結束。" in message:
-                messagebox.showinfo("遊戲結束", message)
-                self.sock.close()
-                self.master.quit()
+                self.play_again_declined(message)
             elif "所有玩家同意再來一局，請準備開始。" in message:
-                messagebox.showinfo("遊戲重新開始", message)
-                self.clear_hand_display()
-                self.start_button.config(state=tk.NORMAL)  # 啟用開始遊戲按鈕
+                self.play_again_accepted(message)
             elif "你丟棄的牌是" in message or "你抽到的牌是" in message:
                 # 伺服器已發送更新後的手牌，等待接收
                 pass
 
+    def set_hand(self, seq, cards):
+        """套用完整手牌快照"""
+        self.hand_seq = seq
+        self.hand_ids = sorted(cards)
+        self.resync_pending = False
+        self.apply_hand_ids()
+
+    def update_hand(self, seq, added, removed):
+        """套用一筆手牌變動"""
+        if seq != self.hand_seq + 1:
+            # 漏掉了某次更新，請伺服器重送快照
+            self.request_resync()
+            return
+        self.hand_seq = seq
+        for card in added:
+            bisect.insort(self.hand_ids, card)
+        for card in removed:
+            self.hand_ids.remove(card)
+        self.apply_hand_ids()
+
+    def set_session(self, table_id, token):
+        self.session = (table_id, token)
+
+    def apply_state(self, state):
+        """重新連線後的牌桌狀態：重建手牌與按鈕，不必等整桌重新開始"""
+        self.set_hand(state['seq'], state['hand'])
+        seats = '、'.join(f"{name} {count} 張" + ("" if connected else "（斷線中）")
+                         for name, count, connected in state['players'])
+        self.update_info(f"已重新連線，各玩家剩餘牌數: {seats}")
+        for button in (self.draw_button, self.discard_button, self.auto_button, self.end_button):
+            button.config(state=tk.DISABLED)
+        self.start_button.config(state=tk.NORMAL if state['phase'] == 'waiting' and not state['ready'] else tk.DISABLED)
+        if state['phase'] == 'playing' and state['turn'] == state['seat']:
+            self.enable_turn()
+            if state['drawn']:
+                self.draw_button.config(state=tk.DISABLED)
+                self.end_button.config(state=tk.NORMAL)
+                self.has_drawn = True
+        elif state['phase'] == 'play_again' and not state['answered']:
+            self.prompt_play_again_request()
+
+    def enable_turn(self):
+        """輪到自己：啟用操作按鈕"""
+        self.draw_button.config(state=tk.NORMAL)
+        self.end_button.config(state=tk.DISABLED)  # 必須先抽牌
+        # 檢查是否有可配對的牌才能啟用丟棄按鈕
+        if self.find_pairs():
+            self.discard_button.config(state=tk.DISABLED)  # 需手動選擇
+        else:
+            self.discard_button.config(state=tk.DISABLED)
+        self.auto_button.config(state=tk.NORMAL)
+        self.has_drawn = False
+
+    def play_again_declined(self, message):
+        messagebox.showinfo("遊戲結束", message)
+        self.closing = True
+        self.sock.close()
+        self.master.quit()
+
+    def play_again_accepted(self, message):
+        messagebox.showinfo("遊戲重新開始", message)
+        self.clear_hand_display()
+        self.start_button.config(state=tk.NORMAL)  # 啟用開始遊戲按鈕
+
+    def event_update_hand(self, seq, added, removed):
+        try:
+            self.update_hand(seq, added, removed)
+        except Exception as e:
+            self.update_info(f"處理手牌時發生錯誤: {e}")
+            self.request_resync()
+
+    def event_your_turn(self):
+        self.update_info("輪到你操作，點擊抽牌或配對丟棄，或結束回合。")
+        self.enable_turn()
+
+    def event_drew(self, name, source, card):
+        self.update_info(f"{name} 從 {source} 那裡抽了一張牌 {self.card_to_string(card_to_dict(card))}。")
+
+    def event_discarded(self, name, cards):
+        self.update_info(f"{name} 丟棄了牌: {', '.join(self.card_to_string(card_to_dict(card)) for card in cards)}")
+
+    def event_play_again(self):
+        self.update_info("遊戲結束，是否再來一局？")
+        self.prompt_play_again_request()
+
+    # 二進位協定：操作碼 -> 處理函式（參數由 socketgamecodec.decode_event 解出）
+    event_handlers = {
+        codec.TEXT: process_message,
+        codec.HAND_SNAPSHOT: set_hand,
+        codec.HAND_DELTA: event_update_hand,
+        codec.TABLE_STATE: apply_state,
+        codec.GAME_STARTED: lambda self: self.update_info("遊戲已開始，等待你的操作！"),
+        codec.YOUR_TURN: event_your_turn,
+        codec.DREW: event_drew,
+        codec.DISCARDED: event_discarded,
+        codec.WINNER: lambda self, name: self.update_info(f"{name} 贏得了遊戲！"),
+        codec.PLAY_AGAIN: event_play_again,
+        codec.PLAY_AGAIN_ACCEPTED: lambda self: self.play_again_accepted("所有玩家同意再來一局，請準備開始。"),
+        codec.PLAY_AGAIN_DECLINED: lambda self: self.play_again_declined("有人拒絕再來一局，遊戲結束。"),
+        codec.SESSION: set_session,
+    }
+
+    def apply_hand_ids(self):
+        """依手牌編號重建手牌並更新顯示"""
+        self.hand = [card_to_dict(card) for card in self.hand_ids]
+        self.update_hand_display()
+
+    def request_resync(self):
+        """請伺服器重送完整手牌快照"""
+        if self.resync_pending:
+            return
+        self.resync_pending = True
+        try:
+            self.send_command("resync")
+        except Exception as e:
+            self.update_info(f"無法要求重送手牌: {e}")
+
     def prompt_play_again_request(self):
         """當伺服器請求是否再來一局時，提示使用者"""
         response = messagebox.askyesno("再來一局", "遊戲結束，是否再來一局？")
         if response:
             try:
-                self.sock.sendall("playagain yes\n".encode())
+                self.send_command("playagain yes")
             except Exception as e:
                 messagebox.showerror("發送錯誤", f"無法發送再來一局指令: {e}")
         else:
             try:
-                self.sock.sendall("playagain no\n".encode())
+                self.send_command("playagain no")
             except Exception as e:
                 messagebox.showerror("發送錯誤", f"無法發送不再來一局指令: {e}")
 
     def clear_hand_display(self):
         """清空手牌顯示"""
         self.hand = []
+        self.hand_ids = []
         self.selected_cards = []
         self.update_hand_display()
 
     def close_connection(self):
         """關閉連線並退出"""
+        self.closing = True
         try:
             self.sock.close()
         except:
@@ -0,0 +1,249 @@
+import struct
+
+# 二進位協定：登入時在名字列加上 proto=1，伺服器接受時在歡迎訊息最後附上 proto=1，之後雙向都改用二進位框架。
+# 歡迎訊息本身仍是一行文字（閘道與舊客戶端都靠它判斷登入成功），沒有要求 proto 的客戶端一直使用文字協定。
+# 框架：u16 長度（操作碼加內容的位元組數）+ u8 操作碼 + 內容；牌一律以一個位元組表示（牌的編號，見 socketgamecards）
+PROTOCOL_VERSION = 1  # 伺服器支援的最新二進位協定版本，0 表示文字協定
+MAX_CARD = 255  # 一個位元組能表示的最大牌編號（四副牌以內）
+MAX_NAME_BYTES = 255  # 名字以 u8 長度加 UTF-8 編碼表示
+
+HEADER = struct.Struct('!HB')
+SEQ = struct.Struct('!I')
+DELTA = struct.Struct('!IB')  # 手牌變動的序號與增加的張數
+STATE = struct.Struct('!IBBBBB')  # 牌桌狀態的序號、階段、自己的座位、輪到的座位、旗標與座位數
+SEAT = struct.Struct('!HB')  # 牌桌狀態中一個座位的牌數與是否在線
+PHASES = ('waiting', 'playing', 'play_again')  # 牌桌狀態的階段，二進位協定以索引表示
+STATE_DRAWN = 0x01  # 這一回合已經抽過牌
+STATE_READY = 0x02  # 已按準備開始
+STATE_ANSWERED = 0x04  # 已回答是否再來一局
+
+# 伺服器 -> 客戶端事件
+TEXT = 0x01  # 沒有專屬操作碼的訊息（UTF-8 文字）
+HAND_SNAPSHOT = 0x10  # u32 序號 + 所有手牌
+HAND_DELTA = 0x11  # u32 序號 + u8 增加的張數 + 增加的牌 + 移除的牌
+TABLE_STATE = 0x12  # 重新連線時的牌桌狀態：STATE + 每個座位的名字與 SEAT + 所有手牌
+GAME_STARTED = 0x20
+YOUR_TURN = 0x21
+DREW = 0x22  # 抽牌者 + 被抽者 + 抽到的牌
+DISCARDED = 0x23  # 丟棄者 + 丟棄的牌
+WINNER = 0x24  # 贏家
+PLAY_AGAIN = 0x25  # 詢問是否再來一局
+PLAY_AGAIN_ACCEPTED = 0x26  # 所有玩家同意再來一局
+PLAY_AGAIN_DECLINED = 0x27  # 有人拒絕再來一局
+SESSION = 0x28  # 重新連線代碼：桌號 + 代碼（ASCII）
+
+# 客戶端 -> 伺服器指令
+START = 0x40
+DRAW = 0x41
+DISCARD = 0x42  # 要丟棄的牌
+DISCARD_AUTO = 0x43
+END = 0x44
+PLAY_AGAIN_YES = 0x45
+PLAY_AGAIN_NO = 0x46
+RESYNC = 0x47
+SET_AUTODISCARD = 0x48  # u8：1 開啟、0 關閉
+
+def negotiate(requested, max_card):
+    """依客戶端要求的版本與牌桌的最大牌編號決定使用的協定版本，0 表示文字協定"""
+    try:
+        version = min(int(requested), PROTOCOL_VERSION)
+    except (TypeError, ValueError):
+        return 0
+    if version < 1 or max_card > MAX_CARD:
+        return 0
+    return version
+
+def accepted_version(welcome):
+    """從歡迎訊息最後的 proto=版本 取出伺服器接受的協定版本，沒有時為 0（文字協定，例如較舊的伺服器）"""
+    token = welcome.rsplit(' ', 1)[-1]
+    if not token.startswith('proto='):
+        return 0
+    try:
+        return int(token[len('proto='):])
+    except ValueError:
+        return 0
+
+def frame(opcode, payload=b''):
+    """組成一個框架"""
+    return HEADER.pack(len(payload) + 1, opcode) + payload
+
+def pack_name(name):
+    data = name.encode()[:MAX_NAME_BYTES]
+    return bytes((len(data),)) + data
+
+def unpack_name(payload, offset):
+    """回傳 (名字, 下一個位移)"""
+    end = offset + 1 + payload[offset]
+    return payload[offset + 1:end].decode(errors='replace'), end
+
+def encode_text(message):
+    return frame(TEXT, message.encode())
+
+def encode_hand_snapshot(seq, cards):
+    return frame(HAND_SNAPSHOT, SEQ.pack(seq) + bytes(cards))
+
+def encode_hand_delta(seq, added, removed):
+    return frame(HAND_DELTA, DELTA.pack(seq, len(added)) + bytes(added) + bytes(removed))
+
+def encode_table_state(state):
+    """重新連線時的牌桌狀態，state 與文字協定的「牌桌狀態」JSON 相同"""
+    flags = ((STATE_DRAWN if state['drawn'] else 0) | (STATE_READY if state['ready'] else 0)
+             | (STATE_ANSWERED if state['answered'] else 0))
+    head = STATE.pack(state['seq'], PHASES.index(state['phase']), state['seat'], state['turn'], flags,
+                      len(state['players']))
+    seats = b''.join(pack_name(name) + SEAT.pack(count, connected) for name, count, connected in state['players'])
+    return frame(TABLE_STATE, head + seats + bytes(state['hand']))
+
+def encode_session(table_id, token):
+    return frame(SESSION, pack_name(table_id) + token.encode())
+
+def encode_drew(name, source, card):
+    return frame(DREW, pack_name(name) + pack_name(source) + bytes((card,)))
+
+def encode_discarded(name, cards):
+    return frame(DISCARDED, pack_name(name) + bytes(cards))
+
+def encode_winner(name):
+    return frame(WINNER, pack_name(name))
+
+def encode_discard(cards):
+    """客戶端的丟棄指令"""
+    return frame(DISCARD, bytes(cards))
+
+# 沒有內容的框架只需要組一次
+GAME_STARTED_FRAME = frame(GAME_STARTED)
+YOUR_TURN_FRAME = frame(YOUR_TURN)
+PLAY_AGAIN_FRAME = frame(PLAY_AGAIN)
+PLAY_AGAIN_ACCEPTED_FRAME = frame(PLAY_AGAIN_ACCEPTED)
+PLAY_AGAIN_DECLINED_FRAME = frame(PLAY_AGAIN_DECLINED)
+
+# 客戶端：沒有參數的文字指令 -> 對應的二進位框架
+COMMAND_FRAMES = {
+    'start': frame(START),
+    'draw': frame(DRAW),
+    'discard auto': frame(DISCARD_AUTO),
+    'end': frame(END),
+    'playagain yes': frame(PLAY_AGAIN_YES),
+    'playagain no': frame(PLAY_AGAIN_NO),
+    'resync': frame(RESYNC),
+    'set autodiscard on': frame(SET_AUTODISCARD, b'\x01'),
+    'set autodiscard off': frame(SET_AUTODISCARD, b'\x00'),
+}
+
+def split_frames(buffer, start, end):
+    """從 buffer[start:end] 切出所有完整的框架，回傳 ([(操作碼, 內容 bytes)], 下一個未處理的位移)
+
+    完整的框架先一次複製成 bytes，之後每個框架只是 bytes 切片；長度與操作碼直接取位元組，不必每個框架呼叫 struct。
+    """
+    last = start
+    while end - last >= 3:
+        stop = last + 2 + (buffer[last] << 8 | buffer[last + 1])
+        if stop == last + 2:
+            raise ValueError("框架長度不能為 0")
+        if stop > end:
+            break
+        last = stop
+    if last == start:
+        return [], start
+    data = bytes(buffer[start:last])
+    frames = []
+    append = frames.append
+    offset = 0
+    size = last - start
+    while offset < size:
+        stop = offset + 2 + (data[offset] << 8 | data[offset + 1])
+        append((data[offset + 2], data[offset + 3:stop]))
+        offset = stop
+    return frames, last
+
+class FrameReader:
+    """客戶端用的框架切分器：放入收到的位元組，取出完整的框架"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        with memoryview(self.buffer) as view:
+            frames, start = split_frames(view, 0, len(view))
+        del self.buffer[:start]
+        return frames
+
+# 伺服器端：操作碼 -> 對應的文字指令 (指令, 參數)，讓二進位指令走同一張指令分派表
+COMMAND_DECODERS = {
+    START: lambda payload: ('start', ''),
+    DRAW: lambda payload: ('draw', ''),
+    DISCARD: lambda payload: ('discard', list(payload)),  # 已經是牌的編號，不必再解析 JSON
+    DISCARD_AUTO: lambda payload: ('discard', 'auto'),
+    END: lambda payload: ('end', ''),
+    PLAY_AGAIN_YES: lambda payload: ('playagain', 'yes'),
+    PLAY_AGAIN_NO: lambda payload: ('playagain', 'no'),
+    RESYNC: lambda payload: ('resync', ''),
+    SET_AUTODISCARD: lambda payload: ('set', 'autodiscard on' if payload[:1] == b'\x01' else 'autodiscard off'),
+}
+
+def decode_command(opcode, payload):
+    """把客戶端的二進位指令轉成 (指令, 參數)，未知的操作碼交給指令分派表回覆無效指令"""
+    decoder = COMMAND_DECODERS.get(opcode)
+    if decoder is None:
+        return f"op{opcode}", ''
+    return decoder(payload)
+
+def decode_hand_snapshot(payload):
+    return SEQ.unpack_from(payload)[0], list(payload[SEQ.size:])
+
+def decode_hand_delta(payload):
+    seq, added = DELTA.unpack_from(payload)
+    return seq, list(payload[DELTA.size:DELTA.size + added]), list(payload[DELTA.size + added:])
+
+def decode_table_state(payload):
+    """解回與文字協定相同的牌桌狀態 dict"""
+    seq, phase, seat, turn, flags, count = STATE.unpack_from(payload)
+    offset = STATE.size
+    players = []
+    for _ in range(count):
+        name, offset = unpack_name(payload, offset)
+        cards, connected = SEAT.unpack_from(payload, offset)
+        offset += SEAT.size
+        players.append([name, cards, bool(connected)])
+    state = {'seq': seq, 'phase': PHASES[phase], 'seat': seat, 'turn': turn, 'drawn': bool(flags & STATE_DRAWN),
+             'ready': bool(flags & STATE_READY), 'answered': bool(flags & STATE_ANSWERED), 'players': players,
+             'hand': list(payload[offset:])}
+    return (state,)
+
+def decode_session(payload):
+    table_id, offset = unpack_name(payload, 0)
+    return table_id, payload[offset:].decode()
+
+def decode_drew(payload):
+    name, offset = unpack_name(payload, 0)
+    source, offset = unpack_name(payload, offset)
+    return name, source, payload[offset]
+
+def decode_discarded(payload):
+    name, offset = unpack_name(payload, 0)
+    return name, list(payload[offset:])
+
+# 客戶端：操作碼 -> 把內容解成處理函式參數的函式
+EVENT_DECODERS = {
+    TEXT: lambda payload: (payload.decode(errors='replace'),),
+    HAND_SNAPSHOT: decode_hand_snapshot,
+    HAND_DELTA: decode_hand_delta,
+    TABLE_STATE: decode_table_state,
+    GAME_STARTED: lambda payload: (),
+    YOUR_TURN: lambda payload: (),
+    DREW: decode_drew,
+    DISCARDED: decode_discarded,
+    WINNER: lambda payload: (unpack_name(payload, 0)[0],),
+    PLAY_AGAIN: lambda payload: (),
+    PLAY_AGAIN_ACCEPTED: lambda payload: (),
+    PLAY_AGAIN_DECLINED: lambda payload: (),
+    SESSION: decode_session,
+}
+
+def decode_event(opcode, payload):
+    """把伺服器事件的內容解成參數 tuple，未知的操作碼回傳 None（較新的伺服器可能加入新事件）"""
+    decoder = EVENT_DECODERS.get(opcode)
+    if decoder is None:
+        return None
+    return decoder(payload)
@@ -0,0 +1,87 @@
+import random
+from socketgamecards import create_deck, card_rank, is_joker, Hand
+
+# 抽鬼牌的規則核心：只處理手牌（socketgamecards.Hand）與座位編號，不碰 socket、鎖、訊息與日誌
+# 牌桌（socketgameserver.Table）、日誌重播（socketgamejournal）與離線模擬（socketgamesim）都用同一份規則
+
+def shuffled_deck(decks, seed):
+    """以種子洗好的牌組：同一個種子一定得到同樣的順序，日誌只需記下種子"""
+    deck = create_deck(decks)
+    random.Random(seed).shuffle(deck)
+    return deck
+
+def deal(deck, hands):
+    """依座位順序輪流發牌"""
+    count = len(hands)
+    for i, card in enumerate(deck):
+        hands[i % count].add(card)
+
+def deal_hands(decks, seed, players):
+    """依種子重現洗牌與發牌，回傳每個座位的手牌"""
+    hands = [Hand() for _ in range(players)]
+    deal(shuffled_deck(decks, seed), hands)
+    return hands
+
+def next_seat(seat, players):
+    """下一個座位：輪到的玩家從這個座位抽牌，回合結束後也輪到這個座位"""
+    return (seat + 1) % players
+
+def first_empty(hands):
+    """第一個沒有手牌的座位（贏家），沒有時回傳 None"""
+    return next((seat for seat, hand in enumerate(hands) if not hand), None)
+
+def draw(hands, seat, rng, auto_discard=False):
+    """座位 seat 從下一位的手牌隨機抽一張（包括鬼牌），回傳 (抽到的牌, 自動丟棄的牌)
+
+    下一位必須還有手牌。auto_discard 時只檢查抽到的這張牌的點數，其他點數早已丟棄。
+    """
+    card = hands[next_seat(seat, len(hands))].pop_random(rng)
+    hand = hands[seat]
+    hand.add(card)
+    pairs = hand.take_pairs(card_rank(card)) if auto_discard else []
+    return card, pairs
+
+def draw_winner(hands, seat):
+    """抽牌後的贏家：被抽的下一位先沒牌就是他贏，否則看抽牌者，都還有牌時回傳 None"""
+    source = next_seat(seat, len(hands))
+    if not hands[source]:
+        return source
+    if not hands[seat]:
+        return seat
+    return None
+
+def is_valid_discard(cards):
+    """丟棄的牌是否能完全配對：不含鬼牌，且每個點數都出現偶數次"""
+    rank_parity = 0  # 每個點數一個位元，出現奇數次時為 1
+    for card in cards:
+        if is_joker(card):
+            return False
+        rank_parity ^= 1 << card_rank(card)
+    return rank_parity == 0
+
+def play_turn(hands, seat, rng, auto_discard=False):
+    """機器人的一個回合：抽牌後丟掉手中所有配對，回傳贏家座位（還沒分出勝負時為 None）
+
+    與 socketgamebot 的 draw、discard auto、end 相同；沒有自動丟棄時配對留到自己的回合才丟。
+    """
+    draw(hands, seat, rng, auto_discard)
+    winner = draw_winner(hands, seat)
+    if winner is None and not auto_discard:
+        hands[seat].take_pairs()
+        if not hands[seat]:
+            winner = seat
+    return winner
+
+def play_game(hands, rng, auto_discard=False):
+    """從發好的手牌開始打完一局，回傳 (抽牌次數, 贏家座位)，座位 0 先抽"""
+    if auto_discard:
+        for hand in hands:
+            hand.take_pairs()
+    winner = first_empty(hands)
+    seat = 0
+    turns = 0
+    while winner is None:
+        winner = play_turn(hands, seat, rng, auto_discard)
+        seat = next_seat(seat, len(hands))
+        turns += 1
+    return turns, winner
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import re
+from socketgameserver import (parse_login, MAX_PLAYERS, LOGIN_PROMPT, LOGIN_TIMEOUT, LOGIN_MAX_BYTES, LOGIN_TIMEOUT_MESSAGE,
+                              MAX_COMMAND_BYTES, METRICS_HOST, RECONNECT_GRACE)
+from socketgamemetrics import Registry, start_metrics_server
+
+# 閘道參數
+GATEWAY_HOST = '0.0.0.0'
+GATEWAY_PORT = 5550
+VIRTUAL_NODES = 160  # 每個後端在雜湊環上的虛擬節點數，越多分佈越平均
+CONNECT_TIMEOUT = 3  # 連到後端的期限（秒）
+REPORT_INTERVAL = 30  # 每隔幾秒印出各後端負載，0 表示不印
+PLACEMENT_MARGIN = 5  # 牌桌沒有連線後，除了後端保留座位的秒數，再多記住安排幾秒
+PIPE_CHUNK = 65536
+WELCOME_PREFIX = "歡迎".encode()  # 後端登入成功的歡迎訊息開頭
+WELCOME_TABLE = re.compile(r"（牌桌 ([^，）]+)")  # 從歡迎訊息取出伺服器安排的桌號
+
+# 閘道自己的指標（與同一台機器上的伺服器指標分開）
+GATEWAY_REGISTRY = Registry()
+GATEWAY_CONNECTIONS = GATEWAY_REGISTRY.counter('oldmaid_gateway_connections_total', "閘道接受的連線總數")
+BACKEND_CONNECTIONS = GATEWAY_REGISTRY.gauge('oldmaid_gateway_backend_connections', "各後端目前經由閘道的連線數", ['backend'])
+BACKEND_TABLES = GATEWAY_REGISTRY.gauge('oldmaid_gateway_backend_tables', "各後端目前經由閘道使用中的牌桌數", ['backend'])
+BACKEND_ERRORS = GATEWAY_REGISTRY.counter('oldmaid_gateway_backend_errors_total', "連不上後端的次數", ['backend'])
+
+def ring_hash(key):
+    """雜湊環上的位置（64 位元）"""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+class HashRing:
+    """一致性雜湊環：每個節點放 replicas 個虛擬節點，增減節點時只有相鄰區段的鍵會換節點"""
+
+    def __init__(self, nodes=(), replicas=VIRTUAL_NODES):
+        self.replicas = replicas
+        self.points = []  # 已排序的雜湊值
+        self.owners = []  # 與 points 對應的節點
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = ring_hash(f"{node}#{i}")
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node):
+        kept = [(p, o) for p, o in zip(self.points, self.owners) if o != node]
+        self.points = [p for p, _ in kept]
+        self.owners = [o for _, o in kept]
+
+    def lookup(self, key):
+        """依順時針順序列出負責這個鍵的節點（第一個是主要節點，後面是故障時的備援）"""
+        if not self.points:
+            return []
+        start = bisect.bisect(self.points, ring_hash(key))
+        nodes = []
+        for i in range(len(self.points)):
+            node = self.owners[(start + i) % len(self.points)]
+            if node not in nodes:
+                nodes.append(node)
+        return nodes
+
+    def node_for(self, key):
+        nodes = self.lookup(key)
+        return nodes[0] if nodes else None
+
+class Backend:
+    """一個後端 GameServer 與閘道記錄的負載"""
+
+    def __init__(self, address):
+        host, _, port = address.rpartition(':')
+        self.name = address
+        self.host = host or '127.0.0.1'
+        self.port = int(port)
+        self.connections = 0
+        self.table_connections = {}  # 桌號 -> 經由閘道在這張牌桌的連線數
+        self.errors = 0
+
+    def load(self):
+        return (self.connections, len(self.table_connections))
+
+    def describe(self):
+        return {'connections': self.connections, 'tables': len(self.table_connections), 'errors': self.errors}
+
+class Gateway:
+    """終止客戶端連線、讀取名字列後依桌號轉送到後端，之後雙向轉送位元組
+
+    指定桌號的連線用一致性雜湊決定後端；沒有指定桌號的玩家先補滿最近一張自動安排的牌桌，
+    牌桌滿了才把新牌桌開在目前負載最輕的後端。後端替它安排的桌號會被記住，之後指定同一桌號的連線都送到同一個後端
+    （後端應以 --table-prefix 使用不同的桌號前綴）。斷線的玩家在後端還保留座位時會帶著 resume 回來，
+    所以牌桌的連線都離開後，安排紀錄還要保留到後端的重新連線寬限期過後才清除。
+    """
+
+    def __init__(self, backends, host=GATEWAY_HOST, port=GATEWAY_PORT, replicas=VIRTUAL_NODES):
+        self.host = host
+        self.port = port
+        self.backends = {address: Backend(address) for address in backends}
+        self.ring = HashRing(self.backends, replicas)
+        self.placements = {}  # 由負載最輕原則安排的桌號 -> 後端名稱
+        self.expiring = {}  # 已經沒有連線的牌桌桌號 -> 清除安排紀錄的 asyncio.TimerHandle
+        self.reconnect_grace = RECONNECT_GRACE  # 後端斷線後保留座位的秒數
+        self.filling = None  # 最近一張自動安排、可能還沒坐滿的牌桌 (後端名稱, 桌號)
+        self.login_timeout = LOGIN_TIMEOUT
+        self.report_interval = REPORT_INTERVAL
+        self.metrics_port = None
+
+    def candidates(self, table_id):
+        """依優先順序列出可以接這條連線的後端"""
+        if table_id is None:
+            backends = sorted(self.backends.values(), key=Backend.load)
+            if self.filling is not None:
+                name, filling_id = self.filling
+                backend = self.backends[name]
+                if 0 < backend.table_connections.get(filling_id, 0) < MAX_PLAYERS:
+                    backends.remove(backend)
+                    backends.insert(0, backend)
+            return backends
+        names = self.ring.lookup(table_id)
+        placed = self.placements.get(table_id)
+        if placed in self.backends:
+            names = [placed] + [name for name in names if name != placed]
+        return [self.backends[name] for name in names]
+
+    def report(self):
+        """各後端目前的負載"""
+        return {name: backend.describe() for name, backend in self.backends.items()}
+
+    def join_table(self, backend, table_id, auto_placed):
+        backend.table_connections[table_id] = backend.table_connections.get(table_id, 0) + 1
+        expiring = self.expiring.pop(table_id, None)
+        if expiring is not None:
+            expiring.cancel()
+        if auto_placed:
+            self.placements[table_id] = backend.name
+            self.filling = (backend.name, table_id)
+        BACKEND_TABLES.labels(backend.name).set(len(backend.table_connections))
+
+    def leave_table(self, backend, table_id):
+        count = backend.table_connections.get(table_id, 0) - 1
+        if count > 0:
+            backend.table_connections[table_id] = count
+        else:
+            backend.table_connections.pop(table_id, None)
+            if self.placements.get(table_id) == backend.name:
+                # 後端可能還保留著斷線玩家的座位，帶 resume 的連線只指定桌號，要記得送回同一個後端
+                expiring = self.expiring.pop(table_id, None)
+                if expiring is not None:
+                    expiring.cancel()
+                self.expiring[table_id] = asyncio.get_running_loop().call_later(
+                    self.reconnect_grace + PLACEMENT_MARGIN, self.forget_placement, backend.name, table_id)
+        BACKEND_TABLES.labels(backend.name).set(len(backend.table_connections))
+
+    def forget_placement(self, name, table_id):
+        """寬限期過後，後端已經放掉斷線玩家的座位，清除沒有連線的牌桌的安排紀錄"""
+        self.expiring.pop(table_id, None)
+        if self.placements.get(table_id) == name and not self.backends[name].table_connections.get(table_id):
+            del self.placements[table_id]
+
+    async def connect_backend(self, table_id):
+        """依序嘗試候選後端，回傳 (後端, reader, writer)"""
+        for backend in self.candidates(table_id):
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(backend.host, backend.port, limit=MAX_COMMAND_BYTES), CONNECT_TIMEOUT)
+                await asyncio.wait_for(reader.readline(), CONNECT_TIMEOUT)  # 後端的「請輸入你的名字」
+                return backend, reader, writer
+            except (OSError, asyncio.TimeoutError) as e:
+                print(f"無法連到後端 {backend.name}: {e}")
+                backend.errors += 1
+                BACKEND_ERRORS.labels(backend.name).inc()
+        return None, None, None
+
+    async def handle_client(self, reader, writer):
+        """一條客戶端連線：名字交握、選擇後端、雙向轉送"""
+        GATEWAY_CONNECTIONS.inc()
+        writer.write(LOGIN_PROMPT)
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.login_timeout)
+        except asyncio.TimeoutError:
+            writer.write(LOGIN_TIMEOUT_MESSAGE)
+            writer.close()
+            return
+        except (OSError, ValueError):
+            writer.close()
+            return
+        if not line.endswith(b'\n') or len(line) > LOGIN_MAX_BYTES:
+            writer.close()
+            return
+        _, options = parse_login(line.decode(errors='replace'))
+        table_id = options.get('watch', options.get('table'))
+        backend, backend_reader, backend_writer = await self.connect_backend(table_id)
+        if backend is None:
+            writer.write("目前沒有可用的伺服器，請稍後再試。\n".encode())
+            writer.close()
+            return
+        backend.connections += 1
+        BACKEND_CONNECTIONS.labels(backend.name).inc()
+        joined = None
+        try:
+            backend_writer.write(line)
+            # 歡迎訊息之前只會有文字行（登入被拒時後端送出原因後斷線），逐行轉送直到看到歡迎訊息；
+            # 之後可能改用二進位框架，交給 pipe 原封不動轉送
+            while True:
+                welcome = await backend_reader.readline()
+                writer.write(welcome)
+                if not welcome or welcome.startswith(WELCOME_PREFIX):
+                    break
+            match = WELCOME_TABLE.search(welcome.decode(errors='replace'))
+            if match:
+                joined = table_id if table_id is not None else match.group(1)
+                self.join_table(backend, joined, table_id is None)
+            await asyncio.gather(self.pipe(reader, backend_writer), self.pipe(backend_reader, writer))
+        except (OSError, ValueError) as e:
+            print(f"轉送連線時出錯: {e}")
+        finally:
+            backend.connections -= 1
+            BACKEND_CONNECTIONS.labels(backend.name).dec()
+            if joined is not None:
+                self.leave_table(backend, joined)
+            backend_writer.close()
+            writer.close()
+
+    async def pipe(self, reader, writer):
+        """把一個方向的位元組原封不動轉送過去，任一方結束時關閉另一方"""
+        try:
+            while True:
+                data = await reader.read(PIPE_CHUNK)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (OSError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            print(f"後端負載: {json.dumps(self.report(), ensure_ascii=False)}")
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=MAX_COMMAND_BYTES)
+        print(f"閘道啟動，監聽 {self.host}:{self.port}，後端: {', '.join(self.backends)}")
+        if self.report_interval:
+            asyncio.get_running_loop().create_task(self.report_loop())
+        async with server:
+            await server.serve_forever()
+
+    def start(self):
+        if self.metrics_port is not None:
+            httpd = start_metrics_server(METRICS_HOST, self.metrics_port, GATEWAY_REGISTRY)
+            httpd.RequestHandlerClass.routes['/backends'] = lambda query: (
+                'application/json', json.dumps(self.report(), ensure_ascii=False).encode())
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("閘道正在關閉...")
+
+def main():
+    parser = argparse.ArgumentParser(description="抽鬼牌遊戲閘道：依桌號把連線轉送到多台伺服器")
+    parser.add_argument('--host', default=GATEWAY_HOST)
+    parser.add_argument('--port', type=int, default=GATEWAY_PORT)
+    parser.add_argument('--backend', action='append', required=True, help="後端伺服器 host:port，可重複指定")
+    parser.add_argument('--replicas', type=int, default=VIRTUAL_NODES, help="每個後端的虛擬節點數")
+    parser.add_argument('--login-timeout', type=float, default=LOGIN_TIMEOUT, help="送出名字的期限（秒）")
+    parser.add_argument('--report-interval', type=float, default=REPORT_INTERVAL, help="每隔幾秒印出各後端負載，0 表示不印")
+    parser.add_argument('--metrics-port', type=int, help=f"在 {METRICS_HOST} 提供 /metrics 與 /backends")
+    parser.add_argument('--reconnect-grace', type=float, default=RECONNECT_GRACE,
+                        help="後端的 --reconnect-grace：牌桌沒有連線後，安排紀錄至少保留這麼多秒")
+    args = parser.parse_args()
+    gateway = Gateway(args.backend, args.host, args.port, args.replicas)
+    gateway.login_timeout = args.login_timeout
+    gateway.report_interval = args.report_interval
+    gateway.metrics_port = args.metrics_port
+    gateway.reconnect_grace = args.reconnect_grace
+    gateway.start()
+
+if __name__ == "__main__":
+    main()
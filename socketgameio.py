@@ -0,0 +1,263 @@
+import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# 送出佇列參數
+OUTBOX_LIMIT = 256 * 1024  # 每條連線待送資料的上限（位元組）
+SLOW_CONSUMER_POLICIES = ['coalesce', 'drop', 'disconnect']
+SLOW_CONSUMER_POLICY = 'coalesce'  # 待送資料超過上限時的處理方式
+HAND_KIND = 'hand'  # 完整手牌（快照），會取代佇列中先前的手牌訊息
+HAND_DELTA_KIND = 'hand_delta'  # 手牌變動，必須接在先前的手牌訊息之後，不能取代它們
+IOV_MAX = 1024  # 一次 sendmsg 最多幾段資料（Linux 的 UIO_MAXIOV）
+
+BATCH = threading.local()  # 目前執行緒進行中的寫入批次
+
+@contextmanager
+def write_batch(enabled=True):
+    """同一批事件（一次讀到的指令、一次計時器回呼）產生的輸出先留在各連線的佇列，結束時每條連線只送出一次
+
+    一次抽牌會產生廣播與兩份手牌更新，批次中只放進佇列，離開批次時（已經放開牌桌鎖）才一次寫出。
+    巢狀的批次由最外層送出。
+    """
+    if not enabled or getattr(BATCH, 'dirty', None) is not None:
+        yield
+        return
+    BATCH.dirty = {}  # 有待送資料的送出佇列（dict 保持順序）
+    try:
+        yield
+    finally:
+        dirty, BATCH.dirty = BATCH.dirty, None
+        for outbox in dirty:
+            outbox.flush()
+
+def send_buffers(conn, buffers):
+    """以 sendmsg（writev）送出多段資料，不必先串成一個 bytes；只送出一部分時繼續送剩下的，回傳呼叫次數"""
+    calls = 0
+    index = 0
+    while index < len(buffers):
+        sent = conn.sendmsg(buffers[index:index + IOV_MAX])
+        calls += 1
+        while sent:
+            size = len(buffers[index])
+            if sent >= size:
+                sent -= size
+                index += 1
+            else:
+                buffers[index] = memoryview(buffers[index])[sent:]
+                sent = 0
+    return calls
+
+class OutboxStats:
+    """所有送出佇列共用的統計數字"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queued_bytes = 0  # 目前所有佇列中待送的位元組
+        self.peak_bytes = 0  # 單一佇列曾經達到的最大位元組
+        self.dropped = 0  # 因接收太慢而丟掉的訊息數
+        self.coalesced = 0  # 被後來的手牌取代而丟掉的手牌訊息數
+        self.disconnects = 0  # 因接收太慢而被斷線的連線數
+        self.writes = 0  # 寫入 socket 的次數（thread 引擎為 sendmsg 呼叫數，asyncio 引擎為 transport 寫入數）
+
+    def add(self, field, amount=1):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def record_depth(self, size):
+        with self.lock:
+            if size > self.peak_bytes:
+                self.peak_bytes = size
+
+    def snapshot(self):
+        """目前的統計數字"""
+        with self.lock:
+            return {
+                'queued_bytes': self.queued_bytes,
+                'peak_bytes': self.peak_bytes,
+                'dropped': self.dropped,
+                'coalesced': self.coalesced,
+                'disconnects': self.disconnects,
+                'writes': self.writes,
+            }
+
+class Outbox:
+    """單一連線的有界送出佇列：遊戲邏輯只把資料放進佇列，實際送出由各引擎的寫入端負責"""
+
+    def __init__(self, stats, limit=OUTBOX_LIMIT, policy=SLOW_CONSUMER_POLICY):
+        self.stats = stats
+        self.limit = limit
+        self.policy = policy
+        self.items = deque()  # (資料, 種類)
+        self.size = 0  # 佇列中的位元組
+        self.closed = False
+        self.needs_snapshot = False  # 丟掉過手牌訊息，玩家的下一次手牌更新要送完整快照
+
+    def pending_bytes(self):
+        """尚未送出的位元組（含引擎自己的緩衝）"""
+        return self.size
+
+    def put(self, data, kind=None):
+        """放入一筆待送資料，回傳 False 表示對方接收太慢，應斷開連線"""
+        if self.closed:
+            return True
+        if self.pending_bytes() + len(data) > self.limit:
+            if self.policy == 'disconnect':
+                self.stats.add('disconnects')
+                return False
+            if self.policy == 'coalesce' and kind == HAND_KIND:
+                self.drop_hands()  # 只有完整快照能取代較舊的快照與差異
+            if self.pending_bytes() + len(data) > self.limit:
+                if self.policy == 'coalesce' and kind not in (HAND_KIND, HAND_DELTA_KIND):
+                    self.stats.add('disconnects')
+                    return False
+                self.stats.add('dropped')
+                if kind in (HAND_KIND, HAND_DELTA_KIND):
+                    self.needs_snapshot = True  # 之後的差異會接不上，改送快照
+                return True
+        self.items.append((data, kind))
+        self.size += len(data)
+        self.stats.add('queued_bytes', len(data))
+        self.stats.record_depth(self.pending_bytes())
+        return True
+
+    def defer(self):
+        """在 write_batch 中時登記這條連線並回傳 True，資料等批次結束再送出"""
+        dirty = getattr(BATCH, 'dirty', None)
+        if dirty is None:
+            return False
+        dirty[self] = None
+        return True
+
+    def drop_hands(self):
+        """丟掉佇列中較舊的手牌訊息（快照與差異），接著放進的完整快照會取代它們"""
+        kept = deque()
+        for data, kind in self.items:
+            if kind in (HAND_KIND, HAND_DELTA_KIND):
+                self.size -= len(data)
+                self.stats.add('queued_bytes', -len(data))
+                self.stats.add('coalesced')
+            else:
+                kept.append((data, kind))
+        self.items = kept
+
+    def take_all(self):
+        """取出佇列中所有資料"""
+        batch = [data for data, _ in self.items]
+        self.items.clear()
+        self.stats.add('queued_bytes', -self.size)
+        self.size = 0
+        return batch
+
+class ThreadOutbox(Outbox):
+    """thread 引擎的送出佇列：每條連線一個寫入執行緒，在任何遊戲鎖之外呼叫阻塞的 sendall"""
+
+    def __init__(self, conn, stats, limit=OUTBOX_LIMIT, policy=SLOW_CONSUMER_POLICY):
+        super().__init__(stats, limit, policy)
+        self.conn = conn
+        self.cond = threading.Condition()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def put(self, data, kind=None):
+        with self.cond:
+            accepted = super().put(data, kind)
+            if not self.defer():
+                self.cond.notify()
+        return accepted
+
+    def flush(self):
+        """批次結束，喚醒寫入執行緒"""
+        with self.cond:
+            self.cond.notify()
+
+    def run(self):
+        """寫入執行緒：一次取出所有待送資料合併送出"""
+        try:
+            while True:
+                with self.cond:
+                    while not self.items and not self.closed:
+                        self.cond.wait()
+                    if not self.items:
+                        break
+                    batch = self.take_all()
+                self.stats.add('writes', send_buffers(self.conn, batch))
+        except OSError:
+            pass
+        finally:
+            self.shutdown()
+
+    def close(self):
+        """送完佇列中的資料後關閉連線"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def abort(self):
+        """丟掉待送資料並立即關閉連線"""
+        with self.cond:
+            self.closed = True
+            self.take_all()
+            self.cond.notify()
+        self.shutdown()
+
+    def shutdown(self):
+        """關閉 socket，也會喚醒阻塞在 recv 的讀取執行緒"""
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+
+class AsyncOutbox(Outbox):
+    """asyncio 引擎的送出佇列：transport 沒有暫停時直接寫入，暫停寫入期間才在佇列中等待"""
+
+    def __init__(self, transport, stats, limit=OUTBOX_LIMIT, policy=SLOW_CONSUMER_POLICY):
+        super().__init__(stats, limit, policy)
+        self.transport = transport
+        self.paused = False
+
+    def pending_bytes(self):
+        return self.size + self.transport.get_write_buffer_size()
+
+    def put(self, data, kind=None):
+        if self.closed or self.transport.is_closing():
+            return True
+        if not self.paused and not self.items and not self.defer():
+            if self.pending_bytes() + len(data) > self.limit and self.policy == 'disconnect':
+                self.stats.add('disconnects')
+                return False
+            self.transport.write(data)
+            self.stats.add('writes')
+            self.stats.record_depth(self.pending_bytes())
+            return True
+        return super().put(data, kind)
+
+    def flush(self):
+        """批次結束，把佇列中的資料一次寫出（transport 暫停寫入時留給 resume_writing）"""
+        if self.items and not self.paused and not self.closed and not self.transport.is_closing():
+            self.transport.writelines(self.take_all())
+            self.stats.add('writes')
+            self.stats.record_depth(self.pending_bytes())
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        """transport 緩衝降下來後，把佇列中的資料寫出去"""
+        self.paused = False
+        if self.items:
+            self.transport.writelines(self.take_all())
+            self.stats.add('writes')
+
+    def close(self):
+        """送完佇列中的資料後關閉連線"""
+        if self.items and not self.transport.is_closing():
+            self.transport.writelines(self.take_all())
+        self.closed = True
+        self.transport.close()
+
+    def abort(self):
+        """丟掉待送資料並立即關閉連線"""
+        self.take_all()
+        self.closed = True
+        self.transport.abort()
@@ -0,0 +1,400 @@
+import argparse
+import json
+import os
+import struct
+import threading
+import time
+from socketgamecards import card_to_string, Hand
+from socketgameengine import deal_hands
+
+# 遊戲事件日誌：每個狀態轉移附加一筆紀錄到檔案（每個伺服器行程一個檔案，多行程模式下每個工作行程一個），
+# 寫入由背景執行緒批次進行，不佔用處理連線的執行緒或事件迴圈；重播工具依序套用紀錄重建每張牌桌的狀態。
+# 紀錄：u16 內容長度 + u8 種類 + u32 牌桌序號（檔案內從 1 開始）+ 內容；牌以 u16 表示（支援多副牌）
+JOURNAL_FSYNC_POLICIES = ['always', 'interval', 'never']  # 每批寫入後 fsync、每隔一段時間 fsync、交給作業系統
+JOURNAL_FSYNC = 'interval'  # 預設的 fsync 策略
+JOURNAL_FSYNC_INTERVAL = 1.0  # interval 策略下兩次 fsync 的最短間隔（秒）
+JOURNAL_FLUSH_INTERVAL = 0.05  # 批次寫入的最長等待時間（秒），always 策略不等待
+JOURNAL_BATCH_RECORDS = 1024  # 累積這麼多筆紀錄就立即寫入
+
+HEADER = struct.Struct('!HBI')
+SEAT = struct.Struct('!B')
+SEAT_CARD = struct.Struct('!BH')
+SEAT_SEAT = struct.Struct('!BB')
+SEED = struct.Struct('!Q')
+
+# 紀錄種類
+START = 0  # 伺服器啟動（牌桌序號為 0），u64 啟動時間（毫秒）；之前還沒移除的牌桌都隨著上一次執行結束
+OPEN = 1  # u8 副數 + 桌號（UTF-8）
+CLOSE = 2  # 牌桌移除
+JOIN = 3  # 玩家名字（UTF-8），坐到最後一個座位
+LEAVE = 4  # u8 座位 + u8 離開後輪到的座位
+DEAL = 5  # u64 洗牌種子：以 socketgameengine.deal_hands 重現洗牌與發牌
+DRAW = 6  # u8 抽牌者座位 + u16 抽到的牌（從下一個座位抽）
+DISCARD = 7  # u8 座位 + 丟棄的牌（含自動丟棄）
+END = 8  # 結束回合，輪到下一個座位
+WIN = 9  # u8 贏家座位
+PLAY_AGAIN = 10  # u8 座位 + u8 回應（1 再來一局、0 不要）
+AGAIN = 11  # u8 1 表示所有人同意並重置牌桌，0 表示有人拒絕
+ABORT = 12  # 有人離開後人數不足，牌局沒有贏家就結束，接著詢問是否再來一局
+
+KIND_NAMES = {START: 'start', OPEN: 'open', CLOSE: 'close', JOIN: 'join', LEAVE: 'leave', DEAL: 'deal', DRAW: 'draw',
+              DISCARD: 'discard', END: 'end', WIN: 'win', PLAY_AGAIN: 'playagain', AGAIN: 'again',
+              ABORT: 'abort'}
+
+def pack_cards(cards):
+    return struct.pack(f'!{len(cards)}H', *cards)
+
+def unpack_cards(payload, offset=0):
+    return struct.unpack_from(f'!{(len(payload) - offset) // 2}H', payload, offset)
+
+class Journal:
+    """附加式的事件日誌，append() 只把紀錄放進佇列，由背景執行緒批次寫入並依策略 fsync"""
+
+    def __init__(self, path, fsync=JOURNAL_FSYNC, fsync_interval=JOURNAL_FSYNC_INTERVAL,
+                 flush_interval=JOURNAL_FLUSH_INTERVAL):
+        self.path = path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.flush_interval = 0 if fsync == 'always' else flush_interval
+        self.next_table = self.recover()
+        self.file = open(path, 'ab', buffering=0)
+        self.pending = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = None
+        self.records = 0  # 寫入的紀錄數
+        self.bytes = 0  # 寫入的位元組
+        self.writes = 0  # 寫入檔案的次數（每批一次）
+        self.syncs = 0  # fsync 次數
+        self.last_sync = time.monotonic()
+
+    def recover(self):
+        """檢查既有的日誌：截掉當機時寫到一半的最後一筆，回傳已用過的最大牌桌序號（新牌桌從下一號開始）"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        last = 0
+        valid = 0
+        for kind, number, payload in iter_records(data):
+            last = max(last, number)
+            valid += HEADER.size + len(payload)
+        if valid < len(data):
+            print(f"遊戲日誌 {self.path} 最後 {len(data) - valid} 位元組不完整，已截掉。")
+            os.truncate(self.path, valid)
+        return last
+
+    def start(self):
+        self.append(START, 0, SEED.pack(int(time.time() * 1000)))
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def table(self, table_id, decks):
+        """登記一張新牌桌並回傳寫入這張牌桌紀錄的 TableJournal"""
+        with self.condition:
+            self.next_table += 1
+            number = self.next_table
+        self.append(OPEN, number, SEAT.pack(decks) + table_id.encode())
+        return TableJournal(self, number)
+
+    def append(self, kind, table_no, payload=b''):
+        record = HEADER.pack(len(payload), kind, table_no) + payload
+        with self.condition:
+            self.pending.append(record)
+            if not self.flush_interval or len(self.pending) >= JOURNAL_BATCH_RECORDS:
+                self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.pending and not self.closed:
+                    self.condition.wait(self.flush_interval or None)
+                batch, self.pending = self.pending, []
+                closing = self.closed
+            if batch:
+                self.write(batch)
+            if closing:
+                return
+
+    def write(self, batch):
+        """寫入一批紀錄（一次 write），再依策略 fsync"""
+        try:
+            data = b''.join(batch)
+            self.file.write(data)
+            self.records += len(batch)
+            self.bytes += len(data)
+            self.writes += 1
+            now = time.monotonic()
+            if self.fsync == 'always' or (self.fsync == 'interval' and now - self.last_sync >= self.fsync_interval):
+                os.fsync(self.file.fileno())
+                self.syncs += 1
+                self.last_sync = now
+        except Exception as e:
+            print(f"寫入遊戲日誌時出錯: {e}")
+
+    def close(self):
+        """寫完佇列中的紀錄並關閉檔案"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        elif self.pending:
+            self.write(self.pending)
+        if self.fsync != 'never':
+            os.fsync(self.file.fileno())
+        self.file.close()
+
+class TableJournal:
+    """一張牌桌的紀錄寫入介面，由 Table 在牌桌鎖內呼叫"""
+
+    __slots__ = ('journal', 'number')
+
+    def __init__(self, journal, number):
+        self.journal = journal
+        self.number = number
+
+    def join(self, name):
+        self.journal.append(JOIN, self.number, name.encode())
+
+    def leave(self, seat, current):
+        self.journal.append(LEAVE, self.number, SEAT_SEAT.pack(seat, current))
+
+    def deal(self, seed):
+        self.journal.append(DEAL, self.number, SEED.pack(seed))
+
+    def draw(self, seat, card):
+        self.journal.append(DRAW, self.number, SEAT_CARD.pack(seat, card))
+
+    def discard(self, seat, cards):
+        self.journal.append(DISCARD, self.number, SEAT.pack(seat) + pack_cards(cards))
+
+    def end(self):
+        self.journal.append(END, self.number)
+
+    def win(self, seat):
+        self.journal.append(WIN, self.number, SEAT.pack(seat))
+
+    def play_again(self, seat, answer):
+        self.journal.append(PLAY_AGAIN, self.number, SEAT_SEAT.pack(seat, 1 if answer else 0))
+
+    def again(self, accepted):
+        self.journal.append(AGAIN, self.number, SEAT.pack(1 if accepted else 0))
+
+    def abort(self):
+        self.journal.append(ABORT, self.number)
+
+    def close(self):
+        self.journal.append(CLOSE, self.number)
+
+class TableState:
+    """由日誌重建的牌桌狀態"""
+
+    __slots__ = ('number', 'table_id', 'decks', 'players', 'hands', 'current', 'game_started',
+                 'waiting_for_play_again', 'play_again', 'games', 'winner', 'closed')
+
+    def __init__(self, number, table_id, decks):
+        self.number = number
+        self.table_id = table_id
+        self.decks = decks
+        self.players = []  # 依座位排列的名字
+        self.hands = []
+        self.current = 0
+        self.game_started = False
+        self.waiting_for_play_again = False
+        self.play_again = {}  # 座位 -> 回應
+        self.games = 0  # 已發牌的局數
+        self.winner = None
+        self.closed = False
+
+    def describe(self):
+        return {
+            'table': self.table_id,
+            'players': {name: len(hand) for name, hand in zip(self.players, self.hands)},
+            'current': self.players[self.current] if self.game_started and self.players else None,
+            'state': 'playing' if self.game_started else 'play_again' if self.waiting_for_play_again else 'waiting',
+            'games': self.games,
+            'winner': self.winner,
+            'closed': self.closed,
+        }
+
+def replay_start(tables, number, payload):
+    for state in tables.values():
+        state.closed = True
+
+def replay_open(tables, number, payload):
+    tables[number] = TableState(number, payload[1:].decode(errors='replace'), payload[0])
+
+def replay_close(tables, number, payload):
+    tables[number].closed = True
+
+def replay_join(tables, number, payload):
+    state = tables[number]
+    state.players.append(payload.decode(errors='replace'))
+    state.hands.append(Hand())
+
+def replay_leave(tables, number, payload):
+    state = tables[number]
+    seat, state.current = SEAT_SEAT.unpack(payload)
+    del state.players[seat]
+    del state.hands[seat]
+    state.play_again = {s - (s > seat): answer for s, answer in state.play_again.items() if s != seat}
+
+def replay_deal(tables, number, payload):
+    state = tables[number]
+    state.hands = deal_hands(state.decks, SEED.unpack(payload)[0], len(state.players))
+    state.current = 0
+    state.game_started = True
+    state.waiting_for_play_again = False
+    state.play_again = {}
+    state.games += 1
+    state.winner = None
+
+def replay_draw(tables, number, payload):
+    state = tables[number]
+    seat, card = SEAT_CARD.unpack(payload)
+    state.hands[(seat + 1) % len(state.hands)].remove(card)
+    state.hands[seat].add(card)
+
+def replay_discard(tables, number, payload):
+    state = tables[number]
+    state.hands[payload[0]].remove_all(unpack_cards(payload, 1))
+
+def replay_end(tables, number, payload):
+    state = tables[number]
+    state.current = (state.current + 1) % len(state.players)
+
+def replay_win(tables, number, payload):
+    state = tables[number]
+    state.winner = state.players[payload[0]]
+    state.game_started = False
+    state.waiting_for_play_again = True
+
+def replay_play_again(tables, number, payload):
+    seat, answer = SEAT_SEAT.unpack(payload)
+    tables[number].play_again[seat] = bool(answer)
+
+def replay_again(tables, number, payload):
+    state = tables[number]
+    state.waiting_for_play_again = False
+    state.play_again = {}
+    if payload[0]:
+        state.hands = [Hand() for _ in state.players]
+        state.current = 0
+
+def replay_abort(tables, number, payload):
+    state = tables[number]
+    state.game_started = False
+    state.waiting_for_play_again = True
+
+# 紀錄種類 -> 套用函式
+REPLAY = {
+    START: replay_start,
+    OPEN: replay_open,
+    CLOSE: replay_close,
+    JOIN: replay_join,
+    LEAVE: replay_leave,
+    DEAL: replay_deal,
+    DRAW: replay_draw,
+    DISCARD: replay_discard,
+    END: replay_end,
+    WIN: replay_win,
+    PLAY_AGAIN: replay_play_again,
+    AGAIN: replay_again,
+    ABORT: replay_abort,
+}
+
+def iter_records(data):
+    """依序取出 (種類, 牌桌序號, 內容)，最後一筆不完整的紀錄（寫到一半時當機）會被略過"""
+    offset = 0
+    end = len(data)
+    unpack = HEADER.unpack_from
+    size = HEADER.size
+    while end - offset >= size:
+        length, kind, number = unpack(data, offset)
+        stop = offset + size + length
+        if stop > end:
+            break
+        yield kind, number, data[offset + size:stop]
+        offset = stop
+
+def replay(data, tables=None):
+    """套用日誌內容，回傳 ({牌桌序號: TableState}, 套用的紀錄數)"""
+    tables = {} if tables is None else tables
+    handlers = REPLAY
+    count = 0
+    for kind, number, payload in iter_records(data):
+        handlers[kind](tables, number, payload)
+        count += 1
+    return tables, count
+
+def replay_file(path):
+    with open(path, 'rb') as f:
+        return replay(f.read())
+
+def describe_record(tables, kind, number, payload):
+    """一筆紀錄的可讀說明（dump 用，需在套用該紀錄之前呼叫）"""
+    state = tables.get(number)
+    name = KIND_NAMES.get(kind, str(kind))
+    if kind == START:
+        return f"start {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(SEED.unpack(payload)[0] / 1000))}"
+    if kind == OPEN:
+        return f"open {payload[1:].decode(errors='replace')} decks={payload[0]}"
+    if kind == JOIN:
+        return f"join {payload.decode(errors='replace')}"
+    if kind == DEAL:
+        return f"deal seed={SEED.unpack(payload)[0]}"
+    if kind == DRAW:
+        seat, card = SEAT_CARD.unpack(payload)
+        source = state.players[(seat + 1) % len(state.players)]
+        return f"draw {state.players[seat]} <- {source} {card_to_string(card)}"
+    if kind == DISCARD:
+        return f"discard {state.players[payload[0]]} {', '.join(card_to_string(c) for c in unpack_cards(payload, 1))}"
+    if kind in (LEAVE, WIN, PLAY_AGAIN):
+        detail = f" {'yes' if payload[1] else 'no'}" if kind == PLAY_AGAIN else ''
+        return f"{name} {state.players[payload[0]]}{detail}"
+    if kind == AGAIN:
+        return f"again {'accepted' if payload[0] else 'declined'}"
+    return name
+
+def main():
+    parser = argparse.ArgumentParser(description="抽鬼牌遊戲事件日誌工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    replay_parser = subparsers.add_parser('replay', help="重播日誌並輸出每張牌桌最後的狀態")
+    replay_parser.add_argument('paths', nargs='+', help="日誌檔（多行程模式下每個工作行程一個）")
+    replay_parser.add_argument('--table', help="只輸出這張牌桌")
+    replay_parser.add_argument('--all', action='store_true', help="也輸出已經移除的牌桌")
+    dump_parser = subparsers.add_parser('dump', help="逐筆列出日誌紀錄")
+    dump_parser.add_argument('path')
+    dump_parser.add_argument('--table', help="只列出這張牌桌")
+    args = parser.parse_args()
+
+    if args.command == 'dump':
+        with open(args.path, 'rb') as f:
+            data = f.read()
+        tables = {}
+        for kind, number, payload in iter_records(data):
+            line = describe_record(tables, kind, number, payload)
+            REPLAY[kind](tables, number, payload)
+            if kind == START:
+                print(line)
+            elif args.table is None or tables[number].table_id == args.table:
+                print(f"[{tables[number].table_id}] {line}")
+        return
+
+    for path in args.paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        tables, count = replay(data)
+        elapsed = time.perf_counter() - start
+        for state in tables.values():
+            if (args.table is None or state.table_id == args.table) and (args.all or not state.closed):
+                print(json.dumps(state.describe(), ensure_ascii=False))
+        rate = count / elapsed if elapsed > 0 else 0
+        print(f"{path}: {count} 筆紀錄、{len(data)} 位元組，重播 {elapsed:.3f} 秒（每秒 {rate:,.0f} 筆）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延遲直方圖的預設分界（秒）
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def escape_label(value):
+    """跳脫標籤值中的反斜線、引號與換行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labelnames, values, extra=()):
+    """組成 Prometheus 的標籤字串"""
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Metric:
+    """所有指標的共同部分：名稱、說明、標籤與各標籤組合的子指標"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=(), function=None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.function = function  # 抓取時才呼叫取得數值（只用於沒有標籤的指標）
+        self.lock = threading.Lock()
+        self.children = {}
+        if not self.labelnames:
+            self.children[()] = self.new_child()
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """取得某組標籤值的子指標"""
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            lines.extend(self.render_child(values, child))
+        return lines
+
+    def render_child(self, values, child):
+        value = self.function() if self.function is not None else child.get()
+        return [f"{self.name}{format_labels(self.labelnames, values)} {format_value(value)}"]
+
+class Value:
+    """可加減的數值"""
+
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+class Counter(Metric):
+    """只會增加的計數"""
+
+    kind = 'counter'
+
+    def new_child(self):
+        return Value()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+class Gauge(Metric):
+    """可上可下的數值"""
+
+    kind = 'gauge'
+
+    def new_child(self):
+        return Value()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    def dec(self, amount=1):
+        self.children[()].dec(amount)
+
+    def set(self, value):
+        self.children[()].set(value)
+
+class HistogramValue:
+    """單一標籤組合的直方圖資料"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """量測 with 區塊花費的時間"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Histogram(Metric):
+    """分桶統計（例如延遲），輸出累積的 _bucket、_sum 與 _count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help_text, labelnames)
+
+    def new_child(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def time(self):
+        return self.children[()].time()
+
+    def render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        with child.lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = format_labels(self.labelnames, values, [('le', format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Registry:
+    """行程內的指標登錄表，同名指標會被取代"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=(), function=None):
+        return self.register(Counter(name, help_text, labelnames, function))
+
+    def gauge(self, name, help_text, labelnames=(), function=None):
+        return self.register(Gauge(name, help_text, labelnames, function))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """輸出 Prometheus 文字格式"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+@contextmanager
+def timed_lock(lock, histogram, tracer=None):
+    """取得鎖並把等待時間記到直方圖（有 tracer 時也記成 lock_wait 區段）"""
+    start = time.perf_counter()
+    with lock:
+        acquired = time.perf_counter()
+        histogram.observe(acquired - start)
+        if tracer is not None:
+            tracer.record('lock_wait', start, acquired)
+        yield
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """回應 /metrics 的 HTTP 處理器"""
+
+    registry = REGISTRY
+    routes = {}  # 額外的路徑 -> 函式(query) 回傳 (content_type, body)
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path == '/metrics':
+            self.reply(200, 'text/plain; version=0.0.4; charset=utf-8', self.registry.render().encode())
+        elif path in self.routes:
+            try:
+                content_type, body = self.routes[path](query)
+            except Exception as e:
+                self.reply(500, 'text/plain; charset=utf-8', f"{e}\n".encode())
+                return
+            self.reply(200, content_type, body)
+        else:
+            self.reply(404, 'text/plain; charset=utf-8', b"not found\n")
+
+    def reply(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 抓取很頻繁，不要洗版
+
+def start_metrics_server(host, port, registry=REGISTRY):
+    """在背景執行緒啟動指標 HTTP 伺服器，回傳伺服器物件"""
+    handler = type('BoundMetricsHandler', (MetricsHandler,), {'registry': registry, 'routes': {}})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"指標服務啟動，監聽 {host}:{httpd.server_address[1]}/metrics")
+    return httpd
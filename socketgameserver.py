@@ -2,394 +2,915 @@ import socket
 import threading
 import random
 import json
+import argparse
+import asyncio
+import selectors
+import time
+import secrets
+from collections import deque
+from itertools import islice
+from socketgamecards import card_from_dict, card_to_string, Hand, DECK_SIZE
+from socketgameengine import shuffled_deck, deal, first_empty, next_seat, draw, draw_winner, is_valid_discard
+from socketgamecodec import (PROTOCOL_VERSION, MAX_NAME_BYTES, negotiate, split_frames, decode_command, encode_text,
+                             encode_hand_snapshot, encode_hand_delta, encode_table_state, encode_session, encode_drew,
+                             encode_discarded, encode_winner, GAME_STARTED_FRAME, YOUR_TURN_FRAME, PLAY_AGAIN_FRAME,
+                             PLAY_AGAIN_ACCEPTED_FRAME, PLAY_AGAIN_DECLINED_FRAME)
+from socketgameio import (OutboxStats, ThreadOutbox, AsyncOutbox, OUTBOX_LIMIT, write_batch,
+                          SLOW_CONSUMER_POLICIES, SLOW_CONSUMER_POLICY, HAND_KIND, HAND_DELTA_KIND)
+from socketgamemetrics import REGISTRY, start_metrics_server, timed_lock
+from socketgametrace import TRACER, PROFILER, install_admin_routes
+from socketgametimer import TimerWheel
+from socketgamejournal import Journal, JOURNAL_FSYNC, JOURNAL_FSYNC_POLICIES
+from socketgameai import (BotRunner, BOT_POLICIES, BOT_POLICY, BOT_EXECUTORS, BOT_EXECUTOR, BOT_WORKERS, BOT_DELAY,
+                          BOT_NAME)
 
 # 遊戲參數
 HOST = '0.0.0.0'
 PORT = 5555
 MIN_PLAYERS = 2  # 最小玩家數量
 MAX_PLAYERS = 4  # 最大玩家數量
+MAX_SPECTATORS = 1000  # 每張牌桌的觀戰人數上限
+DECKS = 1  # 每張牌桌使用幾副牌
+MAX_DECKS = 255  # 副數上限（遊戲事件日誌的開桌紀錄以一個位元組記錄副數）
+AUTO_DISCARD = False  # 新牌桌是否在發牌與抽牌後自動丟棄配對
+SNAPSHOT_INTERVAL = 32  # 差異更新模式下，每隔幾次變動改送一次完整手牌快照
+ENGINES = ['thread', 'asyncio']  # 可選的伺服器引擎
+LISTEN_BACKLOG = 1024  # 監聽佇列長度，應付瞬間大量連線
+LOGIN_TIMEOUT = 10  # 送出名字的期限（秒）
+LOGIN_QUEUE_LIMIT = 1000  # 同時等待送出名字的連線上限
+LOGIN_MAX_BYTES = 1024  # 名字列的長度上限
+MAX_COMMAND_BYTES = 64 * 1024  # 單一指令的長度上限
+RECV_BUFFER_BYTES = 4096  # 每條連線預先配置的接收緩衝區大小（放不下一條指令時才加大）
+LOGIN_PROMPT = "請輸入你的名字:\n".encode()
+LOGIN_BUSY = "伺服器忙碌，請稍後再試。\n".encode()
+LOGIN_TIMEOUT_MESSAGE = "等待名字逾時，斷開連線。\n".encode()
+LOBBY_FILL_TIMEOUT = 10  # 配對佇列最久的玩家等超過幾秒，就以 MIN_PLAYERS 人以上先開桌
+TURN_TIMEOUT = 60  # 輪到的玩家超過幾秒沒有結束回合，就由伺服器代為抽牌並結束回合（0 表示不限時）
+PLAY_AGAIN_TIMEOUT = 60  # 詢問再來一局後幾秒內沒有回應的玩家視為拒絕（0 表示不限時）
+IDLE_TIMEOUT = 300  # 玩家超過幾秒沒有送出任何指令就斷開連線，觀戰者除外（0 表示不斷線）
+RECONNECT_GRACE = 30  # 玩家斷線後保留座位幾秒，期間可以用重新連線代碼回到原本的座位（0 表示不保留）
+SESSION_TOKEN_BYTES = 16  # 重新連線代碼的亂數位元組數
+MAX_TABLE_ID_BYTES = MAX_NAME_BYTES  # 桌號 UTF-8 編碼後的長度上限（SESSION 框架以一個位元組表示長度）
+MAX_TABLE_PREFIX_BYTES = MAX_TABLE_ID_BYTES - 20  # 自動桌號前綴的長度上限，留給後面的編號
+METRICS_HOST = '127.0.0.1'  # 指標服務只監聽本機
+COMMAND_VERBS = {'start', 'set', 'draw', 'discard', 'end', 'playagain', 'resync'}  # 指標中分開統計的指令
 
-# 撲克牌生成，包括兩張鬼牌
-suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
-ranks = list(range(1, 14))  # 1: Ace, 11: Jack, 12: Queen, 13: King
-joker = {'suit': 'Joker', 'rank': 0}  # 將鬼牌的 rank 設置為 0
+# 指標，由 --metrics-port 開啟的 HTTP 服務以 Prometheus 文字格式輸出
+CONNECTIONS = REGISTRY.gauge('oldmaid_connections', "目前已登入的連線數（玩家與觀戰者）")
+CONNECTIONS_TOTAL = REGISTRY.counter('oldmaid_connections_total', "接受的連線總數")
+COMMANDS = REGISTRY.counter('oldmaid_commands_total', "處理的指令數", ['command'])
+COMMAND_SECONDS = REGISTRY.histogram('oldmaid_command_seconds', "每條指令的處理時間（秒，含等待牌桌鎖）", ['command'])
+ERRORS = REGISTRY.counter('oldmaid_errors_total', "錯誤數", ['type'])
+LOCK_WAIT_SECONDS = REGISTRY.histogram('oldmaid_table_lock_wait_seconds', "處理指令前等待牌桌鎖的時間（秒）")
+TABLE_OP_SECONDS = REGISTRY.histogram('oldmaid_table_op_seconds', "抽牌與丟棄在牌桌鎖內的執行時間（秒）", ['op'])
+CARDS_DRAWN = REGISTRY.counter('oldmaid_cards_drawn_total', "抽牌次數")
+CARDS_DISCARDED = REGISTRY.counter('oldmaid_cards_discarded_total', "玩家主動丟棄的牌數")
+BROADCASTS = REGISTRY.counter('oldmaid_broadcasts_total', "廣播訊息數")
+BROADCAST_RECIPIENTS = REGISTRY.counter('oldmaid_broadcast_recipients_total', "廣播送達的連線數")
+BROADCAST_BYTES = REGISTRY.counter('oldmaid_broadcast_bytes_total', "廣播放入送出佇列的位元組")
+LOBBY_WAITING = REGISTRY.gauge('oldmaid_lobby_waiting', "配對佇列中等待的玩家數")
+LOBBY_WAIT_SECONDS = REGISTRY.histogram('oldmaid_lobby_wait_seconds', "玩家在配對佇列中等到發牌的時間（秒）",
+                                        buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60))
+LOBBY_TABLES = REGISTRY.counter('oldmaid_lobby_tables_total', "配對佇列開出的牌桌數", ['reason'])
+LOBBY_SEATS = REGISTRY.counter('oldmaid_lobby_seats_total', "配對佇列安排入座的玩家數")
+TIMEOUTS = REGISTRY.counter('oldmaid_timeouts_total', "回合、再來一局與閒置逾時的次數", ['kind'])
+RECONNECTS = REGISTRY.counter('oldmaid_reconnects_total', "斷線保留座位與重新連線的結果", ['result'])
 
-def create_deck():
-    """建立一副包含鬼牌的撲克牌"""
-    deck = [{'suit': suit, 'rank': rank} for suit in suits for rank in ranks]
-    deck.extend([joker.copy(), joker.copy()])  # 加入兩張鬼牌
-    return deck
+def parse_login(line):
+    """解析登入時送出的名字列，名字後面可附加 key=value 選項（例如 table=7）"""
+    tokens = line.split()
+    options = {}
+    while len(tokens) > 1 and '=' in tokens[-1]:
+        key, value = tokens[-1].split('=', 1)
+        if not key:
+            break
+        options[key.lower()] = value
+        tokens.pop()
+    return ' '.join(tokens), options
+
+def split_command(command):
+    """把指令拆成 (小寫的第一個字, 其餘部分)，整條指令只需要拆一次"""
+    verb, _, args = command.partition(' ')
+    return verb.lower(), args
+
+class FrameTooLong(ValueError):
+    """單一指令超過長度上限"""
+
+class LineFramer:
+    """把 TCP 位元組流切成一行一行的指令，一次讀取可能含有多條指令或半條指令
+
+    資料直接收進預先配置的緩衝區（socket.recv_into / asyncio.BufferedProtocol），
+    以 memoryview 找出每一行後直接解碼成指令字串，讀取時不再配置新的 bytes，也不必搬移剩下的資料。
+    """
+
+    def __init__(self, max_bytes=MAX_COMMAND_BYTES, size=RECV_BUFFER_BYTES):
+        self.max_bytes = max_bytes
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # 尚未處理的資料從這裡開始
+        self.end = 0  # 已收到的資料到這裡結束
+
+    def pending(self):
+        """已收到但還沒形成完整指令的位元組數"""
+        return self.end - self.start
+
+    def free_space(self):
+        """回傳可以直接寫入的區域；緩衝區寫滿時把未處理的資料移到開頭，整個緩衝區都是半條指令時才加大"""
+        if self.end == len(self.buffer):
+            pending = self.end - self.start
+            if self.start:
+                self.view[:pending] = self.view[self.start:self.end]  # memoryview 的複製可以處理重疊
+            else:
+                buffer = bytearray(len(self.buffer) * 2)
+                buffer[:pending] = self.view[:pending]
+                self.buffer = buffer
+                self.view = memoryview(buffer)
+            self.start = 0
+            self.end = pending
+        return self.view[self.end:]
+
+    def received(self, nbytes):
+        """登記剛寫入 free_space() 的位元組數"""
+        self.end += nbytes
+
+    def recv_into(self, sock):
+        """從 socket 讀進緩衝區，回傳讀到的位元組數（0 表示對方已關閉）"""
+        nbytes = sock.recv_into(self.free_space())
+        self.end += nbytes
+        return nbytes
+
+    def feed(self, data):
+        """放入一段已經收到的資料（例如交握時跟著名字一起收到的資料）"""
+        data = memoryview(data)
+        while data:
+            space = self.free_space()
+            count = min(len(space), len(data))
+            space[:count] = data[:count]
+            self.end += count
+            data = data[count:]
+
+    def take_line(self):
+        """取出第一行（不含換行）的 bytes，還沒有完整的一行時回傳 None"""
+        index = self.buffer.find(b'\n', self.start, self.end)
+        if index < 0:
+            return None
+        line = bytes(self.view[self.start:index])
+        self.start = index + 1
+        return line
+
+    def peek(self):
+        """未處理資料的複本（不取出）"""
+        return bytes(self.view[self.start:self.end])
+
+    def commands(self):
+        """回傳緩衝區中所有完整的指令（已去除空白，略過空行）"""
+        last = self.buffer.rfind(b'\n', self.start, self.end)
+        if last < 0:
+            if self.end - self.start > self.max_bytes:
+                raise FrameTooLong("指令太長")
+            return []
+        # 所有完整的行一次解碼、一次切開，不必逐行建立切片
+        lines = str(self.view[self.start:last], 'utf-8').split('\n')
+        if last + 1 == self.end:
+            self.start = self.end = 0  # 全部處理完，下次從頭寫入
+        else:
+            self.start = last + 1
+            if self.end - self.start > self.max_bytes:
+                raise FrameTooLong("指令太長")
+        return [line for line in map(str.strip, lines) if line]
+
+class FrameDecoder(LineFramer):
+    """二進位協定的指令切分器：接手登入時的 LineFramer 緩衝區（可能已經收到後續的框架），
+    依長度前綴切出框架後以操作碼查表，直接得到 (指令, 參數)，不必掃描與拆解字串
+    """
+
+    def __init__(self, framer):
+        self.max_bytes = framer.max_bytes
+        self.buffer = framer.buffer
+        self.view = framer.view
+        self.start = framer.start
+        self.end = framer.end
+
+    def commands(self):
+        """回傳緩衝區中所有完整框架對應的 (指令, 參數)"""
+        try:
+            frames, self.start = split_frames(self.view, self.start, self.end)
+        except ValueError as e:
+            raise FrameTooLong(str(e))
+        if self.start == self.end:
+            self.start = self.end = 0  # 全部處理完，下次從頭寫入
+        return [decode_command(opcode, payload) for opcode, payload in frames]
 
 class Player:
-    def __init__(self, conn, addr, name):
+    def __init__(self, conn, addr, name, outbox):
         self.conn = conn
+        self.outbox = outbox  # 送出佇列，見 socketgameio
         self.addr = addr
         self.name = name
-        self.hand = []
+        self.hand = Hand()  # 手牌，見 socketgamecards
         self.ready = False  # 表示玩家是否準備好
         self.has_drawn = False  # 每回合是否已抽牌
         self.play_again = None  # 玩家是否想再玩一局
+        self.table = None  # 玩家所在的牌桌
+        self.spectator = False  # 是否只是觀戰（沒有座位）
+        self.framer = LineFramer()  # 切分收到的指令
+        self.delta = False  # 是否使用手牌差異更新（登入時以 delta=1 開啟）
+        self.protocol = 0  # 二進位協定版本（登入時以 proto=1 協商），0 表示文字協定
+        self.hand_seq = 0  # 手牌更新的序號
+        self.updates_since_snapshot = 0
+        self.last_active = time.monotonic()  # 最後一次送出指令的時間
+        self.idle_timer = None  # 閒置檢查的計時器
+        self.session = None  # 重新連線代碼（入座時發給），見 GameServer.issue_session
+        self.disconnected = False  # 連線已中斷，座位保留到 grace_timer 到期
+        self.grace_timer = None
+        self.policy = None  # 伺服器端機器人的決策策略（socketgameai），None 表示真人玩家
 
-class GameServer:
-    def __init__(self, host, port):
+    def send(self, message, kind=None):
+        """傳送一則文字訊息給玩家（二進位協定下包成 TEXT 框架）"""
+        if self.protocol:
+            self.send_bytes(encode_text(message), kind)
+        else:
+            self.send_bytes((message + "\n").encode(), kind)
+
+    def send_event(self, message, frame, kind=None):
+        """傳送有專屬操作碼的事件：二進位協定送 frame，文字協定送 message"""
+        if self.protocol:
+            self.send_bytes(frame, kind)
+        else:
+            self.send_bytes((message + "\n").encode(), kind)
+
+    def send_line(self, message):
+        """不論協定都送出一行文字：登入的結果（閘道與舊客戶端都靠這一行判斷是否登入成功）"""
+        self.send_bytes((message + "\n").encode())
+
+    def welcome(self, message):
+        """送出歡迎訊息，使用二進位協定時在最後附上 proto=版本，之後的訊息才改用二進位框架"""
+        if self.protocol:
+            message += f" proto={self.protocol}"
+        self.send_line(message)
+
+    def send_bytes(self, data, kind=None):
+        """把已編碼的資料放進送出佇列，不會等待網路"""
+        if not self.outbox.put(data, kind):
+            print(f"玩家 {self.name} 接收太慢，斷開連線。")
+            ERRORS.labels('slow_consumer').inc()
+            self.outbox.abort()
+        elif self.outbox.needs_snapshot:
+            # 送出佇列丟掉了手牌訊息，下一次手牌更新直接改送完整快照
+            self.outbox.needs_snapshot = False
+            self.updates_since_snapshot = SNAPSHOT_INTERVAL
+
+    def close(self):
+        """送完待送資料後關閉玩家的連線"""
+        self.outbox.close()
+
+class BotPlayer(Player):
+    """伺服器端的機器人玩家：沒有連線，和真人一樣坐在牌桌上輪流，每一步由 socketgameai.BotRunner 排程決策"""
+
+    def __init__(self, name, policy, max_card):
+        super().__init__(None, None, name, None)
+        self.policy = policy
+        self.ready = True  # 機器人隨時都準備好
+        self.framer = None  # 不接收資料，不需要接收緩衝區
+        # 和真人一樣協商：牌編號放得進二進位協定時，手牌更新只編碼成框架，比文字 JSON 便宜
+        self.protocol = negotiate(PROTOCOL_VERSION, max_card)
+        self.delta = True
+
+    def send_bytes(self, data, kind=None):
+        """送給機器人的訊息直接丟掉，機器人的決策只看牌桌狀態的複本"""
+
+    def close(self):
+        pass
+
+class Table:
+    """一張獨立的牌桌，擁有自己的牌組、輪到的玩家、再來一局狀態與鎖"""
+
+    def __init__(self, table_id, decks=DECKS, auto_discard=AUTO_DISCARD):
+        self.table_id = table_id
+        self.decks = decks
+        self.auto_discard = auto_discard  # 發牌與抽牌後由伺服器自動丟棄配對
         self.players = []
-        self.host = host
-        self.port = port
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.spectators = {}  # 觀戰者（用 dict 保持加入順序並 O(1) 移除）
         self.deck = []
         self.current_player = 0
         self.game_started = False
-        self.lock = threading.Lock()  # 用於線程安全的鎖
+        self.lock = threading.RLock()  # 牌桌自己的鎖，不同牌桌互不影響
         self.waiting_for_play_again = False
+        self.auto_start = False  # 由配對佇列開出的牌桌不需要玩家按準備開始
+        self.timers = None  # 伺服器的計時輪，None 表示不限時
+        self.turn_timeout = TURN_TIMEOUT
+        self.play_again_timeout = PLAY_AGAIN_TIMEOUT
+        self.turn_timer = None
+        self.play_again_timer = None
+        self.turn_serial = 0  # 每換一次回合加一，用來辨認已經過期的計時器
+        self.rng = random.Random()  # 牌桌自己的亂數產生器：每局的洗牌種子與抽牌位置
+        self.journal = None  # 這張牌桌的事件日誌（socketgamejournal.TableJournal），None 表示不記錄
+        self.bots = None  # 伺服器端機器人的排程（socketgameai.BotRunner），None 表示不能加入機器人
+        self.bot_fill = False  # 真人不足時是否以機器人補位（伺服器的 --bot-fill）
 
-    def start_server(self):
-        """啟動伺服器"""
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen()
-        print(f"伺服器啟動，監聽 {self.host}:{self.port}")
+    def is_joinable(self):
+        """牌桌是否還能加入新玩家"""
+        return (not self.game_started and not self.waiting_for_play_again
+                and len(self.players) < MAX_PLAYERS)
 
-        accept_thread = threading.Thread(target=self.accept_connections, daemon=True)
-        accept_thread.start()
+    def add_player(self, player):
+        """將玩家加入牌桌"""
+        with self.lock:
+            self.players.append(player)
+            player.table = self
+            if self.journal is not None:
+                self.journal.join(player.name)
 
-        try:
-            while True:
-                pass
-        except KeyboardInterrupt:
-            print("伺服器正在關閉...")
-            self.server_socket.close()
+    def add_spectator(self, player):
+        """加入觀戰者，回傳 False 表示觀戰人數已滿"""
+        with self.lock:
+            if len(self.spectators) >= MAX_SPECTATORS:
+                return False
+            player.spectator = True
+            player.table = self
+            self.spectators[player] = None
+            return True
 
-    def accept_connections(self):
-        """接受玩家連線"""
-        while True:
-            try:
-                conn, addr = self.server_socket.accept()
-                print(f"玩家連線: {addr}")
-                conn.sendall("請輸入你的名字:\n".encode())
-                name = conn.recv(1024).decode().strip()
-                if not name:
-                    conn.sendall("名字不能為空，斷開連線。\n".encode())
-                    conn.close()
-                    continue
-                with self.lock:
-                    if len(self.players) >= MAX_PLAYERS:
-                        conn.sendall("遊戲已滿員，無法加入。\n".encode())
-                        conn.close()
-                        continue
-                player = Player(conn, addr, name)
-                with self.lock:
-                    self.players.append(player)
-                print(f"玩家 {name} 已加入遊戲。")
-                conn.sendall(f"歡迎 {name} 加入遊戲！\n".encode())
-
-                # 啟動一個執行緒處理玩家訊息
-                threading.Thread(target=self.handle_player, args=(player,), daemon=True).start()
-            except Exception as e:
-                print(f"接受連線時出錯: {e}")
-                break
+    def fill_bots(self, size):
+        """以伺服器端機器人補滿空位，直到牌桌有 size 人"""
+        with self.lock:
+            while len(self.players) < min(size, MAX_PLAYERS):
+                count = sum(1 for p in self.players if p.policy is not None)
+                bot = BotPlayer(f"{BOT_NAME}{count + 1}", self.bots.policy, self.decks * DECK_SIZE - 1)
+                self.add_player(bot)
+                self.broadcast(f"{bot.name}（伺服器端機器人）加入牌桌。")
+
+    def remove_bots(self):
+        """移除牌桌上所有機器人（真人都離開後，牌桌才會被清掉）"""
+        with self.lock:
+            for bot in [p for p in self.players if p.policy is not None]:
+                self.remove_player(bot)
+                bot.table = None
+
+    def bot_step_valid(self, bot, step, serial):
+        """機器人排定的這一步是否仍然有效：回合沒換、遊戲沒結束、機器人還在牌桌上"""
+        if bot.table is not self:
+            return False
+        if step == 'play_again':
+            return self.waiting_for_play_again and bot.play_again is None
+        return (self.game_started and serial == self.turn_serial and self.players[self.current_player] is bot
+                and bot.has_drawn == (step == 'discard'))
 
-    def handle_player(self, player):
-        """處理單個玩家的訊息"""
+    def bot_view(self, bot, step, serial):
+        """機器人決策用的牌桌狀態複本（不含其他玩家的手牌），這一步已經無效時回傳 None"""
+        with self.lock:
+            if not self.bot_step_valid(bot, step, serial):
+                return None
+            return {
+                'step': step,
+                'seat': self.players.index(bot),
+                'hand': list(bot.hand),
+                'counts': [len(p.hand) for p in self.players],
+                'auto_discard': self.auto_discard,
+            }
+
+    def apply_bot(self, bot, step, serial, commands):
+        """套用機器人的決策，指令和真人一樣經過 handle_command；這一步已經無效時丟掉決策並回傳 False"""
+        with write_batch(), self.lock:
+            if not self.bot_step_valid(bot, step, serial):
+                return False
+            for verb, args in commands:
+                self.handle_command(bot, verb, args)
+            if step == 'draw' and self.bot_step_valid(bot, 'discard', serial):
+                self.bots.request(self, bot, 'discard')  # 看過抽到的牌再決定丟棄
+            return True
+
+    def replace_player(self, old, player):
+        """重新連線：新連線的玩家接手 old 的座位、手牌與回合狀態，座位順序與輪到的玩家都不變"""
+        with self.lock:
+            self.players[self.players.index(old)] = player
+            player.name = old.name
+            player.hand = old.hand
+            player.ready = old.ready
+            player.has_drawn = old.has_drawn
+            player.play_again = old.play_again
+            player.hand_seq = old.hand_seq
+            player.table = self
+            old.table = None
+
+    def send_state(self, player):
+        """送出一則完整的牌桌狀態：手牌、輪到誰、各座位的牌數與目前階段，取代斷線期間漏掉的所有訊息"""
+        with self.lock:
+            if self.waiting_for_play_again:
+                phase = 'play_again'
+            else:
+                phase = 'playing' if self.game_started else 'waiting'
+            player.hand_seq += 1  # 牌桌狀態也是一次手牌快照，之後的差異從這個序號接續
+            player.updates_since_snapshot = 0
+            state = {
+                'seq': player.hand_seq,
+                'phase': phase,
+                'seat': self.players.index(player),
+                'turn': self.current_player,
+                'drawn': player.has_drawn,
+                'ready': player.ready,
+                'answered': player.play_again is not None,
+                'players': [[p.name, len(p.hand), not p.disconnected] for p in self.players],
+                'hand': list(player.hand),
+            }
+            if player.protocol:
+                player.send_bytes(encode_table_state(state))
+            else:
+                player.send("牌桌狀態 " + json.dumps(state, separators=(',', ':')))
+
+    def describe(self):
+        """牌桌目前狀態的一行摘要"""
+        with self.lock:
+            seats = ', '.join(f"{p.name}({len(p.hand)}張)" for p in self.players)
+            state = "遊戲進行中" if self.game_started else "等待開始"
+            return f"牌桌 {self.table_id}，{state}，玩家: {seats}"
+
+    def remove_player(self, player):
+        """將玩家或觀戰者移出牌桌"""
+        with self.lock:
+            if player in self.spectators:
+                del self.spectators[player]
+                return
+            if player in self.players:
+                index = self.players.index(player)
+                was_current = index == self.current_player
+                self.players.remove(player)
+                if index < self.current_player:
+                    self.current_player -= 1
+                if self.current_player >= len(self.players):
+                    self.current_player = 0
+                if self.journal is not None:
+                    self.journal.leave(index, self.current_player)
+                if not self.players:
+                    self.cancel_timers()
+                elif self.game_started and len(self.players) < MIN_PLAYERS:
+                    self.abort_game(player)
+                elif was_current and self.game_started:
+                    # 輪到的玩家離開，換下一位並重新計時
+                    self.players[self.current_player].has_drawn = False
+                    self.notify_current_player()
+                elif self.waiting_for_play_again:
+                    self.check_play_again()  # 離開的可能是最後一位還沒回應的玩家
+
+    def handle_command(self, player, verb, args=''):
+        """處理玩家在這張牌桌上的一條指令，回傳 False 表示應結束此玩家的連線
+
+        verb 是指令的第一個字（已轉成小寫），args 是其餘部分。依 verb 查 dispatch 表取得處理函式與
+        適用的階段，共同的狀態檢查只在這裡做一次，不再對整條指令反覆 lower() 與 startswith()。
+        """
+        with timed_lock(self.lock, LOCK_WAIT_SECONDS, TRACER):
+            if player.spectator:
+                ERRORS.labels('spectator_command').inc()
+                player.send("你正在觀戰，無法操作。")
+                return True
+            entry = self.dispatch.get(verb)
+            if entry is None:
+                ERRORS.labels('invalid_command').inc()
+                player.send("無效的指令，請重新輸入。")
+                return True
+            handler, phase = entry
+            if phase != 'any' and self.waiting_for_play_again != (phase == 'play_again'):
+                if self.waiting_for_play_again:
+                    player.send("請回答 'playagain yes' 或 'playagain no' 以決定是否再來一局。")
+                else:
+                    player.send("現在沒有詢問是否再來一局。")
+                return True
+            if phase == 'turn':
+                if not self.game_started:
+                    ERRORS.labels('not_started').inc()
+                    player.send("遊戲尚未開始，請等待其他玩家準備。")
+                    return True
+                if self.players[self.current_player] is not player:
+                    ERRORS.labels('not_your_turn').inc()
+                    player.send("現在不是你的回合，請等待。")
+                    return True
+            return handler(self, player, args)
+
+    def command_resync(self, player, args):
+        """客戶端發現手牌序號不連續，重送完整快照"""
+        self.send_hand(player)
+        return True
+
+    def command_start(self, player, args):
+        """玩家按下準備開始"""
+        if self.game_started:
+            player.send("遊戲已經開始。")
+            return True
+        player.ready = True
+        self.broadcast(f"{player.name} 已準備開始遊戲。")
+        if self.bot_fill and len(self.players) < MIN_PLAYERS:
+            self.fill_bots(MIN_PLAYERS)  # 真人不足時由伺服器端機器人補上空位
+        if self.check_all_ready():
+            self.start_game()
+        return True
+
+    def command_draw(self, player, args):
+        self.handle_draw(player)
+        return True
+
+    def command_discard(self, player, args):
+        """'discard auto' 由伺服器找出所有配對，否則 args 是要丟棄的牌（文字協定為 JSON，二進位協定為牌的編號）"""
+        if isinstance(args, str) and args.strip().lower() == "auto":
+            # 由伺服器依手牌索引一次找出所有配對
+            with TRACER.span('validate'):
+                pairs = player.hand.take_pairs()
+            if not pairs:
+                # 沒有配對時什麼都不做，不算錯誤：機器人一次送出整個回合的指令時還不知道會抽到什麼牌
+                player.send("你手中沒有可配對丟棄的牌。")
+                return True
+            self.handle_discard(player, pairs, removed=True)
+            return True
+        # 提取丟棄的牌資訊
         try:
-            while True:
-                data = player.conn.recv(4096).decode().strip()
-                if not data:
-                    print(f"玩家 {player.name} 已斷開連線。")
-                    break
-                print(f"收到來自 {player.name} 的指令: {data}")
-
-                if not self.waiting_for_play_again:
-                    # Normal game commands
-                    if data.lower() == "start":
-                        player.ready = True
-                        self.broadcast(f"{player.name} 已準備開始遊戲。")
-                        if self.check_all_ready():
-                            self.start_game()
-                    elif self.game_started:
-                        if self.players[self.current_player] == player:
-                            if data.lower().startswith("draw"):
-                                self.handle_draw(player)
-                                # player.conn.sendall("你可以繼續操作，輸入 'discard' 配對丟棄 或 'end' 結束回合。\n".encode())
-                            elif data.lower().startswith("discard"):
-                                # 提取丟棄的牌資訊
-                                try:
-                                    _, discard_json = data.split(" ", 1)
-                                    discard_info = json.loads(discard_json)
-                                    cards_to_discard = discard_info.get('cards', [])
-                                    if len(cards_to_discard) < 2 or len(cards_to_discard) % 2 != 0:
-                                        player.conn.sendall("丟棄必須是兩張或多張偶數張牌。\n".encode())
-                                        continue
-                                    # 驗證每一對是否符合配對規則
-                                    if not self.validate_discard_pairs(player, cards_to_discard):
-                                        player.conn.sendall("丟棄的牌必須成對數字相同且非鬼牌。\n".encode())
-                                        continue
-                                    # 驗證玩家手中是否有這些牌
-                                    if not self.validate_player_hand(player, cards_to_discard):
-                                        player.conn.sendall("你手中沒有這些牌，無法丟棄。\n".encode())
-                                        continue
-                                    self.handle_discard(player, cards_to_discard)
-                                    # player.conn.sendall("你已完成配對丟棄。\n".encode())
-                                except Exception as e:
-                                    player.conn.sendall("丟棄指令格式錯誤。\n".encode())
-                                    continue
-                            elif data.lower().startswith("end"):
-                                # 確保玩家已經抽牌
-                                if not player.has_drawn:
-                                    player.conn.sendall("你必須先抽牌才能結束回合。\n".encode())
-                                    continue
-                                # 結束回合，切換到下一位玩家
-                                self.current_player = (self.current_player + 1) % len(self.players)
-                                self.notify_current_player()
-                            elif data.lower().startswith("playagain"):
-                                # Player responds to play again request
-                                try:
-                                    _, response = data.split(" ", 1)
-                                    response = response.lower()
-                                    if response == "yes":
-                                        player.play_again = True
-                                    elif response == "no":
-                                        player.play_again = False
-                                    else:
-                                        player.conn.sendall("請回應 'playagain yes' 或 'playagain no'。\n".encode())
-                                        continue
-                                    self.check_play_again()
-                                except ValueError:
-                                    player.conn.sendall("請使用格式 'playagain yes' 或 'playagain no'。\n".encode())
-                                    continue
-                            else:
-                                player.conn.sendall("無效的指令，請重新輸入。\n".encode())
-                                continue
-
-                            # 檢查遊戲結束條件
-                            if len(player.hand) == 0:
-                                self.broadcast(f"{player.name} 贏得了遊戲！")
-                                self.game_started = False
-                                self.waiting_for_play_again = True
-                                self.request_play_again()
-                                break
-                        else:
-                            player.conn.sendall("現在不是你的回合，請等待。\n".encode())
-                    else:
-                        player.conn.sendall("遊戲尚未開始，請等待其他玩家準備。\n".encode())
+            with TRACER.span('parse'):
+                if isinstance(args, list):
+                    cards_to_discard = args  # 二進位協定送來的已經是牌的編號
                 else:
-                    # Waiting for players to agree to play again
-                    if data.lower().startswith("playagain"):
-                        try:
-                            _, response = data.split(" ", 1)
-                            response = response.lower()
-                            if response == "yes":
-                                player.play_again = True
-                            elif response == "no":
-                                player.play_again = False
-                            else:
-                                player.conn.sendall("請回應 'playagain yes' 或 'playagain no'。\n".encode())
-                                continue
-                            self.check_play_again()
-                        except ValueError:
-                            player.conn.sendall("請使用格式 'playagain yes' 或 'playagain no'。\n".encode())
-                            continue
-                    else:
-                        player.conn.sendall("請回答 'playagain yes' 或 'playagain no' 以決定是否再來一局。\n".encode())
+                    discard_info = json.loads(args)
+                    # 只在線路邊界把牌的字典轉成編號
+                    cards_to_discard = [card_from_dict(card) for card in discard_info.get('cards', [])]
+            with TRACER.span('validate'):
+                if len(cards_to_discard) < 2 or len(cards_to_discard) % 2 != 0:
+                    ERRORS.labels('bad_discard').inc()
+                    player.send("丟棄必須是兩張或多張偶數張牌。")
+                    return True
+                # 驗證每一對是否符合配對規則
+                if not self.validate_discard_pairs(player, cards_to_discard):
+                    ERRORS.labels('bad_discard').inc()
+                    player.send("丟棄的牌必須成對數字相同且非鬼牌。")
+                    return True
+                # 驗證玩家手中是否有這些牌
+                if not self.validate_player_hand(player, cards_to_discard):
+                    ERRORS.labels('bad_discard').inc()
+                    player.send("你手中沒有這些牌，無法丟棄。")
+                    return True
+            self.handle_discard(player, cards_to_discard)
         except Exception as e:
-            print(f"處理玩家 {player.name} 時發生錯誤: {e}")
-        finally:
-            player.conn.close()
-            with self.lock:
-                if player in self.players:
-                    self.players.remove(player)
-            self.broadcast(f"玩家 {player.name} 已離開遊戲。")
-            print(f"玩家 {player.name} 已離開遊戲。")
+            ERRORS.labels('bad_discard').inc()
+            player.send("丟棄指令格式錯誤。")
+        # 遊戲結束條件已在 handle_discard 中檢查
+        return True
 
-    def validate_discard_pairs(self, player, cards):
-        """驗證所有被丟棄的牌是否能完全配對"""
-        selected_ranks = []
-        for card in cards:
-            if card['suit'] == 'Joker':
-                return False  # 鬼牌不能被丟棄
-            selected_ranks.append(card['rank'])
-        rank_counts = {}
-        for rank in selected_ranks:
-            if rank in rank_counts:
-                rank_counts[rank] += 1
-            else:
-                rank_counts[rank] = 1
-        for count in rank_counts.values():
-            if count % 2 != 0:
-                return False
+    def command_end(self, player, args):
+        # 確保玩家已經抽牌
+        if not player.has_drawn:
+            ERRORS.labels('must_draw').inc()
+            player.send("你必須先抽牌才能結束回合。")
+            return True
+        # 結束回合，切換到下一位玩家
+        self.end_turn()
         return True
 
-    def validate_player_hand(self, player, cards):
-        """驗證玩家手中是否擁有所有欲丟棄的牌"""
-        temp_hand = player.hand.copy()
-        for card in cards:
-            if card in temp_hand:
-                temp_hand.remove(card)
-            else:
-                return False
+    def command_set(self, player, args):
+        """處理牌桌設定指令，目前支援 'set autodiscard on|off'"""
+        if self.game_started:
+            player.send("遊戲進行中，無法變更牌桌設定。")
+            return True
+        args = args.lower().split()
+        if len(args) != 2 or args[0] != "autodiscard" or args[1] not in ("on", "off"):
+            player.send("請使用格式 'set autodiscard on' 或 'set autodiscard off'。")
+            return True
+        self.auto_discard = args[1] == "on"
+        self.broadcast(f"{player.name} 將自動配對丟棄設為{'開啟' if self.auto_discard else '關閉'}。")
+        return True
+
+    def command_play_again(self, player, args):
+        """處理玩家對再來一局的回應"""
+        response = args.strip().lower()
+        if response in ("yes", "no"):
+            self.set_play_again(player, response == "yes")
+        elif not response:
+            player.send("請使用格式 'playagain yes' 或 'playagain no'。")
+            return True
+        else:
+            player.send("請回應 'playagain yes' 或 'playagain no'。")
+            return True
+        self.check_play_again()
         return True
 
+    def set_play_again(self, player, answer):
+        player.play_again = answer
+        if self.journal is not None:
+            self.journal.play_again(self.players.index(player), answer)
+
+    def validate_discard_pairs(self, player, cards):
+        """驗證所有被丟棄的牌是否能完全配對（鬼牌不能被丟棄）"""
+        return is_valid_discard(cards)
+
+    def validate_player_hand(self, player, cards):
+        """驗證玩家手中是否擁有所有欲丟棄的牌（同一張牌不能出現兩次）"""
+        # 先檢查編號在這張牌桌的副數之內：遮罩是 1 << 編號，超出範圍的編號會組出巨大的整數
+        limit = self.decks * DECK_SIZE
+        if not all(isinstance(card, int) and 0 <= card < limit for card in cards):
+            return False
+        return player.hand.contains_all(cards)
+
     def check_all_ready(self):
-        """檢查是否所有玩家都已準備好且至少有最小玩家數量"""
+        """檢查是否所有玩家都已準備好且至少有最小玩家數量（機器人隨時都準備好）"""
         if len(self.players) < MIN_PLAYERS:
             return False
-        return all(player.ready for player in self.players)
+        return all(player.ready or player.policy is not None for player in self.players)
 
     def start_game(self):
         """開始遊戲並分發手牌"""
         with self.lock:
             self.game_started = True
             self.waiting_for_play_again = False
-            print("所有玩家都已準備好，遊戲開始，正在分發牌組...")
-            self.deck = create_deck()
-            random.shuffle(self.deck)
+            print(f"牌桌 {self.table_id} 所有玩家都已準備好，遊戲開始，正在分發牌組...")
+            # 每局以牌桌的亂數產生器取一個種子來洗牌，日誌只需記下種子就能重現發牌
+            seed = self.rng.getrandbits(64)
+            self.deck = shuffled_deck(self.decks, seed)
+            if self.journal is not None:
+                self.journal.deal(seed)
 
             # 清除之前的 play_again 回應
             for player in self.players:
                 player.play_again = None
 
             # 平均分配牌給玩家
-            player_count = len(self.players)
-            for i, card in enumerate(self.deck):
-                self.players[i % player_count].hand.append(card)
+            deal(self.deck, [player.hand for player in self.players])
+
+            if self.auto_discard:
+                for player in self.players:
+                    self.announce_discard(player, player.hand.take_pairs())
 
             # 通知玩家他們的手牌
             for player in self.players:
                 self.send_hand(player)
-                player.conn.sendall("遊戲已開始，等待你的操作！\n".encode())
+                player.send_event("遊戲已開始，等待你的操作！", GAME_STARTED_FRAME)
                 player.has_drawn = False  # 初始化每個玩家的抽牌狀態
 
+            winner = first_empty([player.hand for player in self.players])
+            if winner is not None:
+                self.declare_winner(self.players[winner])
+                return
             self.notify_current_player()
 
     def notify_current_player(self):
-        """通知當前玩家進行操作"""
+        """通知當前玩家進行操作，並開始這一回合的計時"""
         if not self.game_started:
             return
         if not self.players:
             return
         current_player = self.players[self.current_player]
+        self.arm_turn_timer()
+        if current_player.policy is not None:
+            self.bots.request(self, current_player, 'draw')
+            return
         try:
-            current_player.conn.sendall("輪到你操作，點擊抽牌或配對丟棄，或結束回合。\n".encode())
+            current_player.send_event("輪到你操作，點擊抽牌或配對丟棄，或結束回合。", YOUR_TURN_FRAME)
         except Exception as e:
             print(f"通知玩家 {current_player.name} 時出錯: {e}")
 
+    def end_turn(self):
+        """結束目前玩家的回合，輪到下一位玩家"""
+        self.current_player = next_seat(self.current_player, len(self.players))
+        self.players[self.current_player].has_drawn = False  # 新的回合要重新抽牌
+        if self.journal is not None:
+            self.journal.end()
+        self.notify_current_player()
+
+    def arm_turn_timer(self):
+        """重新開始回合計時（換回合時舊的計時器直接取消）"""
+        if self.turn_timer is not None:
+            self.turn_timer.cancel()
+            self.turn_timer = None
+        self.turn_serial += 1
+        if self.timers is not None and self.turn_timeout:
+            self.turn_timer = self.timers.schedule(self.turn_timeout, self.turn_timed_out, self.turn_serial)
+
+    def turn_timed_out(self, serial):
+        """輪到的玩家沒有在期限內結束回合：還沒抽牌就代為抽一張，然後結束回合"""
+        with write_batch(), self.lock:
+            # 計時器可能在玩家剛好結束回合時觸發，序號不同表示已經換過回合
+            if serial != self.turn_serial or not self.game_started or not self.players:
+                return
+            player = self.players[self.current_player]
+            TIMEOUTS.labels('turn').inc()
+            print(f"牌桌 {self.table_id} 玩家 {player.name} 回合逾時。")
+            self.broadcast(f"{player.name} 超過 {self.turn_timeout:g} 秒沒有結束回合，由伺服器代為操作。")
+            if not player.has_drawn:
+                self.handle_draw(player)
+                if not self.game_started:
+                    return  # 這次抽牌結束了遊戲
+            self.end_turn()
+
+    def cancel_timers(self):
+        """取消回合與再來一局的計時"""
+        self.turn_serial += 1
+        for timer in (self.turn_timer, self.play_again_timer):
+            if timer is not None:
+                timer.cancel()
+        self.turn_timer = None
+        self.play_again_timer = None
+
     def send_hand(self, player):
-        """發送玩家的手牌"""
+        """發送玩家的完整手牌（差異更新模式下為帶序號的快照）"""
+        with TRACER.span('fanout', kind='hand_snapshot'):
+            self.send_hand_snapshot(player)
+
+    def send_hand_snapshot(self, player):
+        """編碼並送出完整手牌"""
+        try:
+            if player.delta:
+                player.hand_seq += 1
+                player.updates_since_snapshot = 0
+                if player.protocol:
+                    player.send_bytes(encode_hand_snapshot(player.hand_seq, player.hand), HAND_KIND)
+                    return
+                snapshot = {'seq': player.hand_seq, 'hand': list(player.hand)}
+                player.send("手牌快照 " + json.dumps(snapshot, separators=(',', ':')), HAND_KIND)
+                return
+            player.send("你的手牌:\n" + player.hand.to_json(), HAND_KIND)
+        except Exception as e:
+            print(f"發送手牌時出錯: {e}")
+
+    def send_hand_update(self, player, added=(), removed=()):
+        """發送手牌變動：差異更新模式只送增加與移除的牌編號，其餘玩家仍收到完整手牌"""
+        if not player.delta or player.updates_since_snapshot + 1 >= SNAPSHOT_INTERVAL:
+            self.send_hand(player)
+            return
+        with TRACER.span('fanout', kind='hand_delta'):
+            self.send_hand_delta(player, added, removed)
+
+    def send_hand_delta(self, player, added, removed):
+        """編碼並送出一筆帶序號的手牌變動"""
         try:
-            player.conn.sendall("你的手牌:\n".encode())
-            # 將手牌中的鬼牌標記為不可丟棄
-            hand_display = []
-            for card in player.hand:
-                hand_display.append(card)
-            hand_json = json.dumps(hand_display, ensure_ascii=False)
-            player.conn.sendall((hand_json + "\n").encode())
+            player.hand_seq += 1
+            player.updates_since_snapshot += 1
+            if player.protocol:
+                player.send_bytes(encode_hand_delta(player.hand_seq, added, removed), HAND_DELTA_KIND)
+                return
+            update = {'seq': player.hand_seq}
+            if added:
+                update['add'] = list(added)
+            if removed:
+                update['remove'] = list(removed)
+            player.send("手牌變動 " + json.dumps(update, separators=(',', ':')), HAND_DELTA_KIND)
         except Exception as e:
             print(f"發送手牌時出錯: {e}")
 
     def handle_draw(self, player):
         """處理玩家抽牌"""
-        with self.lock:
-            next_player_index = (self.current_player + 1) % len(self.players)
-            next_player = self.players[next_player_index]
-
-            available_cards = [card for card in next_player.hand]  # 現在允許抽到鬼牌
+        with self.lock, TABLE_OP_SECONDS.labels('draw').time():
+            hands = [p.hand for p in self.players]
+            next_player = self.players[next_seat(self.current_player, len(hands))]
 
-            if not available_cards:
-                player.conn.sendall("下一位玩家沒有可抽的牌。\n".encode())
+            if not next_player.hand:
+                player.send("下一位玩家沒有可抽的牌。")
                 return
 
-            # 從下一位玩家的手牌中隨機抽一張（包括鬼牌）
-            drawn_card = random.choice(available_cards)
-            next_player.hand.remove(drawn_card)
-            player.hand.append(drawn_card)
-            self.broadcast(f"{player.name} 從 {next_player.name} 那裡抽了一張牌 {self.card_to_string(drawn_card)}。")
-            self.send_hand(player)
-            self.send_hand(next_player)  # 確保被抽方手牌即時更新
+            # 從下一位玩家的手牌中隨機抽一張（包括鬼牌），自動丟棄時一併丟掉抽到點數的配對
+            with TRACER.span('mutate'):
+                drawn_card, pairs = draw(hands, self.current_player, self.rng, self.auto_discard)
+            if self.journal is not None:
+                self.journal.draw(self.current_player, drawn_card)
+            CARDS_DRAWN.inc()
+            self.broadcast(f"{player.name} 從 {next_player.name} 那裡抽了一張牌 {card_to_string(drawn_card)}。",
+                           lambda: encode_drew(player.name, next_player.name, drawn_card))
+            self.announce_discard(player, pairs)
+            self.send_hand_update(player, added=(drawn_card,), removed=pairs)
+            self.send_hand_update(next_player, removed=(drawn_card,))  # 確保被抽方手牌即時更新
             player.has_drawn = True  # 標記玩家已抽牌
 
-            # 檢查遊戲結束條件（檢查被抽牌方的手牌是否為空）
-            if len(next_player.hand) == 0:
-                self.broadcast(f"{next_player.name} 贏得了遊戲！")
-                self.game_started = False
-                self.waiting_for_play_again = True
-                self.request_play_again()
+            # 檢查遊戲結束條件（先檢查被抽牌方的手牌是否為空）
+            winner = draw_winner(hands, self.current_player)
+            if winner is not None:
+                self.declare_winner(self.players[winner])
 
-    def handle_discard(self, player, cards):
-        """處理玩家配對丟棄"""
-        with self.lock:
+    def handle_discard(self, player, cards, removed=False):
+        """處理玩家配對丟棄，removed 表示這些牌已經從手牌移除"""
+        with self.lock, TABLE_OP_SECONDS.labels('discard').time():
             # 移除丟棄的牌
-            for card in cards:
-                if card in player.hand:
-                    player.hand.remove(card)
+            if not removed:
+                with TRACER.span('mutate'):
+                    player.hand.remove_all(cards)
+            CARDS_DISCARDED.inc(len(cards))
 
             # 通知所有玩家
-            discarded_str = ', '.join([self.card_to_string(card) for card in cards])
-            self.broadcast(f"{player.name} 丟棄了牌: {discarded_str}")
-            self.send_hand(player)
+            self.announce_discard(player, cards)
+            self.send_hand_update(player, removed=cards)
 
             # 檢查遊戲結束條件
-            if len(player.hand) == 0:
-                self.broadcast(f"{player.name} 贏得了遊戲！")
-                self.game_started = False
-                self.waiting_for_play_again = True
-                self.request_play_again()
+            if not player.hand:
+                self.declare_winner(player)
 
-    def broadcast(self, message):
-        """廣播訊息給所有玩家"""
-        for player in self.players:
-            try:
-                player.conn.sendall((message + "\n").encode())
-            except Exception as e:
-                print(f"廣播給 {player.name} 時出錯: {e}")
-
-    def card_to_string(self, card):
-        """將卡片轉換為易讀的字串表示"""
-        SUIT_SYMBOLS = {
-            "Hearts": "♥",
-            "Diamonds": "♦",
-            "Clubs": "♣",
-            "Spades": "♠",
-            "Joker": "🃏"
-        }
-        rank = card['rank']
-        suit = SUIT_SYMBOLS.get(card['suit'], card['suit'])
-        if rank == 0 and card['suit'] == 'Joker':
-            return '鬼牌'
-        elif rank == 1:
-            rank_text = 'A'
-        elif rank == 11:
-            rank_text = 'J'
-        elif rank == 12:
-            rank_text = 'Q'
-        elif rank == 13:
-            rank_text = 'K'
-        else:
-            rank_text = str(rank)
-        return f"{suit} {rank_text}"
+    def announce_discard(self, player, cards):
+        """廣播玩家丟棄的牌"""
+        if cards:
+            if self.journal is not None:
+                self.journal.discard(self.players.index(player), cards)
+            discarded_str = ', '.join([card_to_string(card) for card in cards])
+            self.broadcast(f"{player.name} 丟棄了牌: {discarded_str}", lambda: encode_discarded(player.name, cards))
+
+    def declare_winner(self, player):
+        """宣布贏家並詢問是否再來一局"""
+        if self.journal is not None:
+            self.journal.win(self.players.index(player))
+        self.broadcast(f"{player.name} 贏得了遊戲！", lambda: encode_winner(player.name))
+        self.game_started = False
+        self.waiting_for_play_again = True
+        self.cancel_timers()
+        self.request_play_again()
+
+    def abort_game(self, player):
+        """遊戲進行中有人離開，剩下的人數不足以繼續：這一局沒有贏家就結束，詢問是否再來一局"""
+        if self.journal is not None:
+            self.journal.abort()
+        print(f"牌桌 {self.table_id} 玩家 {player.name} 離開後人數不足，遊戲結束。")
+        self.broadcast(f"{player.name} 離開後人數不足 {MIN_PLAYERS} 人，遊戲結束。")
+        self.game_started = False
+        self.waiting_for_play_again = True
+        self.cancel_timers()
+        self.request_play_again()
+
+    def broadcast(self, message, frame=None):
+        """廣播訊息給牌桌上所有玩家與觀戰者：每種協定只編碼一次，同協定的送出佇列共用同一份位元組
+
+        frame 是產生這則訊息二進位事件的函式（或已經組好的框架），只在有二進位協定的收件者時才呼叫；
+        牌桌的副數超過二進位協定的牌編號範圍時沒有人會協商到二進位，框架也就不會被組出來。
+        沒有專屬操作碼的訊息在有二進位協定的收件者時才包成 TEXT 框架。
+        """
+        encoded = [(message + "\n").encode(), None]  # [文字協定, 二進位協定]
+        recipients = len(self.players) + len(self.spectators)
+        sent_bytes = 0
+        BROADCASTS.inc()
+        BROADCAST_RECIPIENTS.inc(recipients)
+        with TRACER.span('fanout', kind='broadcast', recipients=recipients):
+            for player in self.players + list(self.spectators):
+                try:
+                    binary = 1 if player.protocol else 0
+                    data = encoded[binary]
+                    if data is None:
+                        if frame is None:
+                            data = encode_text(message)
+                        else:
+                            data = frame() if callable(frame) else frame
+                        encoded[binary] = data
+                    player.send_bytes(data)
+                    sent_bytes += len(data)
+                except Exception as e:
+                    print(f"廣播給 {player.name} 時出錯: {e}")
+        BROADCAST_BYTES.inc(sent_bytes)
 
     def request_play_again(self):
-        """向所有玩家請求是否再玩一局"""
-        self.broadcast("遊戲結束，是否再來一局？請回應 'playagain yes' 或 'playagain no'。")
+        """向牌桌上所有玩家請求是否再玩一局，期限內沒有回應的玩家視為拒絕"""
+        self.broadcast("遊戲結束，是否再來一局？請回應 'playagain yes' 或 'playagain no'。", PLAY_AGAIN_FRAME)
+        for player in self.players:
+            if player.policy is not None:
+                self.bots.request(self, player, 'play_again')
+        if self.timers is not None and self.play_again_timeout:
+            self.play_again_timer = self.timers.schedule(self.play_again_timeout, self.play_again_timed_out)
+
+    def play_again_timed_out(self):
+        with write_batch(), self.lock:
+            self.play_again_timer = None
+            if not self.waiting_for_play_again:
+                return
+            TIMEOUTS.labels('play_again').inc()
+            for player in self.players:
+                if player.play_again is None:
+                    self.set_play_again(player, False)
+                    self.broadcast(f"{player.name} 沒有在 {self.play_again_timeout:g} 秒內回應，視為不再來一局。")
+            self.check_play_again()
 
     def check_play_again(self):
-        """檢查所有玩家是否都同意再玩一局"""
+        """檢查牌桌上所有玩家是否都同意再玩一局"""
         with self.lock:
             if any(player.play_again is False for player in self.players):
-                self.broadcast("有人拒絕再來一局，遊戲結束。")
+                if self.journal is not None:
+                    self.journal.again(False)
+                self.cancel_timers()
+                self.broadcast("有人拒絕再來一局，遊戲結束。", PLAY_AGAIN_DECLINED_FRAME)
                 self.game_started = False
                 self.waiting_for_play_again = False
                 # 重置玩家的準備狀態
                 for player in self.players:
                     player.ready = False
             elif all(player.play_again for player in self.players):
-                self.broadcast("所有玩家同意再來一局，請準備開始。")
+                if self.journal is not None:
+                    self.journal.again(True)
+                self.cancel_timers()
+                self.broadcast("所有玩家同意再來一局，請準備開始。", PLAY_AGAIN_ACCEPTED_FRAME)
                 self.reset_game()
-                # 等待玩家再次點擊 "start" 按鈕
+                if self.auto_start:
+                    self.start_ready_game()
+                # 否則等待玩家再次點擊 "start" 按鈕
             # Else, still waiting for some players to respond
 
+    def start_ready_game(self):
+        """不等玩家按準備開始，直接發牌（配對佇列開出的牌桌）"""
+        with self.lock:
+            for player in self.players:
+                player.ready = True
+            if self.check_all_ready():
+                self.start_game()
+
     def reset_game(self):
-        """重置遊戲狀態，準備重新開始"""
+        """重置牌桌狀態，準備重新開始"""
         self.deck = []
         for player in self.players:
-            player.hand = []
+            player.hand = Hand()
             player.ready = False  # 重置準備狀態
             player.has_drawn = False
             player.play_again = None
@@ -397,6 +918,936 @@ class GameServer:
         self.game_started = False
         self.waiting_for_play_again = False
 
-if __name__ == "__main__":
-    server = GameServer(HOST, PORT)
+    # 指令的第一個字 -> (處理函式, 適用階段)
+    # any：任何時候；setup：不在詢問再來一局時；turn：遊戲進行中且輪到自己；play_again：詢問再來一局時
+    dispatch = {
+        'resync': (command_resync, 'any'),
+        'start': (command_start, 'setup'),
+        'set': (command_set, 'setup'),
+        'draw': (command_draw, 'turn'),
+        'discard': (command_discard, 'turn'),
+        'end': (command_end, 'turn'),
+        'playagain': (command_play_again, 'play_again'),
+    }
+
+class Lobby:
+    """配對佇列：把沒有指定牌桌的玩家依到達順序湊成 table_size 人一桌並自動開始，
+    最久的玩家等超過 fill_timeout 秒時，只要有 min_players 人就先開桌（有機器人補位時一個人也能開桌）
+    """
+
+    def __init__(self, server, table_size=MAX_PLAYERS, fill_timeout=LOBBY_FILL_TIMEOUT, min_players=MIN_PLAYERS):
+        self.server = server
+        self.table_size = table_size
+        self.fill_timeout = fill_timeout
+        self.min_players = min_players
+        self.waiting = {}  # 玩家 -> 加入時間（dict 保持到達順序並 O(1) 移除）
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def join(self, player):
+        """玩家進入佇列，人數夠了就立即開桌"""
+        with self.lock:
+            self.waiting[player] = time.monotonic()
+            LOBBY_WAITING.set(len(self.waiting))
+            player.welcome(f"歡迎 {player.name}！已加入配對佇列，目前 {len(self.waiting)} 人等待。")
+            tables = self.seat_groups(time.monotonic(), full_only=True)
+            self.schedule()
+        for table in tables:
+            table.start_ready_game()
+
+    def remove(self, player):
+        """玩家在配對前離開，回傳 False 表示玩家不在佇列中（可能已經入座）"""
+        with self.lock:
+            if self.waiting.pop(player, None) is None:
+                return False
+            LOBBY_WAITING.set(len(self.waiting))
+            return True
+
+    def seat_groups(self, now, full_only=False):
+        """在佇列鎖內把可以成桌的玩家安排入座，回傳要開始的牌桌
+
+        入座與移出佇列在同一次持有鎖時完成，離線的玩家不是還在佇列就是已經有牌桌。
+        """
+        tables = []
+        while len(self.waiting) >= self.table_size:
+            tables.append(self.seat(list(islice(self.waiting, self.table_size)), now, 'full'))
+        if not full_only and len(self.waiting) >= self.min_players:
+            oldest = next(iter(self.waiting.values()))
+            if now - oldest >= self.fill_timeout:
+                tables.append(self.seat(list(self.waiting), now, 'timeout'))
+        LOBBY_WAITING.set(len(self.waiting))
+        return tables
+
+    def seat(self, group, now, reason):
+        for player in group:
+            LOBBY_WAIT_SECONDS.observe(now - self.waiting.pop(player))
+        LOBBY_TABLES.labels(reason).inc()
+        LOBBY_SEATS.inc(len(group))
+        return self.server.open_table(group)
+
+    def schedule(self):
+        """在最久的玩家等滿 fill_timeout 時檢查一次；人數不足 min_players 時等下一位玩家加入再排"""
+        if self.timer is not None or not self.waiting:
+            return
+        delay = next(iter(self.waiting.values())) + self.fill_timeout - time.monotonic()
+        if delay <= 0 and len(self.waiting) < self.min_players:
+            return
+        self.timer = self.server.call_later(max(0, delay), self.expire)
+
+    def expire(self):
+        with write_batch():
+            with self.lock:
+                self.timer = None
+                tables = self.seat_groups(time.monotonic())
+                self.schedule()
+            for table in tables:
+                table.start_ready_game()
+
+class LoginHandshaker:
+    """以單一 selector 執行緒同時處理所有等待送出名字的連線，每條連線都有期限"""
+
+    def __init__(self, server, timeout=LOGIN_TIMEOUT, limit=LOGIN_QUEUE_LIMIT):
+        self.server = server
+        self.timeout = timeout
+        self.limit = limit
+        self.selector = selectors.DefaultSelector()
+        self.pending = {}  # socket -> [addr, 已收到的資料, 期限]
+        self.deadlines = deque()  # (期限, socket)，期限固定所以依加入順序排列
+        self.incoming = deque()  # 由接受連線的執行緒交過來的新連線
+        self.lock = threading.Lock()
+        self.count = 0  # 尚未完成名字交握的連線數
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ)
+
+    def start(self):
+        """啟動交握執行緒"""
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, conn, addr):
+        """交付一條新連線，等待的連線已達上限時立即拒絕"""
+        with self.lock:
+            if self.count >= self.limit:
+                busy = True
+            else:
+                busy = False
+                self.count += 1
+                self.incoming.append((conn, addr))
+        if busy:
+            ERRORS.labels('login_busy').inc()
+            self.reject(conn, LOGIN_BUSY)
+            return False
+        try:
+            self.wakeup_w.send(b'\0')
+        except BlockingIOError:
+            pass  # 喚醒訊號已經滿了，交握執行緒一定會醒來
+        return True
+
+    def reject(self, conn, message):
+        """送出拒絕訊息並關閉連線（不等待對方接收）"""
+        try:
+            conn.send(message)
+        except OSError:
+            pass
+        conn.close()
+
+    def finish(self, conn):
+        """將連線移出等待清單"""
+        del self.pending[conn]
+        self.selector.unregister(conn)
+        with self.lock:
+            self.count -= 1
+
+    def run(self):
+        """交握執行緒主迴圈"""
+        while True:
+            timeout = None
+            if self.deadlines:
+                timeout = max(0, self.deadlines[0][0] - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                if key.fileobj is self.wakeup_r:
+                    self.accept_incoming()
+                else:
+                    self.read_name(key.fileobj)
+            self.expire()
+
+    def accept_incoming(self):
+        """登記接受連線執行緒交過來的連線"""
+        try:
+            while self.wakeup_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            with self.lock:
+                if not self.incoming:
+                    return
+                conn, addr = self.incoming.popleft()
+            deadline = time.monotonic() + self.timeout
+            self.pending[conn] = [addr, b'', deadline]
+            self.deadlines.append((deadline, conn))
+            self.selector.register(conn, selectors.EVENT_READ)
+
+    def read_name(self, conn):
+        """讀取名字列，收到換行後交給伺服器完成登入"""
+        entry = self.pending[conn]
+        try:
+            data = conn.recv(LOGIN_MAX_BYTES)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.finish(conn)
+            conn.close()
+            return
+        entry[1] += data
+        if b'\n' not in entry[1]:
+            if len(entry[1]) > LOGIN_MAX_BYTES:
+                self.finish(conn)
+                self.reject(conn, "名字太長，斷開連線。\n".encode())
+            return
+        self.finish(conn)
+        line, rest = entry[1].split(b'\n', 1)
+        conn.setblocking(True)
+        try:
+            self.server.complete_login(conn, entry[0], line, rest)
+        except Exception as e:
+            print(f"玩家 {entry[0]} 登入時出錯: {e}")
+            conn.close()
+
+    def expire(self):
+        """關閉超過期限仍未送出名字的連線"""
+        now = time.monotonic()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, conn = self.deadlines.popleft()
+            entry = self.pending.get(conn)
+            if entry is None or entry[2] != deadline:
+                continue  # 已完成交握
+            print(f"玩家 {entry[0]} 未在期限內送出名字，斷開連線。")
+            ERRORS.labels('login_timeout').inc()
+            self.finish(conn)
+            self.reject(conn, LOGIN_TIMEOUT_MESSAGE)
+
+class GameServer:
+    def __init__(self, host, port):
+        self.tables = {}  # 桌號 -> Table
+        self.next_table_id = 1
+        self.table_prefix = ''  # 自動建立的桌號前綴，多台伺服器放在閘道後面時用來避免桌號重複
+        self.lobby = None  # 配對佇列，None 表示沒有指定牌桌的玩家直接坐進可加入的牌桌
+        self.host = host
+        self.port = port
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.lock = threading.Lock()  # 保護牌桌列表的鎖
+        self.login_timeout = LOGIN_TIMEOUT
+        self.login_queue_limit = LOGIN_QUEUE_LIMIT
+        self.outbox_stats = OutboxStats()
+        self.outbox_limit = OUTBOX_LIMIT  # 每條連線待送資料的上限
+        self.slow_consumer_policy = SLOW_CONSUMER_POLICY  # 待送資料超過上限時的處理方式
+        self.decks = DECKS  # 新牌桌使用幾副牌
+        self.auto_discard = AUTO_DISCARD  # 新牌桌是否自動丟棄配對
+        self.handshaker = None
+        self.metrics_port = None  # 指標服務的連接埠，None 表示不開啟
+        self.reuse_port = False  # 多個行程共用同一個監聽連接埠（SO_REUSEPORT），見 socketgamesupervisor
+        self.timers = TimerWheel()  # 所有回合、再來一局、閒置與配對的計時共用一個計時輪，見 socketgametimer
+        self.turn_timeout = TURN_TIMEOUT
+        self.play_again_timeout = PLAY_AGAIN_TIMEOUT
+        self.idle_timeout = IDLE_TIMEOUT
+        self.reconnect_grace = RECONNECT_GRACE  # 斷線後保留座位的秒數，0 表示斷線就離開牌桌
+        self.sessions = {}  # 重新連線代碼 -> 入座的玩家（由 self.lock 保護）
+        self.nodelay = True  # 關閉 Nagle（TCP_NODELAY），小訊息不必等前一個封包被確認
+        self.write_batching = True  # 同一批事件的輸出每條連線只寫一次，見 socketgameio.write_batch
+        self.journal_path = None  # 遊戲事件日誌檔，None 表示不記錄，見 socketgamejournal
+        self.journal_fsync = JOURNAL_FSYNC
+        self.journal = None
+        self.bots = None  # 伺服器端機器人的排程（socketgameai.BotRunner），見 start_bots
+        self.bot_fill = False  # 真人不足時以機器人補滿空位
+        self.bot_tables = 0  # 啟動時開出的全機器人牌桌數（壓力測試用）
+        self.bot_policy = BOT_POLICY
+        self.bot_executor = BOT_EXECUTOR
+        self.bot_workers = BOT_WORKERS
+        self.bot_delay = BOT_DELAY
+
+    def start_metrics(self):
+        """登記由伺服器狀態計算的指標，並視需要啟動指標服務"""
+        REGISTRY.gauge('oldmaid_tables', "牌桌數", function=lambda: len(self.tables))
+        REGISTRY.gauge('oldmaid_active_tables', "遊戲進行中的牌桌數",
+                       function=lambda: sum(1 for t in list(self.tables.values()) if t.game_started))
+        REGISTRY.gauge('oldmaid_outbox_queued_bytes', "所有送出佇列中待送的位元組",
+                       function=lambda: self.outbox_stats.queued_bytes)
+        REGISTRY.gauge('oldmaid_outbox_peak_bytes', "單一送出佇列曾經達到的最大位元組",
+                       function=lambda: self.outbox_stats.peak_bytes)
+        REGISTRY.counter('oldmaid_outbox_dropped_total', "因接收太慢而丟掉的訊息數",
+                         function=lambda: self.outbox_stats.dropped)
+        REGISTRY.counter('oldmaid_outbox_coalesced_total', "被較新的手牌取代的手牌訊息數",
+                         function=lambda: self.outbox_stats.coalesced)
+        REGISTRY.counter('oldmaid_outbox_disconnects_total', "因接收太慢而斷線的連線數",
+                         function=lambda: self.outbox_stats.disconnects)
+        REGISTRY.counter('oldmaid_outbox_writes_total', "寫入 socket 的次數（sendmsg 呼叫或 transport 寫入）",
+                         function=lambda: self.outbox_stats.writes)
+        REGISTRY.gauge('oldmaid_timers', "計時輪上等待中的計時器數", function=lambda: len(self.timers))
+        REGISTRY.gauge('oldmaid_held_seats', "斷線後保留中、等待重新連線的座位數",
+                       function=lambda: sum(1 for p in list(self.sessions.values()) if p.disconnected))
+        REGISTRY.gauge('oldmaid_bot_seats', "伺服器端機器人佔用的座位數",
+                       function=lambda: sum(1 for t in list(self.tables.values())
+                                            for p in list(t.players) if p.policy is not None))
+        if self.journal is not None:
+            REGISTRY.counter('oldmaid_journal_records_total', "寫入遊戲日誌的紀錄數",
+                             function=lambda: self.journal.records)
+            REGISTRY.counter('oldmaid_journal_writes_total', "遊戲日誌的批次寫入次數",
+                             function=lambda: self.journal.writes)
+            REGISTRY.counter('oldmaid_journal_fsyncs_total', "遊戲日誌的 fsync 次數",
+                             function=lambda: self.journal.syncs)
+        if self.metrics_port is None:
+            return None
+        httpd = start_metrics_server(METRICS_HOST, self.metrics_port)
+        install_admin_routes(httpd.RequestHandlerClass.routes)  # 追蹤與剖析，見 socketgametrace
+        return httpd
+
+    def open_journal(self):
+        """開啟遊戲事件日誌（在啟動任何牌桌之前；多行程模式下在 fork 之後，寫入執行緒才屬於工作行程）"""
+        if self.journal_path is None:
+            return
+        self.journal = Journal(self.journal_path, self.journal_fsync).start()
+        print(f"遊戲事件寫入 {self.journal_path}（fsync: {self.journal_fsync}）")
+
+    def start_bots(self):
+        """建立伺服器端機器人的排程並開出全機器人牌桌（多行程模式下在 fork 之後，行程池才屬於工作行程）"""
+        if not self.bot_fill and not self.bot_tables:
+            return
+        self.bots = BotRunner(self.timers, self.bot_policy, self.bot_executor, self.bot_workers, self.bot_delay)
+        print(f"伺服器端機器人：{self.bot_policy} 策略，決策在 {self.bot_executor} 執行（{self.bot_workers} 個工作者）")
+        for _ in range(self.bot_tables):
+            with self.lock:
+                table = self.new_table()
+                table.auto_start = True
+                table.fill_bots(MAX_PLAYERS)
+            table.start_ready_game()
+        if self.bot_tables:
+            print(f"開出 {self.bot_tables} 張全機器人牌桌，可以用 watch= 觀戰。")
+
+    def tune_socket(self, sock):
+        """設定玩家連線的 socket 選項
+
+        asyncio 只會對 proto 為 IPPROTO_TCP 的 socket 自動設定 TCP_NODELAY，而 socket.socket() 建立的監聽 socket
+        proto 是 0，所以兩個引擎都要自己設定；否則回合中的多個小訊息會被 Nagle 與延遲確認卡住約 40ms。
+        """
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def listen(self):
+        """綁定並開始監聽"""
+        if self.reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(LISTEN_BACKLOG)
+
+    def start_server(self):
+        """啟動伺服器"""
+        self.open_journal()
+        self.start_bots()
+        self.start_metrics()
+        self.listen()
+        print(f"伺服器啟動，監聽 {self.host}:{self.port}（thread 引擎）")
+
+        self.handshaker = LoginHandshaker(self, self.login_timeout, self.login_queue_limit)
+        self.handshaker.start()
+        self.timers.start_thread()
+        accept_thread = threading.Thread(target=self.accept_connections, daemon=True)
+        accept_thread.start()
+
+        try:
+            # 主執行緒只等待接受連線的執行緒結束，不再空轉
+            while accept_thread.is_alive():
+                accept_thread.join(1)
+        except KeyboardInterrupt:
+            print("伺服器正在關閉...")
+            self.server_socket.close()
+
+    def seat_player(self, player, table_id=None):
+        """替玩家安排牌桌：指定桌號就加入該桌（不存在則建立），否則坐進第一張可加入的牌桌"""
+        with self.lock:
+            if table_id is not None:
+                table = self.tables.get(table_id)
+                if table is None:
+                    table = self.make_table(table_id)
+                    self.tables[table_id] = table
+                elif not table.is_joinable():
+                    return None
+            else:
+                table = next((t for t in self.tables.values() if t.is_joinable()), None)
+                if table is None:
+                    table = self.new_table()
+            with table.lock:
+                # 歡迎訊息與重新連線代碼在牌桌鎖內送出，牌桌的其他事件一定排在它們後面（與 resume_session 相同）
+                table.add_player(player)
+                player.welcome(f"歡迎 {player.name} 加入遊戲！（牌桌 {table.table_id}）")
+                self.issue_session(player)
+        return table
+
+    def new_table(self):
+        """以下一個自動桌號建立牌桌（呼叫者需持有 self.lock）"""
+        while self.auto_table_id() in self.tables or not self.owns_table(self.auto_table_id()):
+            self.next_table_id += 1
+        table = self.make_table(self.auto_table_id())
+        self.tables[table.table_id] = table
+        self.next_table_id += 1
+        return table
+
+    def make_table(self, table_id):
+        """依伺服器設定建立牌桌"""
+        table = Table(table_id, self.decks, self.auto_discard)
+        table.timers = self.timers
+        table.turn_timeout = self.turn_timeout
+        table.play_again_timeout = self.play_again_timeout
+        table.bots = self.bots
+        table.bot_fill = self.bot_fill
+        if self.journal is not None:
+            table.journal = self.journal.table(table_id, self.decks)
+        return table
+
+    def open_table(self, players):
+        """為配對佇列湊成的玩家開一張自動開始的新牌桌"""
+        with self.lock:
+            table = self.new_table()
+            table.auto_start = True
+            with table.lock:
+                for player in players:
+                    table.add_player(player)
+                    player.send(f"配對成功，加入牌桌 {table.table_id}。")
+                    self.issue_session(player)
+                if self.bot_fill:
+                    table.fill_bots(self.lobby.table_size)  # 配對逾時湊不滿一桌，空位由機器人補上
+        print(f"配對佇列開出牌桌 {table.table_id}，玩家: {', '.join(p.name for p in players)}")
+        return table
+
+    def call_later(self, delay, callback):
+        """delay 秒後呼叫 callback，回傳可以 cancel() 的物件"""
+        return self.timers.schedule(delay, callback)
+
+    def watch_idle(self, player, delay=None):
+        """開始（或繼續）檢查玩家是否閒置"""
+        if self.idle_timeout:
+            player.idle_timer = self.timers.schedule(
+                self.idle_timeout if delay is None else delay, self.check_idle, player)
+
+    def check_idle(self, player):
+        """閒置計時到期：期間送過指令就依最後一次活動重新計時，否則斷開連線
+        （送指令時只更新時間，不必每條指令都取消再重排計時器）
+        """
+        if player.outbox.closed:
+            return  # 已經離線（計時器與離開牌桌同時發生）
+        idle = time.monotonic() - player.last_active
+        if idle < self.idle_timeout:
+            self.watch_idle(player, self.idle_timeout - idle)
+            return
+        player.idle_timer = None
+        print(f"玩家 {player.name} 閒置超過 {self.idle_timeout:g} 秒，斷開連線。")
+        TIMEOUTS.labels('idle').inc()
+        with self.lock:
+            self.revoke_session(player)  # 閒置斷線直接離開牌桌，不保留座位
+        player.send("閒置太久，斷開連線。")
+        player.close()
+
+    def auto_table_id(self):
+        """自動安排的下一張牌桌的桌號"""
+        return f"{self.table_prefix}{self.next_table_id}"
+
+    def owns_table(self, table_id):
+        """這張牌桌是否由本行程負責（多行程模式下由 socketgamesupervisor 覆寫）"""
+        return True
+
+    def hand_off_login(self, fd, addr, line, rest):
+        """登入的牌桌由其他行程負責時，把連線交給該行程並回傳 True（單一行程時不需要）"""
+        return False
+
+    def watch_table(self, player, table_id):
+        """讓玩家以觀戰者身分加入既有的牌桌，不佔座位也不受 MAX_PLAYERS 限制"""
+        with self.lock:
+            table = self.tables.get(table_id)
+            if table is None:
+                return None
+            with table.lock:
+                if not table.add_spectator(player):
+                    return None
+                player.welcome(f"歡迎 {player.name} 觀戰！（{table.describe()}）")
+        return table
+
+    def leave_table(self, player):
+        """玩家的連線結束：有重新連線代碼的玩家先保留座位，否則離開牌桌"""
+        if player.idle_timer is not None:
+            player.idle_timer.cancel()
+            player.idle_timer = None
+        if player.table is None and self.lobby is not None and self.lobby.remove(player):
+            CONNECTIONS.dec()
+            return
+        with self.lock:
+            # 座位已被重新連線的新連線接手時 player.table 是 None
+            table = player.table
+            held = table is not None and self.hold_seat(player)
+        if table is None:
+            return
+        CONNECTIONS.dec()
+        if held:
+            RECONNECTS.labels('held').inc()
+            print(f"玩家 {player.name} 斷線，牌桌 {table.table_id} 保留座位 {self.reconnect_grace:g} 秒。")
+            table.broadcast(f"玩家 {player.name} 連線中斷，保留座位 {self.reconnect_grace:g} 秒等待重新連線。")
+            return
+        self.drop_player(player, table)
+
+    def drop_player(self, player, table):
+        """把玩家移出牌桌，空桌會被移除"""
+        table.remove_player(player)
+        if not player.spectator and all(p.policy is not None for p in table.players):
+            table.remove_bots()  # 只剩機器人的牌桌不再繼續
+        with self.lock:
+            self.revoke_session(player)
+            if not table.players and not table.spectators and self.tables.get(table.table_id) is table:
+                del self.tables[table.table_id]
+                if table.journal is not None:
+                    table.journal.close()
+        if not player.spectator:
+            table.broadcast(f"玩家 {player.name} 已離開遊戲。")
+
+    def issue_session(self, player):
+        """發給剛入座的玩家重新連線代碼（不保留座位時不發，呼叫者需持有 self.lock 與牌桌鎖）"""
+        if not self.reconnect_grace:
+            return
+        self.register_session(player)
+        self.send_session(player)
+
+    def register_session(self, player):
+        """產生並登記新的重新連線代碼（呼叫者需持有 self.lock）"""
+        player.session = secrets.token_urlsafe(SESSION_TOKEN_BYTES)
+        self.sessions[player.session] = player
+
+    def revoke_session(self, player):
+        """讓玩家的重新連線代碼失效（呼叫者需持有 self.lock）"""
+        if self.sessions.get(player.session) is player:
+            del self.sessions[player.session]
+
+    def send_session(self, player):
+        """告訴玩家重新連線時要帶的桌號與代碼"""
+        table_id = player.table.table_id
+        message = "重新連線代碼 " + json.dumps({'table': table_id, 'token': player.session}, separators=(',', ':'))
+        player.send_event(message, encode_session(table_id, player.session))
+
+    def hold_seat(self, player):
+        """斷線的玩家保留座位 reconnect_grace 秒，回傳 False 表示不保留（呼叫者需持有 self.lock）
+
+        座位仍在牌桌上，輪到他時由回合計時代為抽牌與結束回合，送給他的訊息直接丟掉（送出佇列已關閉）。
+        """
+        if not self.reconnect_grace or player.session is None or self.sessions.get(player.session) is not player:
+            return False
+        player.disconnected = True
+        player.grace_timer = self.timers.schedule(self.reconnect_grace, self.seat_expired, player)
+        return True
+
+    def seat_expired(self, player):
+        """保留的座位到期仍沒有重新連線，玩家離開牌桌"""
+        with write_batch(self.write_batching):
+            with self.lock:
+                if self.sessions.get(player.session) is not player:
+                    return  # 已經重新連線
+                del self.sessions[player.session]
+                table = player.table
+            RECONNECTS.labels('expired').inc()
+            print(f"玩家 {player.name} 沒有在 {self.reconnect_grace:g} 秒內重新連線，離開牌桌 {table.table_id}。")
+            self.drop_player(player, table)
+
+    def resume_session(self, player, token):
+        """以重新連線代碼回到保留中的座位，舊的連線還沒斷（對方先發現斷線）時直接取代它"""
+        with self.lock:
+            old = self.sessions.pop(token, None)
+            if old is not None:
+                table = old.table
+                with table.lock:
+                    # 歡迎訊息與牌桌狀態都在牌桌鎖內送出，牌桌的其他事件一定排在它們後面
+                    table.replace_player(old, player)
+                    player.welcome(f"歡迎回來 {player.name}！（牌桌 {table.table_id}）")
+                    self.register_session(player)  # 每次重新連線都換一個新的代碼
+                    self.send_session(player)
+                    table.send_state(player)
+                    table.broadcast(f"玩家 {player.name} 已重新連線。")
+        if old is None:
+            RECONNECTS.labels('invalid').inc()
+            player.send_line("重新連線代碼無效或座位已不再保留，斷開連線。")
+            return None
+        if old.grace_timer is not None:
+            old.grace_timer.cancel()
+            old.grace_timer = None
+        if old.disconnected:
+            RECONNECTS.labels('resumed').inc()
+            CONNECTIONS.inc()
+        else:
+            RECONNECTS.labels('takeover').inc()
+            if old.idle_timer is not None:
+                old.idle_timer.cancel()
+                old.idle_timer = None
+            old.outbox.abort()  # 舊連線的 leave_table 看到 table 是 None，不會再離開牌桌
+        print(f"玩家 {player.name} 已重新連線牌桌 {table.table_id}。")
+        self.watch_idle(player)
+        return table
+
+    def login(self, player, line):
+        """處理玩家送出的名字列並安排牌桌（或放進配對佇列），失敗時通知玩家並回傳 None"""
+        name, options = parse_login(line.strip())
+        if not name:
+            player.send_line("名字不能為空，斷開連線。")
+            return None
+        table_id = options.get('watch', options.get('table'))
+        if table_id is not None and len(table_id.encode()) > MAX_TABLE_ID_BYTES:
+            player.send_line("桌號太長，斷開連線。")
+            return None
+        player.name = name
+        player.delta = options.get('delta') == '1'
+        if 'proto' in options:
+            player.protocol = negotiate(options['proto'], self.decks * DECK_SIZE - 1)
+        if player.protocol:
+            # 二進位協定的手牌一律是帶序號的快照與差異；名字列之後已收到的資料也改用框架切分
+            player.delta = True
+            player.framer = FrameDecoder(player.framer)
+        if 'resume' in options:
+            # 重新連線：table= 只用來讓閘道與多行程模式找到牌桌所在的伺服器，座位由代碼決定
+            player.delta = True  # 牌桌狀態是帶序號的快照，之後以差異更新
+            return self.resume_session(player, options['resume'])
+        if 'watch' in options:
+            table = self.watch_table(player, options['watch'])
+            if table is None:
+                player.send_line("找不到這張牌桌或觀戰人數已滿。")
+                return None
+            print(f"觀戰者 {name} 已加入牌桌 {table.table_id}。")
+            CONNECTIONS.inc()
+            return table
+        if self.lobby is not None and 'table' not in options:
+            print(f"玩家 {name} 已加入配對佇列。")
+            CONNECTIONS.inc()
+            self.watch_idle(player)
+            self.lobby.join(player)
+            return self.lobby
+        table = self.seat_player(player, options.get('table'))
+        if table is None:
+            player.send_line("遊戲已滿員，無法加入。")
+            return None
+        print(f"玩家 {name} 已加入牌桌 {table.table_id}。")
+        CONNECTIONS.inc()
+        self.watch_idle(player)
+        return table
+
+    def accept_connections(self):
+        """接受玩家連線，名字交握交給 LoginHandshaker，不會被慢速連線卡住"""
+        while True:
+            try:
+                conn, addr = self.server_socket.accept()
+            except Exception as e:
+                print(f"接受連線時出錯: {e}")
+                break
+            print(f"玩家連線: {addr}")
+            CONNECTIONS_TOTAL.inc()
+            conn.setblocking(False)
+            self.tune_socket(conn)
+            try:
+                conn.send(LOGIN_PROMPT)
+            except OSError:
+                conn.close()
+                continue
+            self.handshaker.submit(conn, addr)
+
+    def complete_login(self, conn, addr, line, rest=b''):
+        """名字交握完成後建立玩家並啟動處理執行緒"""
+        if self.hand_off_login(conn.fileno(), addr, line, rest):
+            conn.close()
+            return
+        outbox = ThreadOutbox(conn, self.outbox_stats, self.outbox_limit, self.slow_consumer_policy)
+        player = Player(conn, addr, None, outbox)
+        with write_batch(self.write_batching):
+            table = self.login(player, line.decode())
+        if table is None:
+            player.close()
+            return
+        # 啟動一個執行緒處理玩家訊息
+        threading.Thread(target=self.handle_player, args=(player, rest), daemon=True).start()
+
+    def process_data(self, player, data):
+        """放入一段已經收到的資料並處理其中的指令（交握時跟著名字一起收到的資料）"""
+        player.framer.feed(data)
+        return self.process_commands(player)
+
+    def process_commands(self, player):
+        """依序處理接收緩衝區中所有完整的指令，回傳 False 表示應結束此玩家的連線"""
+        try:
+            with TRACER.span('parse', bytes=player.framer.pending()):
+                commands = player.framer.commands()
+        except FrameTooLong:
+            ERRORS.labels('frame_too_long').inc()
+            player.send("指令太長，斷開連線。")
+            return False
+        if commands:
+            player.last_active = time.monotonic()
+        # 這一批指令產生的輸出在最後才寫出，每條連線只寫一次
+        with write_batch(self.write_batching):
+            for command in commands:
+                # 二進位協定的切分器已經查表轉成 (指令, 參數)
+                verb, args = command if player.protocol else split_command(command)
+                print(f"收到來自 {player.name} 的指令: {verb} {args}".rstrip())
+                if player.table is None:
+                    player.send("正在等待配對，請稍候。")
+                    continue
+                label = verb if verb in COMMAND_VERBS else 'other'  # 未知的指令都算 other，避免標籤無限增加
+                COMMANDS.labels(label).inc()
+                with COMMAND_SECONDS.labels(label).time(), PROFILER.profiled(), \
+                        TRACER.span(label, player=player.name, table=player.table.table_id):
+                    keep = player.table.handle_command(player, verb, args)
+                if not keep:
+                    return False
+        return True
+
+    def handle_player(self, player, initial=b''):
+        """處理單個玩家的訊息，initial 為交握時跟著名字一起收到的資料"""
+        try:
+            if not self.process_data(player, initial):
+                return
+            while True:
+                # 直接收進玩家預先配置的緩衝區
+                if not player.framer.recv_into(player.conn):
+                    print(f"玩家 {player.name} 已斷開連線。")
+                    break
+                if not self.process_commands(player):
+                    break
+        except Exception as e:
+            print(f"處理玩家 {player.name} 時發生錯誤: {e}")
+            ERRORS.labels('handler_exception').inc()
+        finally:
+            player.close()
+            self.leave_table(player)
+            print(f"玩家 {player.name} 已離開遊戲。")
+
+class PlayerProtocol(asyncio.BufferedProtocol):
+    """asyncio 引擎中單一連線的協定物件，取代 thread 引擎的 handle_player 執行緒
+
+    使用 BufferedProtocol，事件迴圈直接把資料讀進玩家的接收緩衝區（見 LineFramer），名字列也從同一個緩衝區取出。
+    """
+
+    def __init__(self, server, handed_off=None):
+        self.server = server
+        self.player = None
+        self.logged_in = False
+        self.login_timer = None
+        self.handed_off = handed_off  # 由其他行程轉交過來的連線已經收到的名字列與後續資料
+
+    def connection_made(self, transport):
+        addr = transport.get_extra_info('peername')
+        self.server.tune_socket(transport.get_extra_info('socket'))
+        outbox = AsyncOutbox(transport, self.server.outbox_stats, self.server.outbox_limit,
+                             self.server.slow_consumer_policy)
+        self.player = Player(transport, addr, None, outbox)
+        if self.handed_off is not None:
+            # 名字交握已在其他行程完成，直接處理收到的名字列
+            self.player.framer.feed(self.handed_off)
+            with write_batch(self.server.write_batching):
+                self.data_ready()
+            return
+        print(f"玩家連線: {addr}")
+        CONNECTIONS_TOTAL.inc()
+        if self.server.pending_logins >= self.server.login_queue_limit:
+            ERRORS.labels('login_busy').inc()
+            transport.write(LOGIN_BUSY)
+            transport.close()
+            return
+        self.server.pending_logins += 1
+        self.login_timer = self.server.timers.schedule(self.server.login_timeout, self.login_timed_out)
+        transport.write(LOGIN_PROMPT)
+
+    def login_timed_out(self):
+        """未在期限內送出名字"""
+        print(f"玩家 {self.player.addr} 未在期限內送出名字，斷開連線。")
+        ERRORS.labels('login_timeout').inc()
+        self.finish_handshake()
+        self.player.send_bytes(LOGIN_TIMEOUT_MESSAGE)
+        self.player.close()
+
+    def finish_handshake(self):
+        """結束名字交握，釋放等待名額"""
+        if self.login_timer is not None:
+            self.login_timer.cancel()
+            self.login_timer = None
+            self.server.pending_logins -= 1
+
+    def pause_writing(self):
+        self.player.outbox.pause_writing()
+
+    def resume_writing(self):
+        self.player.outbox.resume_writing()
+
+    def get_buffer(self, sizehint):
+        return self.player.framer.free_space()
+
+    def buffer_updated(self, nbytes):
+        self.player.framer.received(nbytes)
+        with write_batch(self.server.write_batching):
+            self.data_ready()
+
+    def data_ready(self):
+        """接收緩衝區有新資料：先完成名字交握，之後處理指令"""
+        player = self.player
+        if not self.logged_in:
+            line = player.framer.take_line()
+            if line is None:
+                if player.framer.pending() > LOGIN_MAX_BYTES:
+                    self.finish_handshake()
+                    player.send("名字太長，斷開連線。")
+                    player.close()
+                return
+            self.finish_handshake()
+            sock = player.conn.get_extra_info('socket')
+            if self.server.hand_off_login(sock.fileno(), player.addr, line, player.framer.peek()):
+                player.conn.abort()
+                return
+            if self.server.login(player, line.decode()) is None:
+                player.close()
+                return
+            self.logged_in = True
+        try:
+            if not self.server.process_commands(player):
+                player.close()
+        except Exception as e:
+            print(f"處理玩家 {player.name} 時發生錯誤: {e}")
+            ERRORS.labels('handler_exception').inc()
+            player.close()
+
+    def connection_lost(self, exc):
+        self.finish_handshake()
+        if not self.logged_in:
+            return
+        self.server.leave_table(self.player)
+        print(f"玩家 {self.player.name} 已離開遊戲。")
+
+class AsyncGameServer(GameServer):
+    """以單一 asyncio 事件迴圈承載所有連線的伺服器引擎，遊戲規則與 thread 引擎共用"""
+
+    def __init__(self, host, port):
+        super().__init__(host, port)
+        self.pending_logins = 0  # 尚未完成名字交握的連線數
+        self.timer_task = None
+
+    def start_server(self):
+        """啟動伺服器"""
+        self.open_journal()
+        self.start_bots()
+        self.start_metrics()
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("伺服器正在關閉...")
+            self.server_socket.close()
+
+    async def serve(self):
+        """在事件迴圈中接受連線直到伺服器關閉"""
+        self.listen()
+        print(f"伺服器啟動，監聽 {self.host}:{self.port}（asyncio 引擎）")
+        loop = asyncio.get_running_loop()
+        # 計時輪在事件迴圈中推進，所有計時器回呼都在事件迴圈執行，遊戲狀態不會被其他執行緒碰到
+        self.timer_task = loop.create_task(self.timers.run_async())
+        server = await loop.create_server(lambda: PlayerProtocol(self), sock=self.server_socket)
+        async with server:
+            await server.serve_forever()
+
+def create_server(host, port, engine='thread'):
+    """依引擎名稱建立伺服器"""
+    if engine == 'asyncio':
+        return AsyncGameServer(host, port)
+    return GameServer(host, port)
+
+def deck_count(value):
+    """--decks 的型別：1 到 MAX_DECKS 副"""
+    decks = int(value)
+    if not 1 <= decks <= MAX_DECKS:
+        raise argparse.ArgumentTypeError(f"副數必須介於 1 到 {MAX_DECKS}")
+    return decks
+
+def table_prefix(value):
+    """--table-prefix 的型別：加上編號後的桌號要放得進 SESSION 框架"""
+    if len(value.encode()) > MAX_TABLE_PREFIX_BYTES:
+        raise argparse.ArgumentTypeError(f"桌號前綴不能超過 {MAX_TABLE_PREFIX_BYTES} 個位元組（UTF-8）")
+    return value
+
+def build_parser(description="抽鬼牌遊戲伺服器"):
+    """伺服器的命令列參數（多行程模式也使用同一組參數）"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--engine', choices=ENGINES, default='thread', help="伺服器引擎")
+    parser.add_argument('--login-timeout', type=float, default=LOGIN_TIMEOUT, help="送出名字的期限（秒）")
+    parser.add_argument('--login-queue-limit', type=int, default=LOGIN_QUEUE_LIMIT, help="同時等待送出名字的連線上限")
+    parser.add_argument('--decks', type=deck_count, default=DECKS, help=f"每張牌桌使用幾副牌（1 到 {MAX_DECKS}）")
+    parser.add_argument('--auto-discard', action='store_true', help="新牌桌預設在發牌與抽牌後自動丟棄配對")
+    parser.add_argument('--outbox-limit', type=int, default=OUTBOX_LIMIT, help="每條連線待送資料的上限（位元組）")
+    parser.add_argument('--slow-consumer', choices=SLOW_CONSUMER_POLICIES, default=SLOW_CONSUMER_POLICY,
+                        help="待送資料超過上限時：丟掉舊手牌(coalesce)、丟掉新訊息(drop)或斷線(disconnect)")
+    parser.add_argument('--lobby', action='store_true', help="沒有指定牌桌的玩家進入配對佇列，湊滿一桌自動開始")
+    parser.add_argument('--table-size', type=int, default=MAX_PLAYERS, help="配對佇列每桌的人數")
+    parser.add_argument('--fill-timeout', type=float, default=LOBBY_FILL_TIMEOUT,
+                        help=f"配對等待超過幾秒就以至少 {MIN_PLAYERS} 人先開桌")
+    parser.add_argument('--turn-timeout', type=float, default=TURN_TIMEOUT,
+                        help="輪到的玩家超過幾秒沒有結束回合就由伺服器代為抽牌並結束，0 表示不限時")
+    parser.add_argument('--play-again-timeout', type=float, default=PLAY_AGAIN_TIMEOUT,
+                        help="詢問再來一局後幾秒內沒有回應視為拒絕，0 表示不限時")
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help="玩家超過幾秒沒有送出指令就斷線（觀戰者除外），0 表示不斷線")
+    parser.add_argument('--reconnect-grace', type=float, default=RECONNECT_GRACE,
+                        help="玩家斷線後保留座位幾秒，期間可以用重新連線代碼回到原本的座位，0 表示不保留")
+    parser.add_argument('--bot-fill', action='store_true',
+                        help=f"真人不足時以伺服器端機器人補位：按下準備開始時補到 {MIN_PLAYERS} 人，配對逾時時補滿一桌")
+    parser.add_argument('--bot-tables', type=int, default=0, help="啟動時開出幾張全機器人、一直再來一局的牌桌（壓力測試用）")
+    parser.add_argument('--bot-policy', choices=sorted(BOT_POLICIES), default=BOT_POLICY, help="機器人的決策策略")
+    parser.add_argument('--bot-executor', choices=BOT_EXECUTORS, default=BOT_EXECUTOR,
+                        help="機器人的決策在執行緒池(thread)、行程池(process)或計時輪回呼(timer)中執行")
+    parser.add_argument('--bot-workers', type=int, default=BOT_WORKERS, help="機器人決策的執行緒或行程數")
+    parser.add_argument('--bot-delay', type=float, default=BOT_DELAY, help="機器人每一步之前等待的秒數，0 表示立即")
+    parser.add_argument('--no-nodelay', action='store_true', help="不設定 TCP_NODELAY（比較用）")
+    parser.add_argument('--no-write-batching', action='store_true', help="每則訊息各自寫出，不合併同一批事件的輸出（比較用）")
+    parser.add_argument('--journal', help="把每張牌桌的狀態轉移附加到這個遊戲事件日誌檔（多行程模式下每個工作行程加上 .編號）")
+    parser.add_argument('--journal-fsync', choices=JOURNAL_FSYNC_POLICIES, default=JOURNAL_FSYNC,
+                        help="日誌的 fsync 策略：always 每批寫入後、interval 每秒最多一次、never 交給作業系統")
+    parser.add_argument('--table-prefix', type=table_prefix, default='', help="自動建立的桌號前綴（多台伺服器放在閘道後面時各用不同前綴）")
+    parser.add_argument('--metrics-port', type=int,
+                        help=f"在 {METRICS_HOST} 的這個連接埠提供 /metrics（Prometheus 文字格式）與 /trace、/profile 管理路徑")
+    return parser
+
+def configure_server(server, args):
+    """把命令列參數套用到伺服器"""
+    server.decks = args.decks
+    server.auto_discard = args.auto_discard
+    server.outbox_limit = args.outbox_limit
+    server.slow_consumer_policy = args.slow_consumer
+    server.login_timeout = args.login_timeout
+    server.login_queue_limit = args.login_queue_limit
+    server.metrics_port = args.metrics_port
+    server.table_prefix = args.table_prefix
+    server.turn_timeout = args.turn_timeout
+    server.play_again_timeout = args.play_again_timeout
+    server.idle_timeout = args.idle_timeout
+    server.reconnect_grace = args.reconnect_grace
+    server.nodelay = not args.no_nodelay
+    server.write_batching = not args.no_write_batching
+    server.journal_path = args.journal
+    server.journal_fsync = args.journal_fsync
+    server.bot_fill = args.bot_fill
+    server.bot_tables = args.bot_tables
+    server.bot_policy = args.bot_policy
+    server.bot_executor = args.bot_executor
+    server.bot_workers = args.bot_workers
+    server.bot_delay = args.bot_delay
+    if args.lobby:
+        server.lobby = Lobby(server, max(MIN_PLAYERS, min(args.table_size, MAX_PLAYERS)), args.fill_timeout,
+                             1 if args.bot_fill else MIN_PLAYERS)
+    return server
+
+def main():
+    args = build_parser().parse_args()
+    server = configure_server(create_server(args.host, args.port, args.engine), args)
     server.start_server()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from operator import xor
+from socketgamecards import DECK_SIZE, suits, ranks, create_deck, Hand
+from socketgameengine import deal, play_game
+
+# 模擬參數
+SIM_GAMES = 100000  # 每種規則組合模擬的局數
+SIM_CHUNK = 10000  # 每一批的局數：每批有自己的種子，結果與工作行程數無關
+SIM_SEED = 1
+JOKERS_PER_DECK = 2  # socketgamecards 每副牌的鬼牌數
+DISCARD_RULES = ['auto', 'turn']  # auto：發牌與抽牌後立即丟棄配對（--auto-discard）；turn：配對留到自己的回合才丟
+SIM_ENGINES = ['fast', 'reference']
+
+# 快速模擬的壓縮表示：牌只看點數，點數 r 的牌以 1 << r 表示，鬼牌為 0
+# 配對丟棄後每個點數最多剩一張，一手牌就是「持有哪些點數」的遮罩加上鬼牌張數，抽牌與配對都是位元運算
+RANK_BITS = tuple(1 << (rank - 1) for rank in ranks)
+PICK = tuple(tuple(bit for bit in RANK_BITS if mask & bit) for mask in range(1 << len(ranks)))  # 遮罩 -> 持有的點數
+
+def rank_deck(decks, jokers):
+    """快速模擬用的牌組：每副 52 張點數牌與 jokers 張鬼牌"""
+    return list(RANK_BITS) * len(suits) * decks + [0] * (jokers * decks)
+
+def card_deck(decks, jokers):
+    """參考引擎用的牌組（牌的編號），每副只留前 jokers 張鬼牌"""
+    return [card for card in create_deck(decks) if card % DECK_SIZE < DECK_SIZE - JOKERS_PER_DECK + jokers]
+
+def play_fast(deck, players, auto_discard, rng):
+    """以壓縮表示打完一局，規則與 socketgameengine.play_game 相同，回傳 (抽牌次數, 贏家座位)"""
+    rng.shuffle(deck)
+    random_ = rng.random
+    hands = [deck[seat::players] for seat in range(players)]  # 依座位輪流發牌
+    masks = [reduce(xor, hand, 0) for hand in hands]  # 丟掉配對後剩下的點數
+    jokers = [hand.count(0) for hand in hands]
+    seat = 0
+    turns = 0
+    if auto_discard:
+        sizes = [mask.bit_count() + count for mask, count in zip(masks, jokers)]
+        if 0 in sizes:
+            return 0, sizes.index(0)
+    else:
+        # 配對留到自己的回合才丟：第一輪被抽的下一位還拿著發到的整手牌，之後每個人的手牌都已經丟過配對
+        sizes = [len(hand) for hand in hands]
+        for seat in range(players):
+            source = seat + 1
+            turns += 1
+            if source < players:
+                cards = hands[source]
+                index = int(random_() * len(cards))
+                card = cards[index]
+                cards[index] = cards[-1]
+                cards.pop()
+                masks[source] ^= card
+                jokers[source] -= not card
+            else:
+                source = 0
+                card = pick(masks, jokers, sizes, source, random_)
+            sizes[source] -= 1
+            masks[seat] ^= card
+            jokers[seat] += not card
+            if not sizes[source]:
+                return turns, source
+            sizes[seat] = masks[seat].bit_count() + jokers[seat]
+            if not sizes[seat]:
+                return turns, seat
+        seat = 0
+    while True:
+        source = seat + 1
+        if source == players:
+            source = 0
+        held = jokers[source]
+        index = int(random_() * sizes[source])
+        if index < held:
+            jokers[source] = held - 1
+            jokers[seat] += 1
+            sizes[seat] += 1
+        else:
+            bit = PICK[masks[source]][index - held]
+            masks[source] ^= bit
+            if masks[seat] & bit:
+                sizes[seat] -= 1  # 湊成一對丟掉
+            else:
+                sizes[seat] += 1
+            masks[seat] ^= bit
+        sizes[source] -= 1
+        turns += 1
+        if not sizes[source]:
+            return turns, source
+        if not sizes[seat]:
+            return turns, seat
+        seat = source
+
+def pick(masks, jokers, sizes, seat, random_):
+    """從已經丟過配對的手牌隨機抽出一張，回傳牌（點數位元，鬼牌為 0）"""
+    held = jokers[seat]
+    index = int(random_() * sizes[seat])
+    if index < held:
+        jokers[seat] = held - 1
+        return 0
+    bit = PICK[masks[seat]][index - held]
+    masks[seat] ^= bit
+    return bit
+
+def play_reference(deck, players, auto_discard, rng):
+    """以伺服器的規則核心（socketgameengine 與 Hand）打完一局"""
+    rng.shuffle(deck)
+    hands = [Hand() for _ in range(players)]
+    deal(deck, hands)
+    return play_game(hands, rng, auto_discard)
+
+def run_chunk(task):
+    """模擬一批遊戲，回傳 (抽牌次數的分佈, 各座位的勝場, 秒數)"""
+    engine, players, decks, jokers, discard, games, seed = task
+    rng = random.Random(seed)
+    if engine == 'fast':
+        play, deck = play_fast, rank_deck(decks, jokers)
+    else:
+        play, deck = play_reference, card_deck(decks, jokers)
+    auto_discard = discard == 'auto'
+    lengths = Counter()
+    wins = [0] * players
+    start = time.perf_counter()
+    for _ in range(games):
+        turns, winner = play(deck, players, auto_discard, rng)
+        lengths[turns] += 1
+        wins[winner] += 1
+    return lengths, wins, time.perf_counter() - start
+
+def chunk_tasks(engine, players, decks, jokers, discard, games, seed):
+    """把 games 局切成固定大小的批次，每批的種子只由 seed 與批次編號決定"""
+    tasks = []
+    for index, first in enumerate(range(0, games, SIM_CHUNK)):
+        tasks.append((engine, players, decks, jokers, discard, min(SIM_CHUNK, games - first), seed << 32 | index))
+    return tasks
+
+def length_percentile(lengths, total, p):
+    """抽牌次數分佈的第 p 百分位數"""
+    target = p / 100 * total
+    seen = 0
+    for turns in sorted(lengths):
+        seen += lengths[turns]
+        if seen >= target:
+            return turns
+    return 0
+
+def summarize_variant(lengths, wins, seconds, elapsed):
+    """整理一種規則組合的結果：局長分佈、各座位勝率與先手優勢（含 95% 信賴區間）"""
+    games = sum(wins)
+    players = len(wins)
+    mean = sum(turns * count for turns, count in lengths.items()) / games
+    variance = sum((turns - mean) ** 2 * count for turns, count in lengths.items()) / games
+    first = wins[0] / games
+    return {
+        'games': games,
+        'turns_mean': round(mean, 2),
+        'turns_stdev': round(math.sqrt(variance), 2),
+        'turns_p50': length_percentile(lengths, games, 50),
+        'turns_p90': length_percentile(lengths, games, 90),
+        'turns_p99': length_percentile(lengths, games, 99),
+        'turns_max': max(lengths),
+        'dealt_win_rate': round(lengths.get(0, 0) / games, 5),  # 發牌後就有人沒牌
+        'win_rate_by_seat': [round(count / games, 4) for count in wins],
+        'first_player_advantage': round(first - 1 / players, 4),  # 座位 0 先抽
+        'first_player_ci95': round(1.96 * math.sqrt(first * (1 - first) / games), 4),
+        'cpu_seconds': round(seconds, 3),
+        'games_per_sec_per_core': round(games / seconds) if seconds > 0 else 0,
+        'games_per_sec': round(games / elapsed) if elapsed > 0 else 0,
+    }
+
+def simulate(args):
+    """依命令列的規則組合逐一模擬，回傳結果"""
+    results = {'engine': args.engine, 'games': args.games, 'seed': args.seed, 'workers': args.workers, 'variants': []}
+    pool = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    try:
+        for players, decks, jokers, discard in itertools.product(args.players, args.decks, args.jokers, args.discard):
+            tasks = chunk_tasks(args.engine, players, decks, jokers, discard, args.games, args.seed)
+            start = time.perf_counter()
+            chunks = list(pool.map(run_chunk, tasks) if pool is not None else map(run_chunk, tasks))
+            elapsed = time.perf_counter() - start
+            lengths = Counter()
+            wins = [0] * players
+            for chunk_lengths, chunk_wins, _ in chunks:
+                lengths.update(chunk_lengths)
+                wins = [a + b for a, b in zip(wins, chunk_wins)]
+            variant = {'players': players, 'decks': decks, 'jokers': jokers, 'discard': discard}
+            variant.update(summarize_variant(lengths, wins, sum(chunk[2] for chunk in chunks), elapsed))
+            results['variants'].append(variant)
+            print(f"{players} 人 {decks} 副牌 {jokers} 張鬼牌 {discard} 丟棄: 平均 {variant['turns_mean']} 次抽牌，"
+                  f"先手優勢 {variant['first_player_advantage']:+.4f}±{variant['first_player_ci95']}，"
+                  f"{variant['games_per_sec_per_core']} 局/秒/核心")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="抽鬼牌離線模擬：以固定種子打大量對局，統計局長分佈、先手優勢與規則變化的影響")
+    parser.add_argument('--games', type=int, default=SIM_GAMES, help="每種規則組合的局數")
+    parser.add_argument('--players', type=int, nargs='+', default=[4], help="玩家數，可列出多個")
+    parser.add_argument('--decks', type=int, nargs='+', default=[1], help="副數，可列出多個")
+    parser.add_argument('--jokers', type=int, nargs='+', default=[JOKERS_PER_DECK], choices=range(JOKERS_PER_DECK + 1),
+                        help="每副牌的鬼牌數，可列出多個")
+    parser.add_argument('--discard', choices=DISCARD_RULES, nargs='+', default=['auto'],
+                        help="配對丟棄的時機：auto 抽到就丟（伺服器 --auto-discard），turn 留到自己的回合才丟")
+    parser.add_argument('--engine', choices=SIM_ENGINES, default='fast',
+                        help="fast 以位元遮罩模擬；reference 使用伺服器的規則核心（socketgameengine），用來核對 fast 的分佈")
+    parser.add_argument('--workers', type=int, default=1, help="工作行程數（1 表示只用一個核心，量測單核吞吐量）")
+    parser.add_argument('--seed', type=int, default=SIM_SEED)
+    parser.add_argument('--json', help="將結果寫成 JSON 檔")
+    args = parser.parse_args()
+    if args.workers <= 0:
+        args.workers = os.cpu_count() or 1
+    results = simulate(args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
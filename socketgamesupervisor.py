@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import threading
+import time
+import zlib
+from socketgameserver import (GameServer, AsyncGameServer, PlayerProtocol, build_parser, configure_server,
+                              parse_login)
+
+# 多行程參數
+HANDOFF_MAX_BYTES = 8192  # 轉交訊息（名字列與後續資料）的上限
+RESTART_DELAY = 1  # 工作行程異常結束後等待幾秒再重新啟動
+
+def table_owner(table_id, workers):
+    """牌桌由哪個工作行程負責：對桌號做穩定的雜湊，所有行程算出來的結果都一樣"""
+    return zlib.crc32(table_id.encode()) % workers
+
+class WorkerMixin:
+    """多行程模式的工作行程：每個行程各自以 SO_REUSEPORT 監聽同一個連接埠，
+    核心把新連線分給任一行程；登入時指定的牌桌若由其他行程負責，就用 SCM_RIGHTS 把連線轉交過去，
+    讓同一桌的玩家都在同一個行程裡。
+    """
+
+    def setup_worker(self, index, inboxes):
+        self.worker_index = index
+        self.workers = len(inboxes)
+        self.inboxes = inboxes  # 每個工作行程一組 (送出端, 接收端)
+        self.reuse_port = True
+
+    def owns_table(self, table_id):
+        return table_owner(table_id, self.workers) == self.worker_index
+
+    def hand_off_login(self, fd, addr, line, rest):
+        _, options = parse_login(line.decode(errors='replace'))
+        table_id = options.get('watch', options.get('table'))
+        if table_id is None or self.owns_table(table_id):
+            return False  # 沒有指定牌桌的玩家留在這個行程
+        owner = table_owner(table_id, self.workers)
+        message = json.dumps({'addr': list(addr), 'line': line.hex(), 'rest': rest.hex()}).encode()
+        if len(message) > HANDOFF_MAX_BYTES:
+            return False
+        try:
+            socket.send_fds(self.inboxes[owner][0], [message], [fd])
+        except OSError as e:
+            print(f"轉交連線給工作行程 {owner} 時出錯: {e}")
+            return False
+        return True
+
+    def receive_handoff(self):
+        """取出一條轉交過來的連線，回傳 (socket, addr, 名字列, 後續資料)"""
+        message, fds, _, _ = socket.recv_fds(self.inboxes[self.worker_index][1], HANDOFF_MAX_BYTES, 1)
+        if not fds:
+            return None
+        info = json.loads(message)
+        conn = socket.socket(fileno=fds[0])
+        return conn, tuple(info['addr']), bytes.fromhex(info['line']), bytes.fromhex(info['rest'])
+
+class ThreadWorkerServer(WorkerMixin, GameServer):
+    """thread 引擎的工作行程"""
+
+    def start_server(self):
+        threading.Thread(target=self.handoff_loop, daemon=True).start()
+        super().start_server()
+
+    def handoff_loop(self):
+        """接收其他行程轉交過來的連線"""
+        while True:
+            try:
+                received = self.receive_handoff()
+            except OSError as e:
+                print(f"接收轉交連線時出錯: {e}")
+                return
+            if received is None:
+                continue
+            conn, addr, line, rest = received
+            conn.setblocking(True)
+            try:
+                self.complete_login(conn, addr, line, rest)
+            except Exception as e:
+                print(f"玩家 {addr} 登入時出錯: {e}")
+                conn.close()
+
+class AsyncWorkerServer(WorkerMixin, AsyncGameServer):
+    """asyncio 引擎的工作行程"""
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.inboxes[self.worker_index][1].setblocking(False)
+        loop.add_reader(self.inboxes[self.worker_index][1].fileno(), self.accept_handoff)
+        await super().serve()
+
+    def accept_handoff(self):
+        """事件迴圈中接收轉交過來的連線"""
+        try:
+            received = self.receive_handoff()
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"接收轉交連線時出錯: {e}")
+            return
+        if received is None:
+            return
+        conn, addr, line, rest = received
+        conn.setblocking(False)
+        initial = line + b'\n' + rest
+        loop = asyncio.get_running_loop()
+        loop.create_task(loop.connect_accepted_socket(lambda: PlayerProtocol(self, initial), conn))
+
+def run_worker(index, inboxes, args):
+    """在子行程中執行一個工作行程，不會返回"""
+    for i, (_, recv_end) in enumerate(inboxes):
+        if i != index:
+            recv_end.close()
+    server_class = AsyncWorkerServer if args.engine == 'asyncio' else ThreadWorkerServer
+    server = configure_server(server_class(args.host, args.port), args)
+    server.setup_worker(index, inboxes)
+    if args.metrics_port is not None:
+        server.metrics_port = args.metrics_port + index  # 每個工作行程各自的指標連接埠
+    if args.journal is not None:
+        server.journal_path = f"{args.journal}.{index}"  # 每個工作行程各自的日誌檔
+    print(f"工作行程 {index} 啟動（pid {os.getpid()}）")
+    try:
+        server.start_server()
+    finally:
+        os._exit(0)
+
+class Supervisor:
+    """為每個 CPU 核心 fork 一個工作行程，並在工作行程異常結束時重新啟動"""
+
+    def __init__(self, args, workers):
+        self.args = args
+        self.workers = workers
+        self.inboxes = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(workers)]
+        self.children = {}  # pid -> 工作行程編號
+        self.stopping = False
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            run_worker(index, self.inboxes, self.args)
+        self.children[pid] = index
+
+    def stop(self, signum=None, frame=None):
+        """把結束訊號轉給所有工作行程"""
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        # 必須在啟動任何執行緒之前 fork
+        for index in range(self.workers):
+            self.spawn(index)
+        print(f"監督行程啟動，{self.workers} 個工作行程共用 {self.args.host}:{self.args.port}")
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            print(f"工作行程 {index}（pid {pid}）異常結束（狀態 {status}），重新啟動。")
+            time.sleep(RESTART_DELAY)
+            self.spawn(index)
+        print("所有工作行程已結束。")
+
+def main():
+    parser = build_parser("抽鬼牌遊戲伺服器（多行程模式）")
+    parser.add_argument('--workers', type=int, default=0, help="工作行程數，0 表示每個 CPU 核心一個")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    Supervisor(args, workers).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import asyncio
+import math
+import threading
+import time
+
+# 計時輪參數
+TIMER_TICK = 0.05  # 每一格的秒數（計時精度）
+WHEEL_BITS = 8  # 每層 2**8 = 256 格
+WHEEL_LEVELS = 4  # 四層可涵蓋 256**4 格，以 0.05 秒一格約 6.8 年
+
+class Timer:
+    """計時輪上的一個計時器，cancel() 為 O(1)"""
+
+    __slots__ = ('wheel', 'expires', 'callback', 'args', 'slot')
+
+    def __init__(self, wheel, callback, args):
+        self.wheel = wheel
+        self.expires = 0  # 到期的格數
+        self.callback = callback
+        self.args = args
+        self.slot = None  # 目前所在的格子（dict），None 表示已到期或已取消
+
+    def cancel(self):
+        self.wheel.cancel(self)
+
+    def active(self):
+        return self.slot is not None
+
+class TimerWheel:
+    """階層式計時輪：新增與取消都是 O(1)，每一格只處理到期的格子與偶爾下移的上層格子
+
+    第 0 層每格一個 tick，第 n 層每格 256**n 個 tick；上層的格子輪到時把裡面的計時器重新放到較低層。
+    不需要每張牌桌或每條連線一個執行緒或 threading.Timer。推進的執行緒或工作不是每格醒來，
+    而是睡到下一個有計時器的格子（沒有計時器時一直睡），schedule() 加入更早到期的計時器時再叫醒它，
+    閒置的伺服器不會為了計時而佔用 CPU。
+    """
+
+    def __init__(self, tick=TIMER_TICK, bits=WHEEL_BITS, levels=WHEEL_LEVELS):
+        self.tick = tick
+        self.rate = 1 / tick  # 每秒幾格
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.levels = levels
+        self.wheels = [[{} for _ in range(1 << bits)] for _ in range(levels)]
+        self.current = 0  # 已處理到的格數
+        self.origin = time.monotonic()
+        self.count = 0  # 尚未到期也未取消的計時器數
+        self.lock = threading.Lock()  # 回呼在鎖外執行，不需要可重入
+        self.wakeup = threading.Condition(self.lock)  # thread 引擎的推進執行緒在這裡睡
+        self.sleeping_until = 0  # 推進的一方睡到第幾格（math.inf 表示沒有計時器；0 表示醒著，之後會重新計算）
+        self.wake = None  # 叫醒推進的一方的函式（呼叫者持有 self.lock）
+
+    def __len__(self):
+        return self.count
+
+    def schedule(self, delay, callback, *args):
+        """delay 秒後呼叫 callback(*args)，回傳 Timer（最少等一格）
+
+        這是最常見的操作（每個回合、每個機器人步驟都會呼叫），放進格子的計算直接寫在這裡，不另外呼叫 place。
+        """
+        timer = Timer(self, callback, args)
+        with self.lock:
+            now_tick = (time.monotonic() - self.origin) * self.rate
+            current = self.current
+            if not self.count and now_tick >= current + 1:
+                # 沒有計時器時推進的一方在睡、current 停在上次醒來的格數；各層都是空的，可以直接跳到現在
+                current = self.current = int(now_tick)
+            expires = int(now_tick + delay * self.rate + 0.999999)
+            if expires <= current:
+                expires = current + 1
+            timer.expires = expires
+            level = (expires - current).bit_length() - 1
+            if level < self.bits:
+                slot = self.wheels[0][expires & self.mask]
+            else:
+                level = min(level // self.bits, self.levels - 1)
+                slot = self.wheels[level][(expires >> (self.bits * level)) & self.mask]
+            slot[timer] = None
+            timer.slot = slot
+            self.count += 1
+            if expires < self.sleeping_until:
+                self.wake()
+        return timer
+
+    def place(self, timer):
+        """依剩餘格數把計時器放進對應層的格子"""
+        delta = timer.expires - self.current
+        level = min((delta.bit_length() - 1) // self.bits, self.levels - 1) if delta > 0 else 0
+        slot = self.wheels[level][(timer.expires >> (self.bits * level)) & self.mask]
+        slot[timer] = None
+        timer.slot = slot
+
+    def cancel(self, timer):
+        with self.lock:
+            if timer.slot is not None:
+                del timer.slot[timer]
+                timer.slot = None
+                self.count -= 1
+
+    def advance(self, now=None):
+        """推進到現在的時間並執行到期的計時器，回傳執行的數量"""
+        target = int(((time.monotonic() if now is None else now) - self.origin) * self.rate)
+        due = []
+        with self.lock:
+            if not self.count:
+                self.current = max(self.current, target)  # 沒有計時器，不必一格一格走過去
+            while self.current < target:
+                self.current += 1
+                self.cascade()
+                index = self.current & self.mask
+                slot = self.wheels[0][index]
+                if not slot:
+                    continue
+                self.wheels[0][index] = {}
+                for timer in slot:
+                    timer.slot = None
+                    if timer.expires <= self.current:
+                        self.count -= 1
+                        due.append(timer)
+                    else:
+                        self.place(timer)  # 超出最大範圍而被放在最上層的計時器
+        for timer in due:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                print(f"計時器回呼時出錯: {e}")
+        return len(due)
+
+    def cascade(self):
+        """目前格數在某一層剛好進位時，把該層輪到的格子移到較低層"""
+        for level in range(1, self.levels):
+            if self.current & ((1 << (self.bits * level)) - 1):
+                return
+            index = (self.current >> (self.bits * level)) & self.mask
+            slot = self.wheels[level][index]
+            if slot:
+                self.wheels[level][index] = {}
+                for timer in slot:
+                    self.place(timer)
+
+    def next_tick(self):
+        """推進的一方下一次要醒來的格數：第 0 層最近有計時器的格子，或上層最近有計時器的格子要下移的那一格，
+        取最早的一個；沒有計時器時回傳 None（呼叫者需持有 self.lock）
+        """
+        if not self.count:
+            return None
+        best = None
+        for level in range(self.levels):
+            shift = self.bits * level
+            base = self.current >> shift
+            if best is not None and best <= (base + 1) << shift:
+                break  # 這一層（以及更上層）最早也要到這一格才會下移
+            wheel = self.wheels[level]
+            for step in range(1, self.mask + 2):
+                if wheel[(base + step) & self.mask]:
+                    tick = (base + step) << shift
+                    if best is None or tick < best:
+                        best = tick
+                    break
+        return best
+
+    def sleep_seconds(self, tick):
+        """睡到第 tick 格還要幾秒"""
+        return self.origin + tick * self.tick - time.monotonic()
+
+    def run_forever(self):
+        """thread 引擎：由單一執行緒推進，睡到下一個有計時器的格子"""
+        with self.lock:
+            self.wake = self.wakeup.notify
+        while True:
+            with self.lock:
+                tick = self.next_tick()
+                if tick is None:
+                    self.sleeping_until = math.inf
+                    self.wakeup.wait()
+                else:
+                    self.sleeping_until = tick
+                    delay = self.sleep_seconds(tick)
+                    if delay > 0:
+                        self.wakeup.wait(delay)
+                self.sleeping_until = 0
+            self.advance()
+
+    def start_thread(self):
+        threading.Thread(target=self.run_forever, daemon=True).start()
+
+    async def run_async(self):
+        """asyncio 引擎：在事件迴圈中推進，計時器回呼都在事件迴圈執行緒執行
+
+        schedule() 可能在其他執行緒呼叫（機器人的工作者），因此經 call_soon_threadsafe 叫醒事件迴圈。
+        """
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        with self.lock:
+            self.wake = lambda: loop.call_soon_threadsafe(wakeup.set)
+        while True:
+            with self.lock:
+                tick = self.next_tick()
+                self.sleeping_until = math.inf if tick is None else tick
+            try:
+                await asyncio.wait_for(wakeup.wait(), None if tick is None else max(0, self.sleep_seconds(tick)))
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            with self.lock:
+                self.sleeping_until = 0
+            self.advance()
@@ -0,0 +1,269 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qs
+
+# 追蹤與剖析參數
+TRACE_MAX_EVENTS = 200000  # 一次追蹤最多保留的事件數，超過時丟掉最舊的
+PROFILE_SECONDS = 5  # 剖析視窗的預設長度
+PROFILE_MAX_SECONDS = 120
+SAMPLE_INTERVAL = 0.005  # 取樣剖析的間隔（秒）
+PROFILE_TOP = 40  # cProfile 報告列出的函式數
+PROFILE_DRAIN_TIMEOUT = 1  # 視窗結束時等待處理中指令結束的秒數
+
+class NullSpan:
+    """追蹤關閉時使用的空區段，進出都不做事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    """一段計時區間，結束時變成一筆 Chrome trace 的完整事件（ph=X）"""
+
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+class Tracer:
+    """以區段記錄每條指令的各個階段（parse、validate、mutate、fan-out），平常關閉時幾乎沒有成本"""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = deque(maxlen=TRACE_MAX_EVENTS)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def start(self, max_events=TRACE_MAX_EVENTS):
+        """開始收集事件（會清掉上一次的事件）"""
+        with self.lock:
+            self.events = deque(maxlen=max_events)
+            self.origin = time.perf_counter()
+            self.enabled = True
+
+    def stop(self):
+        """停止收集並回傳這段期間的事件"""
+        with self.lock:
+            self.enabled = False
+            events, self.events = list(self.events), deque(maxlen=self.events.maxlen)
+        return events
+
+    def span(self, name, **args):
+        """with TRACER.span('draw', table='7'): ..."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def record(self, name, start, end, args=None):
+        """記錄一段已經結束的區間（perf_counter 秒）"""
+        if not self.enabled:
+            return
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6, 3),
+            'dur': round((end - start) * 1e6, 3),
+            'pid': self.pid,
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)  # deque.append 本身是執行緒安全的
+
+def to_chrome_trace(events):
+    """轉成 chrome://tracing 與 Perfetto 可以開啟的 JSON"""
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, ensure_ascii=False)
+
+TRACER = Tracer()
+
+class Profiler:
+    """可在執行中開關的 cProfile 視窗
+
+    cProfile 只會剖析呼叫 enable 的執行緒，所以每個處理指令的執行緒在視窗開啟期間各自用一個剖析器，
+    視窗結束時再以 pstats 合併。Python 3.12 起同一個直譯器同時只能啟用一個剖析器，
+    別的執行緒正在剖析時 enable 會被拒絕，這段工作就不剖析，只記在 skipped。
+    """
+
+    def __init__(self):
+        self.active = False
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)  # 有剖析器停用時通知
+        self.local = threading.local()
+        self.generation = 0
+        self.profiles = []  # [剖析器, 是否正在使用, 是否剖析過]
+        self.skipped = 0  # 因為已有其他剖析器啟用而沒有剖析的區塊數
+
+    def start(self):
+        with self.lock:
+            if self.active:
+                raise RuntimeError("已經有剖析視窗在進行中")
+            self.generation += 1
+            self.profiles = []
+            self.skipped = 0
+            self.active = True
+
+    def stop(self):
+        """結束視窗並回傳合併後的 pstats.Stats（沒有資料時回傳 None）"""
+        with self.lock:
+            self.active = False
+            # 剖析器只能由它自己的執行緒停用，等處理中的指令結束再合併
+            self.idle.wait_for(lambda: not any(entry[1] for entry in self.profiles), PROFILE_DRAIN_TIMEOUT)
+            profiles = [entry[0] for entry in self.profiles if entry[2] and not entry[1]]
+        stats = None
+        for profile in profiles:
+            if stats is None:
+                stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                stats.add(profile)
+        return stats
+
+    def profiled(self):
+        """包住一段要剖析的工作，視窗沒開啟時不做事"""
+        if not self.active:
+            return NULL_SPAN
+        return ProfiledBlock(self)
+
+    def entry_for_thread(self):
+        """目前執行緒在這個視窗的剖析器"""
+        entry = getattr(self.local, 'entry', None)
+        if entry is None or self.local.generation != self.generation:
+            entry = [cProfile.Profile(), False, False]
+            self.local.entry = entry
+            self.local.generation = self.generation
+            with self.lock:
+                self.profiles.append(entry)
+        return entry
+
+class ProfiledBlock:
+    """Profiler.profiled() 回傳的區塊，在目前執行緒的剖析器上開關"""
+
+    __slots__ = ('profiler', 'entry')
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.entry = None
+
+    def __enter__(self):
+        entry = self.profiler.entry_for_thread()
+        if entry[1]:
+            return self  # 巢狀呼叫，外層已經在剖析
+        with self.profiler.lock:
+            entry[1] = True
+        try:
+            entry[0].enable()
+        except ValueError:
+            # Python 3.12 起其他執行緒的剖析器啟用中時不能再啟用，跳過這段工作，不影響指令本身
+            self.release(entry, skipped=True)
+            return self
+        entry[2] = True
+        self.entry = entry
+        return self
+
+    def __exit__(self, *exc):
+        if self.entry is not None:
+            self.entry[0].disable()
+            self.release(self.entry)
+        return False
+
+    def release(self, entry, skipped=False):
+        """標記剖析器已停用，通知等待合併的 stop()"""
+        with self.profiler.lock:
+            entry[1] = False
+            if skipped:
+                self.profiler.skipped += 1
+            self.profiler.idle.notify_all()
+
+PROFILER = Profiler()
+
+def profile_window(seconds, sort='cumulative', top=PROFILE_TOP):
+    """開啟 seconds 秒的 cProfile 視窗，回傳文字報告"""
+    PROFILER.start()
+    try:
+        time.sleep(seconds)
+    finally:
+        stats = PROFILER.stop()
+    skipped = ""
+    if PROFILER.skipped:
+        skipped = f"有 {PROFILER.skipped} 段工作因為其他執行緒的剖析器啟用中而沒有剖析（Python 3.12 起同時只能啟用一個）。\n"
+    if stats is None:
+        return "剖析期間沒有處理任何指令。\n" + skipped
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats(sort).print_stats(top)
+    return skipped + out.getvalue()
+
+def sample_stacks(seconds, interval=SAMPLE_INTERVAL):
+    """每隔 interval 秒取樣所有執行緒的堆疊，回傳 folded 格式（可直接餵給 flamegraph.pl / speedscope）"""
+    me = threading.get_ident()
+    names = {}
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread in threading.enumerate():
+            names[thread.ident] = thread.name
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+def query_seconds(params):
+    seconds = float(params.get('seconds', [PROFILE_SECONDS])[0])
+    return max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+
+def trace_start_route(query):
+    params = parse_qs(query)
+    max_events = int(params.get('max_events', [TRACE_MAX_EVENTS])[0])
+    TRACER.start(max_events)
+    return 'text/plain; charset=utf-8', "追蹤已開始。\n".encode()
+
+def trace_stop_route(query):
+    return 'application/json', to_chrome_trace(TRACER.stop()).encode()
+
+def profile_route(query):
+    params = parse_qs(query)
+    seconds = query_seconds(params)
+    if params.get('mode', ['cprofile'])[0] == 'sample':
+        interval = float(params.get('interval', [SAMPLE_INTERVAL])[0])
+        return 'text/plain; charset=utf-8', sample_stacks(seconds, interval).encode()
+    sort = params.get('sort', ['cumulative'])[0]
+    return 'text/plain; charset=utf-8', profile_window(seconds, sort).encode()
+
+def install_admin_routes(routes):
+    """在指標服務上加入管理用的路徑：
+    /trace/start?max_events=N、/trace/stop（回傳 Chrome trace JSON）、
+    /profile?seconds=5&mode=cprofile|sample
+    """
+    routes['/trace/start'] = trace_start_route
+    routes['/trace/stop'] = trace_stop_route
+    routes['/profile'] = profile_route
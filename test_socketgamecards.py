@@ -0,0 +1,114 @@
+import json
+import random
+import pytest
+from socketgamecards import (DECK_SIZE, JOKER, JOKER_RANK, create_deck, card_rank, is_joker, card_from_dict,
+                             card_to_dict, card_to_json, card_to_string, mask_of, hand_size, iter_cards, hand_to_json,
+                             Hand)
+
+def test_deck_ids_cover_every_card_once():
+    deck = create_deck(2)
+    assert deck == list(range(2 * DECK_SIZE))
+    assert sum(is_joker(card) for card in deck) == 4
+    assert sorted(card_rank(card) for card in deck[:DECK_SIZE] if not is_joker(card)) == sorted(list(range(1, 14)) * 4)
+
+def test_card_rank_and_joker_repeat_every_deck():
+    for card in range(DECK_SIZE):
+        assert card_rank(card + 3 * DECK_SIZE) == card_rank(card)
+        assert is_joker(card + 3 * DECK_SIZE) == is_joker(card)
+    assert card_rank(DECK_SIZE - 1) == JOKER_RANK
+
+def test_card_dict_round_trip():
+    for card in create_deck(3):
+        if is_joker(card) and card % DECK_SIZE == DECK_SIZE - 1:
+            continue  # 兩張鬼牌在線路上的字典相同，都會解回第一張
+        assert card_from_dict(card_to_dict(card)) == card
+        assert json.loads(card_to_json(card)) == card_to_dict(card)
+
+def test_second_deck_cards_carry_deck_field():
+    assert 'deck' not in card_to_dict(0)
+    assert card_to_dict(DECK_SIZE) == {'suit': 'Hearts', 'rank': 1, 'deck': 1}
+    assert card_from_dict({'suit': JOKER, 'rank': 0, 'deck': 2}) == 2 * DECK_SIZE + DECK_SIZE - 2
+
+@pytest.mark.parametrize('card', [
+    {'suit': 'Hearts', 'rank': 14},
+    {'suit': 'Cups', 'rank': 1},
+    {'suit': 'Hearts', 'rank': 1, 'deck': -1},
+    {'suit': 'Hearts', 'rank': 1, 'deck': '1'},
+])
+def test_card_from_dict_rejects_invalid_cards(card):
+    with pytest.raises(ValueError):
+        card_from_dict(card)
+
+def test_card_to_string():
+    assert card_to_string(0) == "♥ A"
+    assert card_to_string(DECK_SIZE + 12) == "♥ K"
+    assert card_to_string(DECK_SIZE - 1) == "鬼牌"
+
+def test_mask_helpers():
+    cards = [5, 0, DECK_SIZE + 1, 53]
+    mask = mask_of(cards)
+    assert hand_size(mask) == 4
+    assert list(iter_cards(mask)) == sorted(cards)
+    assert json.loads(hand_to_json(mask)) == [card_to_dict(card) for card in sorted(cards)]
+    assert list(iter_cards(0)) == []
+
+def assert_consistent(hand):
+    """Hand 的各個索引與牌的串列一致"""
+    assert sorted(hand.positions) == sorted(hand.cards)
+    for card, index in hand.positions.items():
+        assert hand.cards[index] == card
+    for rank, held in enumerate(hand.by_rank):
+        assert sorted(held) == sorted(card for card in hand.cards if card_rank(card) == rank)
+    assert hand.mask == mask_of(hand.cards)
+
+def test_hand_add_and_remove_keep_indexes():
+    hand = Hand([0, 13, 26, 52, 1])
+    hand.remove(0)  # 不是最後一張，最後一張會搬到空出的位置
+    hand.remove(1)  # 剛好是最後一張
+    assert sorted(hand) == [13, 26, 52]
+    assert 0 not in hand and 13 in hand
+    assert hand.count(1) == 2
+    assert_consistent(hand)
+    with pytest.raises(KeyError):
+        hand.remove(0)
+
+def test_take_pairs_removes_pairs_of_every_rank():
+    hand = Hand([0, 13, 26, 1, 14, 2, 52, 53])  # 三張 A、兩張 2、一張 3、兩張鬼牌
+    pairs = hand.take_pairs()
+    assert len(pairs) == 4
+    assert sorted(card_rank(card) for card in pairs) == [1, 1, 2, 2]
+    assert sorted(card_rank(card) for card in hand) == [0, 0, 1, 3]  # 鬼牌不配對，剩下落單的牌
+    assert_consistent(hand)
+    assert hand.take_pairs() == []
+
+def test_take_pairs_of_one_rank():
+    hand = Hand([0, 13, 1, 14])
+    assert sorted(hand.take_pairs(2)) == [1, 14]
+    assert sorted(hand) == [0, 13]
+    assert hand.take_pairs(JOKER_RANK) == []
+
+def test_take_pairs_with_several_decks():
+    hand = Hand([0, 13, DECK_SIZE, DECK_SIZE + 13, 2 * DECK_SIZE])  # 三副牌共五張 A
+    assert len(hand.take_pairs(1)) == 4
+    assert hand.count(1) == 1
+    assert_consistent(hand)
+
+def test_pop_random_empties_the_hand():
+    cards = create_deck(2)
+    hand = Hand(cards)
+    rng = random.Random(7)
+    popped = [hand.pop_random(rng) for _ in range(len(cards))]
+    assert sorted(popped) == cards
+    assert len(hand) == 0 and hand.mask == 0
+    assert_consistent(hand)
+
+def test_contains_all():
+    hand = Hand([0, 13, 52])
+    assert hand.contains_all([0, 52])
+    assert not hand.contains_all([0, 1])
+    assert not hand.contains_all([0, 0])  # 同一張牌不能算兩次
+    assert hand.contains_all([])
+
+def test_hand_to_json_is_sorted():
+    hand = Hand([52, 13, 0])
+    assert [card['rank'] for card in json.loads(hand.to_json())] == [1, 1, 0]
@@ -0,0 +1,93 @@
+import pytest
+import socketgamecodec as codec
+from socketgamecards import DECK_SIZE
+from socketgameio import Outbox, OutboxStats
+from socketgameserver import Table, Player
+
+def decode(data):
+    """切出唯一的一個框架並解成事件參數"""
+    frames, end = codec.split_frames(data, 0, len(data))
+    assert end == len(data) and len(frames) == 1
+    opcode, payload = frames[0]
+    return opcode, codec.decode_event(opcode, payload)
+
+def test_event_round_trips():
+    assert decode(codec.encode_text("你好")) == (codec.TEXT, ("你好",))
+    assert decode(codec.encode_hand_snapshot(7, [0, 53, 200])) == (codec.HAND_SNAPSHOT, (7, [0, 53, 200]))
+    assert decode(codec.encode_hand_delta(8, [1, 2], [3])) == (codec.HAND_DELTA, (8, [1, 2], [3]))
+    assert decode(codec.encode_hand_delta(9, [], [4, 5])) == (codec.HAND_DELTA, (9, [], [4, 5]))
+    assert decode(codec.encode_session('b1-2', 'abc_-1')) == (codec.SESSION, ('b1-2', 'abc_-1'))
+    assert decode(codec.encode_drew('甲', '乙', 52)) == (codec.DREW, ('甲', '乙', 52))
+    assert decode(codec.encode_discarded('甲', [0, 13])) == (codec.DISCARDED, ('甲', [0, 13]))
+    assert decode(codec.encode_winner('甲')) == (codec.WINNER, ('甲',))
+    assert decode(codec.YOUR_TURN_FRAME) == (codec.YOUR_TURN, ())
+
+def test_table_state_round_trip():
+    state = {'seq': 12, 'phase': 'playing', 'seat': 1, 'turn': 0, 'drawn': True, 'ready': True, 'answered': False,
+             'players': [['甲', 10, True], ['乙', 9, False]], 'hand': [3, 16, 52]}
+    assert decode(codec.encode_table_state(state)) == (codec.TABLE_STATE, (state,))
+
+def test_commands_decode_to_text_commands():
+    for text, data in codec.COMMAND_FRAMES.items():
+        (opcode, payload), = codec.split_frames(data, 0, len(data))[0]
+        verb, _, args = text.partition(' ')
+        assert codec.decode_command(opcode, payload) == (verb, args)
+    data = codec.encode_discard([0, 13])
+    (opcode, payload), = codec.split_frames(data, 0, len(data))[0]
+    assert codec.decode_command(opcode, payload) == ('discard', [0, 13])
+    assert codec.decode_command(0x7f, b'') == ('op127', '')
+
+def test_split_frames_keeps_partial_frames():
+    data = codec.encode_winner('甲') + codec.encode_text("abc")
+    frames, end = codec.split_frames(data, 0, len(data) - 1)
+    assert [opcode for opcode, _ in frames] == [codec.WINNER]
+    assert end == len(codec.encode_winner('甲'))
+    reader = codec.FrameReader()
+    assert reader.feed(data[:4]) == []
+    assert [opcode for opcode, _ in reader.feed(data[4:])] == [codec.WINNER, codec.TEXT]
+
+def test_zero_length_frame_is_rejected():
+    with pytest.raises(ValueError):
+        codec.split_frames(b'\x00\x00\x01', 0, 3)
+
+def test_largest_card_ids_round_trip():
+    cards = list(range(codec.MAX_CARD - 3, codec.MAX_CARD + 1))
+    assert decode(codec.encode_hand_snapshot(1, cards)) == (codec.HAND_SNAPSHOT, (1, cards))
+    four_decks = 4 * DECK_SIZE - 1
+    assert decode(codec.encode_drew('甲', '乙', four_decks)) == (codec.DREW, ('甲', '乙', four_decks))
+
+def test_negotiate():
+    assert codec.negotiate('1', 4 * DECK_SIZE - 1) == 1
+    assert codec.negotiate('9', DECK_SIZE - 1) == codec.PROTOCOL_VERSION
+    assert codec.negotiate('0', DECK_SIZE - 1) == 0
+    assert codec.negotiate('x', DECK_SIZE - 1) == 0
+    assert codec.negotiate('1', 5 * DECK_SIZE - 1) == 0  # 牌編號超過一個位元組，只能用文字協定
+    assert codec.accepted_version("歡迎 甲 加入遊戲！（牌桌 1） proto=1") == 1
+    assert codec.accepted_version("歡迎 甲 加入遊戲！（牌桌 1）") == 0
+
+class RecordingOutbox(Outbox):
+    def __init__(self):
+        super().__init__(OutboxStats())
+        self.data = []
+
+    def put(self, data, kind=None):
+        self.data.append(data)
+        return True
+
+def test_large_deck_tables_stay_on_text():
+    """五副牌的牌編號放不進二進位框架：協商退回文字協定，抽牌與丟棄的廣播也不會組出框架"""
+    table = Table('big', decks=5, auto_discard=True)
+    players = [Player(None, None, name, RecordingOutbox()) for name in ('甲', '乙')]
+    for player in players:
+        player.protocol = codec.negotiate('1', table.decks * DECK_SIZE - 1)
+        table.add_player(player)
+        table.handle_command(player, 'start')
+    assert table.game_started
+    for _ in range(200):
+        if not table.game_started:
+            break
+        player = table.players[table.current_player]
+        assert table.handle_command(player, 'draw')
+        table.handle_command(player, 'end')
+    assert all(player.protocol == 0 for player in players)
+    assert all(data.endswith(b'\n') for player in players for data in player.outbox.data)
@@ -0,0 +1,69 @@
+import random
+from socketgamecards import DECK_SIZE, Hand, card_rank, create_deck
+from socketgameengine import (shuffled_deck, deal, deal_hands, next_seat, first_empty, draw, draw_winner,
+                              is_valid_discard, play_turn, play_game)
+
+def test_shuffled_deck_depends_only_on_seed():
+    assert shuffled_deck(2, 42) == shuffled_deck(2, 42)
+    assert shuffled_deck(2, 42) != shuffled_deck(2, 43)
+    assert sorted(shuffled_deck(2, 42)) == create_deck(2)
+
+def test_deal_goes_round_the_seats():
+    hands = [Hand() for _ in range(3)]
+    deal(list(range(10)), hands)
+    assert [sorted(hand) for hand in hands] == [[0, 3, 6, 9], [1, 4, 7], [2, 5, 8]]
+
+def test_deal_hands_reproduces_a_deal():
+    hands = deal_hands(1, 7, 4)
+    again = deal_hands(1, 7, 4)
+    assert [sorted(hand) for hand in hands] == [sorted(hand) for hand in again]
+    assert sorted(card for hand in hands for card in hand) == create_deck(1)
+
+def test_next_seat_and_first_empty():
+    assert next_seat(0, 3) == 1
+    assert next_seat(2, 3) == 0
+    assert first_empty([Hand([1]), Hand(), Hand()]) == 1
+    assert first_empty([Hand([1]), Hand([2])]) is None
+
+def test_draw_takes_from_the_next_seat():
+    hands = [Hand([0]), Hand([1]), Hand([13])]
+    card, pairs = draw(hands, 2, random.Random(1))
+    assert card == 0 and pairs == []
+    assert sorted(hands[2]) == [0, 13] and not hands[0]
+
+def test_draw_with_auto_discard_only_pairs_the_drawn_rank():
+    hands = [Hand([1, 2, 15]), Hand([14])]  # 座位 0 手上已有一對 3，但只有抽到的 2 會自動丟棄
+    card, pairs = draw(hands, 0, random.Random(1), auto_discard=True)
+    assert card == 14 and sorted(pairs) == [1, 14]
+    assert sorted(hands[0]) == [2, 15]
+
+def test_draw_winner_prefers_the_emptied_source():
+    assert draw_winner([Hand([1]), Hand()], 0) == 1
+    assert draw_winner([Hand(), Hand()], 0) == 1
+    assert draw_winner([Hand(), Hand([1])], 0) == 0
+    assert draw_winner([Hand([1]), Hand([2])], 0) is None
+
+def test_is_valid_discard():
+    assert is_valid_discard([0, 13])
+    assert is_valid_discard([0, 13, 26, 39, 1, DECK_SIZE + 1])
+    assert is_valid_discard([])
+    assert not is_valid_discard([0])
+    assert not is_valid_discard([0, 1])
+    assert not is_valid_discard([52, 53])  # 鬼牌不能配對
+
+def test_play_turn_discards_pairs_at_end_of_turn():
+    hands = [Hand([0, 1]), Hand([13])]
+    assert play_turn(hands, 0, random.Random(1)) == 1  # 被抽光的下一位贏
+    hands = [Hand([0, 1]), Hand([13, 14])]  # 不論抽到 A 或 2 都會湊成一對
+    assert play_turn(hands, 0, random.Random(1)) is None
+    assert len(hands[0]) == 1 and len(hands[1]) == 1
+
+def test_play_game_ends_with_an_empty_hand():
+    for seed in range(20):
+        for auto_discard in (False, True):
+            hands = deal_hands(1, seed, 4)
+            turns, winner = play_game(hands, random.Random(seed), auto_discard)
+            assert not hands[winner]
+            assert turns >= 0
+            ranks = [card_rank(card) for hand in hands for card in hand]
+            assert 0 in ranks  # 鬼牌一定留在輸家手上
@@ -0,0 +1,23 @@
+import asyncio
+import socketgamegateway
+from socketgamegateway import Gateway
+
+def test_placement_outlives_the_last_connection_for_the_reconnect_grace(monkeypatch):
+    """牌桌的連線都斷了，座位還保留在後端：寬限期內帶桌號的連線仍要送回同一個後端"""
+    monkeypatch.setattr(socketgamegateway, 'PLACEMENT_MARGIN', 0)
+
+    async def main():
+        gateway = Gateway(['127.0.0.1:9001', '127.0.0.1:9002'])
+        gateway.reconnect_grace = 0.05
+        backend = next(name for name in gateway.backends if gateway.ring.lookup('s1')[0] != name)
+        gateway.join_table(gateway.backends[backend], 's1', True)  # 由負載最輕原則放在雜湊環不會選的後端
+        gateway.leave_table(gateway.backends[backend], 's1')
+        assert gateway.candidates('s1')[0].name == backend
+        gateway.join_table(gateway.backends[backend], 's1', False)  # 重新連線回來，取消清除
+        gateway.leave_table(gateway.backends[backend], 's1')
+        await asyncio.sleep(0.01)
+        assert gateway.placements == {'s1': backend}
+        await asyncio.sleep(0.2)
+        assert gateway.placements == {}
+        assert gateway.candidates('s1')[0].name != backend
+    asyncio.run(main())
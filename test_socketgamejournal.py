@@ -0,0 +1,87 @@
+import random
+from socketgameio import Outbox, OutboxStats
+from socketgamejournal import Journal, replay, replay_file
+from socketgameserver import Table, Player
+
+class QuietOutbox(Outbox):
+    def __init__(self):
+        super().__init__(OutboxStats())
+
+    def put(self, data, kind=None):
+        return True
+
+def journaled_table(tmp_path, names, auto_discard=False, seed=1):
+    """開一張寫日誌的牌桌（不啟動寫入執行緒，紀錄留在 pending 直到 close）"""
+    journal = Journal(str(tmp_path / 'game.journal'), fsync='never')
+    table = Table('t1', auto_discard=auto_discard)
+    table.rng = random.Random(seed)
+    table.journal = journal.table(table.table_id, table.decks)
+    players = [Player(None, None, name, QuietOutbox()) for name in names]
+    for player in players:
+        table.add_player(player)
+    return journal, table, players
+
+def assert_replay_matches(journal, table):
+    """重播目前為止的紀錄，得到的牌桌狀態要與實際的牌桌相同"""
+    tables, _ = replay(b''.join(journal.pending))
+    state, = tables.values()
+    assert state.players == [player.name for player in table.players]
+    assert [sorted(hand) for hand in state.hands] == [sorted(player.hand) for player in table.players]
+    assert state.game_started == table.game_started
+    assert state.waiting_for_play_again == table.waiting_for_play_again
+    if table.game_started:
+        assert state.current == table.current_player
+    return state
+
+def play_turns(journal, table, turns):
+    """輪到的玩家抽牌、丟掉所有配對、結束回合，每一步都核對重播結果"""
+    for _ in range(turns):
+        if not table.game_started:
+            return
+        player = table.players[table.current_player]
+        table.handle_command(player, 'draw')
+        assert_replay_matches(journal, table)
+        if table.game_started:
+            table.handle_command(player, 'discard', 'auto')
+            table.handle_command(player, 'end')
+            assert_replay_matches(journal, table)
+
+def test_replay_follows_a_whole_game(tmp_path):
+    journal, table, players = journaled_table(tmp_path, ['甲', '乙', '丙'])
+    for player in players:
+        table.handle_command(player, 'start')
+    assert_replay_matches(journal, table)
+    play_turns(journal, table, 1000)
+    state = assert_replay_matches(journal, table)
+    assert table.waiting_for_play_again
+    assert state.winner is not None and state.games == 1
+    for player in players:
+        table.handle_command(player, 'playagain', 'yes')
+        assert_replay_matches(journal, table)
+    journal.close()
+    tables, count = replay_file(str(tmp_path / 'game.journal'))
+    assert count > 0 and tables[1].describe()['state'] == 'waiting'
+
+def test_replay_with_auto_discard(tmp_path):
+    journal, table, players = journaled_table(tmp_path, ['甲', '乙'], auto_discard=True, seed=2)
+    for player in players:
+        table.handle_command(player, 'start')
+    play_turns(journal, table, 1000)
+    assert not table.game_started
+    assert_replay_matches(journal, table)
+
+def test_replay_follows_players_leaving(tmp_path):
+    journal, table, players = journaled_table(tmp_path, ['甲', '乙', '丙'], seed=3)
+    for player in players:
+        table.handle_command(player, 'start')
+    play_turns(journal, table, 2)
+    table.remove_player(table.players[table.current_player])  # 輪到的玩家離開，換下一位
+    assert table.game_started
+    assert_replay_matches(journal, table)
+    play_turns(journal, table, 1)
+    table.remove_player(table.players[0])  # 剩一個人，這一局沒有贏家就結束
+    assert not table.game_started and table.waiting_for_play_again
+    state = assert_replay_matches(journal, table)
+    assert state.winner is None
+    table.handle_command(table.players[0], 'playagain', 'no')
+    assert_replay_matches(journal, table)
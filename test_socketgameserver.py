@@ -0,0 +1,65 @@
+import json
+import pytest
+from socketgamecards import DECK_SIZE, Hand
+from socketgameio import Outbox, OutboxStats
+from socketgameserver import GameServer, Table, Player, build_parser, ERRORS, MAX_DECKS, MAX_TABLE_ID_BYTES
+
+class RecordingOutbox(Outbox):
+    def __init__(self):
+        super().__init__(OutboxStats())
+        self.data = []
+
+    def put(self, data, kind=None):
+        self.data.append(data.decode())
+        return True
+
+def started_table(names=('甲', '乙'), decks=1):
+    table = Table('t1', decks=decks)
+    players = [Player(None, None, name, RecordingOutbox()) for name in names]
+    for player in players:
+        table.add_player(player)
+        table.handle_command(player, 'start')
+    return table, players
+
+def test_discard_rejects_cards_outside_the_table_decks():
+    table, _ = started_table()
+    player = table.players[table.current_player]
+    held = len(player.hand)
+    huge = [{'suit': 'Hearts', 'rank': 1, 'deck': 10 ** 8}, {'suit': 'Diamonds', 'rank': 1, 'deck': 10 ** 8}]
+    table.handle_command(player, 'discard', json.dumps({'cards': huge}))
+    table.handle_command(player, 'discard', [DECK_SIZE, DECK_SIZE + 13])  # 二進位協定的編號，第二副牌不存在
+    table.handle_command(player, 'discard', [-54, -41])
+    assert player.outbox.data[-3:] == ["你手中沒有這些牌，無法丟棄。\n"] * 3
+    assert len(player.hand) == held
+
+def test_login_rejects_table_ids_too_long_for_a_session_frame():
+    server = GameServer('127.0.0.1', 0)
+    try:
+        longest = '桌' * (MAX_TABLE_ID_BYTES // 3)  # 每個字 3 個位元組
+        for line in (f"甲 table={longest}x", f"乙 watch={longest}x", f"丙 table={longest}x resume=abc"):
+            player = Player(None, None, None, RecordingOutbox())
+            assert server.login(player, line) is None
+            assert player.outbox.data == ["桌號太長，斷開連線。\n"]
+        player = Player(None, None, None, RecordingOutbox())
+        assert server.login(player, f"丁 table={longest}").table_id == longest
+    finally:
+        server.server_socket.close()
+
+def test_decks_option_fits_the_journal():
+    """日誌的開桌紀錄以一個位元組記錄副數，超出範圍在啟動時就拒絕"""
+    parser = build_parser()
+    assert parser.parse_args(['--decks', str(MAX_DECKS)]).decks == MAX_DECKS
+    for value in ('0', str(MAX_DECKS + 1)):
+        with pytest.raises(SystemExit):
+            parser.parse_args(['--decks', value])
+
+def test_auto_discard_without_pairs_is_not_an_error():
+    """一次送出整個回合的機器人還不知道會抽到什麼牌，沒有配對時 discard auto 不做任何事"""
+    table, _ = started_table()
+    player = table.players[table.current_player]
+    player.hand = Hand([0, 1])  # 一張 A、一張 2，沒有配對
+    errors = ERRORS.labels('bad_discard').get()
+    table.handle_command(player, 'discard', 'auto')
+    assert player.outbox.data[-1] == "你手中沒有可配對丟棄的牌。\n"
+    assert sorted(player.hand) == [0, 1]
+    assert ERRORS.labels('bad_discard').get() == errors
@@ -0,0 +1,123 @@
+import asyncio
+import math
+import threading
+import time
+from socketgametimer import TIMER_TICK, TimerWheel
+
+# 測試以 advance(now) 指定推進到的時間，不必真的等待
+
+def test_timer_fires_once_after_delay():
+    wheel = TimerWheel()
+    fired = []
+    timer = wheel.schedule(1.0, fired.append, 'turn')
+    assert len(wheel) == 1 and timer.active()
+    assert wheel.advance(wheel.origin + 0.9) == 0
+    assert wheel.advance(wheel.origin + 1.2) == 1
+    assert fired == ['turn']
+    assert len(wheel) == 0 and not timer.active()
+    assert wheel.advance(wheel.origin + 5) == 0
+    assert fired == ['turn']
+
+def test_zero_delay_waits_one_tick():
+    wheel = TimerWheel()
+    fired = []
+    wheel.schedule(0, fired.append, 1)
+    assert wheel.advance(wheel.origin) == 0
+    wheel.advance(wheel.origin + 2 * TIMER_TICK)
+    assert fired == [1]
+
+def test_timers_fire_in_expiry_order():
+    wheel = TimerWheel()
+    fired = []
+    for delay in (3, 1, 2):
+        wheel.schedule(delay, fired.append, delay)
+    for step in range(1, 9):
+        wheel.advance(wheel.origin + step * 0.5)
+    assert fired == [1, 2, 3]
+
+def test_cancel_before_expiry():
+    wheel = TimerWheel()
+    fired = []
+    kept = wheel.schedule(1, fired.append, 'kept')
+    cancelled = wheel.schedule(1, fired.append, 'cancelled')
+    cancelled.cancel()
+    assert len(wheel) == 1 and not cancelled.active()
+    cancelled.cancel()  # 重複取消沒有影響
+    assert len(wheel) == 1
+    wheel.advance(wheel.origin + 2)
+    assert fired == ['kept']
+    kept.cancel()  # 到期後取消也沒有影響
+    assert len(wheel) == 0
+
+def test_long_delays_cascade_from_upper_levels():
+    wheel = TimerWheel()
+    fired = []
+    delays = [13, 3300]  # 260 格在第 1 層，66000 格超過 256**2 在第 2 層
+    for delay in delays:
+        wheel.schedule(delay, fired.append, delay)
+    for delay in delays:
+        wheel.advance(wheel.origin + delay - 0.5)
+        assert delay not in fired
+        wheel.advance(wheel.origin + delay + 0.5)
+        assert delay in fired
+    assert len(wheel) == 0
+
+def test_failing_callback_does_not_stop_others():
+    wheel = TimerWheel()
+    fired = []
+    wheel.schedule(0.1, lambda: 1 / 0)
+    wheel.schedule(0.1, fired.append, 'after')
+    assert wheel.advance(wheel.origin + 1) == 2
+    assert fired == ['after']
+
+def test_next_tick_points_at_the_earliest_slot():
+    wheel = TimerWheel()
+    assert wheel.next_tick() is None
+    wheel.schedule(3300, print)  # 第 2 層：要到 65536 格下移
+    assert wheel.next_tick() == 1 << 16
+    wheel.schedule(13, print)  # 第 1 層：要到 256 格下移
+    assert wheel.next_tick() == 256
+    timer = wheel.schedule(1, print)  # 第 0 層：到期的那一格
+    assert wheel.next_tick() == timer.expires
+
+def test_idle_wheel_skips_ahead():
+    """沒有計時器時不必一格一格走過去，之後排的計時器從現在起算"""
+    wheel = TimerWheel()
+    wheel.origin -= 3600  # 假裝已經閒置一小時
+    fired = []
+    wheel.schedule(1, fired.append, 'late')
+    assert wheel.current >= int(3600 / TIMER_TICK)
+    assert wheel.next_tick() - wheel.current <= int(1 / TIMER_TICK) + 1
+    wheel.advance(time.monotonic() + 1.5)
+    assert fired == ['late']
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_thread_runner_sleeps_until_scheduled():
+    wheel = TimerWheel()
+    fired = threading.Event()
+    wheel.start_thread()
+    wait_until(lambda: wheel.sleeping_until == math.inf)  # 沒有計時器：一直睡，不會每格醒來
+    timer = wheel.schedule(60, print)
+    wait_until(lambda: wheel.current < wheel.sleeping_until <= timer.expires)  # 被叫醒後改睡到這個計時器所在的格子
+    wheel.schedule(0.1, fired.set)  # 比目前睡到的格子早，要叫醒推進的執行緒
+    assert fired.wait(5)
+
+def test_async_runner_wakes_for_timers_from_other_threads():
+    async def main():
+        wheel = TimerWheel()
+        fired = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        runner = loop.create_task(wheel.run_async())
+        await asyncio.sleep(0.1)
+        assert wheel.sleeping_until == math.inf
+        worker = threading.Thread(target=wheel.schedule, args=(0.1, loop.call_soon_threadsafe, fired.set))
+        worker.start()
+        await asyncio.wait_for(fired.wait(), 5)
+        worker.join()
+        runner.cancel()
+    asyncio.run(main())
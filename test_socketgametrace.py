@@ -0,0 +1,38 @@
+import threading
+import time
+from socketgametrace import Profiler, PROFILE_DRAIN_TIMEOUT
+
+def test_profiled_blocks_on_several_threads_at_once():
+    """多個執行緒同時在 profiled() 裡：不能拋出例外（Python 3.12 起只有一個能真的剖析），stop() 也不必等到逾時"""
+    profiler = Profiler()
+    profiler.start()
+    threads = 4
+    inside = threading.Barrier(threads)
+    errors = []
+
+    def work():
+        try:
+            for _ in range(20):
+                with profiler.profiled():
+                    inside.wait(5)  # 確定所有執行緒同時在區塊內
+                    sum(i * i for i in range(1000))
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    start = time.monotonic()
+    stats = profiler.stop()
+    assert errors == []
+    assert time.monotonic() - start < PROFILE_DRAIN_TIMEOUT
+    assert stats is not None and stats.total_calls > 0
+    assert not any(entry[1] for entry in profiler.profiles)
+
+def test_profiled_is_a_no_op_without_a_window():
+    profiler = Profiler()
+    with profiler.profiled():
+        pass
+    assert profiler.profiles == []